@@ -0,0 +1,60 @@
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+from configs.database import Base, SQLALCHEMY_DATABASE_URL
+from api_key.models.api_key import ApiKey, ApiKeyPermission
+from auth_credential.models.auth_credential import AuthCredential
+from author.models.author import Author
+from book.models.book import Book
+from book_copy.models.book_copy import BookCopy
+from bookshelf.models.bookshelf import Bookshelf
+from borrow.models.borrow import Borrow
+from category.models.category import Category
+from permission.models.permission import Permission
+from publisher.models.publisher import Publisher
+from refresh_token.models.refresh_token import RefreshToken
+from role.models.role import Role
+from role_permission.models.role_permission import RolePermission
+from user.models.user import User
+from user_role.models.user_role import UserRole
+
+
+config = context.config
+config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL.replace("%", "%%"))
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url"),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,64 @@
+"""index foreign keys and hot filter columns
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (name, table, columns, partial WHERE clause)
+INDEXES = [
+    ("ix_books_author_id", "books", ["author_id"], None),
+    ("ix_books_category_id", "books", ["category_id"], None),
+    ("ix_books_publisher_id", "books", ["publisher_id"], None),
+    ("ix_book_copies_book_id_status", "book_copies", ["book_id", "status"], None),
+    ("ix_book_copies_available_book_id", "book_copies", ["book_id"], "status = 'Có sẵn'"),
+    ("ix_book_copies_status", "book_copies", ["status"], None),
+    ("ix_book_copies_bookshelf_id", "book_copies", ["bookshelf_id"], None),
+    ("ix_borrows_user_id_status", "borrows", ["user_id", "status"], None),
+    ("ix_borrows_status_created_at", "borrows", ["status", "created_at"], None),
+    ("ix_borrows_book_copy_id", "borrows", ["book_copy_id"], None),
+    ("ix_borrows_staff_id", "borrows", ["staff_id"], None),
+    ("ix_borrows_created_at", "borrows", ["created_at"], None),
+    ("ix_user_roles_user_id_role_id", "user_roles", ["user_id", "role_id"], None),
+    ("ix_user_roles_role_id", "user_roles", ["role_id"], None),
+    ("ix_role_permissions_role_id_permission_id", "role_permissions", ["role_id", "permission_id"], None),
+    ("ix_role_permissions_permission_id", "role_permissions", ["permission_id"], None),
+]
+
+
+def upgrade() -> None:
+    # Tables that do not exist yet are created by Base.metadata.create_all with
+    # these indexes already declared on the models.
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    # CONCURRENTLY keeps the hot tables writable while the indexes build.
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            if table not in tables:
+                continue
+            op.create_index(
+                name, table, columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
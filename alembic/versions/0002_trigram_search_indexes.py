@@ -0,0 +1,62 @@
+"""trigram indexes for substring search
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Columns searched with ILIKE '%term%' by the /search endpoints.
+TRIGRAM_COLUMNS = {
+    "users": ["username", "full_name", "phone_number", "address"],
+    "books": ["name"],
+    "publishers": ["name", "email", "address", "phone_number"],
+    "categories": ["name", "description"],
+    "authors": ["name", "address", "pen_name", "biography"],
+    "bookshelfs": ["name"],
+}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.exec_driver_sql("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'").first() is None:
+        logging.getLogger("alembic.runtime.migration").warning(
+            "pg_trgm is not available on this server; skipping trigram indexes"
+        )
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    tables = set(sa.inspect(bind).get_table_names())
+
+    with op.get_context().autocommit_block():
+        for table, columns in TRIGRAM_COLUMNS.items():
+            if table not in tables:
+                continue
+            for column in columns:
+                op.create_index(
+                    f"ix_{table}_{column}_trgm", table, [column],
+                    postgresql_using="gin",
+                    postgresql_ops={column: "gin_trgm_ops"},
+                    postgresql_concurrently=True,
+                    if_not_exists=True,
+                )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table, columns in TRIGRAM_COLUMNS.items():
+            for column in columns:
+                op.drop_index(f"ix_{table}_{column}_trgm", table_name=table, postgresql_concurrently=True, if_exists=True)
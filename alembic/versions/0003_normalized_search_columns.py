@@ -0,0 +1,86 @@
+"""accent-insensitive normalized search columns
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+from configs.search import normalized_expression
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# table -> (source column, generated column)
+NORMALIZED_COLUMNS = {
+    "users": ("full_name", "full_name_normalized"),
+    "books": ("name", "name_normalized"),
+    "authors": ("name", "name_normalized"),
+    "publishers": ("name", "name_normalized"),
+}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    # STORED generated columns are filled by Postgres while the table is rewritten.
+    for table, (source, column) in NORMALIZED_COLUMNS.items():
+        if table not in tables or column in {c["name"] for c in inspector.get_columns(table)}:
+            continue
+        op.add_column(table, sa.Column(column, sa.String(), sa.Computed(normalized_expression(source), persisted=True)))
+
+    if bind.exec_driver_sql("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'").first() is None:
+        logging.getLogger("alembic.runtime.migration").warning(
+            "pg_trgm is not available on this server; skipping trigram indexes"
+        )
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        for table, (source, column) in NORMALIZED_COLUMNS.items():
+            if table not in tables:
+                continue
+            op.create_index(
+                f"ix_{table}_{column}_trgm", table, [column],
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+            op.drop_index(f"ix_{table}_{source}_trgm", table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+    trgm = bind.exec_driver_sql("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").first() is not None
+
+    with op.get_context().autocommit_block():
+        for table, (source, column) in NORMALIZED_COLUMNS.items():
+            if table not in tables:
+                continue
+            if trgm:
+                op.create_index(
+                    f"ix_{table}_{source}_trgm", table, [source],
+                    postgresql_using="gin",
+                    postgresql_ops={source: "gin_trgm_ops"},
+                    postgresql_concurrently=True,
+                    if_not_exists=True,
+                )
+            op.drop_index(f"ix_{table}_{column}_trgm", table_name=table, postgresql_concurrently=True, if_exists=True)
+
+    for table, (source, column) in NORMALIZED_COLUMNS.items():
+        if table in tables:
+            op.drop_column(table, column)
@@ -0,0 +1,54 @@
+"""book full-text search vector
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from book.models.book import Book, search_vector_update
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "books" not in inspector.get_table_names():
+        return
+
+    if "search_vector" not in {c["name"] for c in inspector.get_columns("books")}:
+        op.add_column("books", sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True))
+
+    # Backfill in id ranges so each statement holds row locks on a bounded slice of the table.
+    low, high = bind.execute(sa.select(sa.func.min(Book.id), sa.func.max(Book.id))).first()
+    if low is not None:
+        for start in range(low, high + 1, BATCH_SIZE):
+            bind.execute(search_vector_update(Book.id >= start, Book.id < start + BATCH_SIZE))
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_books_search_vector", "books", ["search_vector"],
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_books_search_vector", table_name="books", postgresql_concurrently=True, if_exists=True)
+    op.drop_column("books", "search_vector")
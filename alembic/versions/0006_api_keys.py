@@ -0,0 +1,60 @@
+"""api keys
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if "api_keys" not in tables:
+        op.create_table(
+            "api_keys",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("prefix", sa.String(length=16), nullable=False),
+            sa.Column("secret_hash", sa.String(length=64), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("is_active", sa.Boolean(), nullable=False),
+            sa.Column("expires_at", sa.TIMESTAMP(timezone=True), nullable=True),
+            sa.Column("last_used_at", sa.TIMESTAMP(timezone=True), nullable=True),
+            sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_api_keys_id", "api_keys", ["id"])
+        op.create_index("ix_api_keys_prefix", "api_keys", ["prefix"], unique=True)
+        op.create_index("ix_api_keys_user_id", "api_keys", ["user_id"])
+
+    if "api_key_permissions" not in tables:
+        op.create_table(
+            "api_key_permissions",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("api_key_id", sa.Integer(), nullable=False),
+            sa.Column("permission_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["api_key_id"], ["api_keys.id"], ondelete="CASCADE"),
+            sa.ForeignKeyConstraint(["permission_id"], ["permissions.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_api_key_permissions_id", "api_key_permissions", ["id"])
+        op.create_index("ix_api_key_permissions_permission_id", "api_key_permissions", ["permission_id"])
+        op.create_index("ix_api_key_permissions_api_key_id_permission_id", "api_key_permissions", ["api_key_id", "permission_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table("api_key_permissions")
+    op.drop_table("api_keys")
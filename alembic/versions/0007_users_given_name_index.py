@@ -0,0 +1,36 @@
+"""index users by given name for /user/pageable
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if "users" not in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_users_given_name_id", "users",
+            [sa.text("split_part(full_name, ' ', -1)"), "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_users_given_name_id", table_name="users", postgresql_concurrently=True, if_exists=True)
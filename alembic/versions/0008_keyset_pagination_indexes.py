@@ -0,0 +1,42 @@
+"""indexes matching the keyset pagination sort keys
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# name, table, columns; categories and bookshelfs sort by a unique name that is already indexed.
+INDEXES = [
+    ("ix_books_name_id", "books", ["name", "id"]),
+    ("ix_publishers_name_id", "publishers", ["name", "id"]),
+    ("ix_authors_given_name_id", "authors", [sa.text("split_part(name, ' ', -1)"), "id"]),
+]
+
+
+def upgrade() -> None:
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            if table not in tables:
+                continue
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
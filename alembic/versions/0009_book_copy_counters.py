@@ -0,0 +1,45 @@
+"""denormalized book copy counters
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from book.models.book import Book, copy_counts_reconcile
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "books" not in inspector.get_table_names():
+        return
+
+    columns = {c["name"] for c in inspector.get_columns("books")}
+    for name in ("total_copies", "available_copies"):
+        if name not in columns:
+            op.add_column("books", sa.Column(name, sa.Integer(), server_default=sa.text("0"), nullable=False))
+
+    low, high = bind.execute(sa.select(sa.func.min(Book.id), sa.func.max(Book.id))).first()
+    if low is not None:
+        for start in range(low, high + 1, BATCH_SIZE):
+            bind.execute(copy_counts_reconcile(Book.id >= start, Book.id < start + BATCH_SIZE))
+
+
+def downgrade() -> None:
+    op.drop_column("books", "available_copies")
+    op.drop_column("books", "total_copies")
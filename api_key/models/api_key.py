@@ -0,0 +1,41 @@
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, text
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql.sqltypes import TIMESTAMP
+from configs.database import Base
+
+
+class ApiKey(Base):
+    __tablename__ = "api_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    # Public part of the key, used to find the row; the secret part is only stored as an HMAC.
+    prefix = Column(String(16), nullable=False, unique=True, index=True)
+    secret_hash = Column(String(64), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    is_active = Column(Boolean, nullable=False, default=True)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    last_used_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+
+    user = relationship("User")
+    api_key_permissions = relationship("ApiKeyPermission", back_populates="api_key", passive_deletes=True)
+
+    @property
+    def scopes(self):
+        return [item.permission.name for item in self.api_key_permissions if item.permission]
+
+
+class ApiKeyPermission(Base):
+    __tablename__ = "api_key_permissions"
+    __table_args__ = (
+        Index("ix_api_key_permissions_api_key_id_permission_id", "api_key_id", "permission_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    api_key_id = Column(Integer, ForeignKey("api_keys.id", ondelete="CASCADE"), nullable=False)
+    permission_id = Column(Integer, ForeignKey("permissions.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    api_key = relationship("ApiKey", back_populates="api_key_permissions")
+    permission = relationship("Permission")
@@ -0,0 +1,236 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import joinedload, selectinload
+from api_key.models.api_key import ApiKey, ApiKeyPermission
+from api_key.schemas.api_key import *
+from authen.schemas.authen import Principal
+from configs.api_keys import generate_api_key, invalidate_api_keys
+from configs.database import get_db, get_read_db
+from configs.permissions import permission_registry, require_permission
+from permission.models.permission import Permission
+from role.models.role import Role
+from user.models.user import User
+from user_role.models.user_role import UserRole
+
+
+router = APIRouter(
+    prefix="/api-key",
+    tags=["Api_Key"],
+)
+
+
+def api_key_query():
+    return select(ApiKey)\
+        .options(selectinload(ApiKey.api_key_permissions).joinedload(ApiKeyPermission.permission))
+
+
+async def check_permission_ids(db: AsyncSession, user_id: int, permission_ids: list[int]):
+    permission_ids = set(permission_ids)
+    found = dict((await db.execute(select(Permission.id, Permission.name).where(Permission.id.in_(permission_ids)))).all())
+    if set(found) != permission_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Quyền không tồn tại"
+        )
+
+    # A key can't be granted more than its owner's roles allow (admins have every permission).
+    roles = (await db.execute(select(Role.name)\
+        .join(UserRole, UserRole.role_id == Role.id)\
+        .where(UserRole.user_id == user_id))).scalars().all()
+    await permission_registry.ensure_loaded(db)
+    denied = sorted(name for name in found.values() if not permission_registry.allows(roles, name))
+    if denied:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Chủ sở hữu khóa API không có quyền: {', '.join(denied)}"
+        )
+    return permission_ids
+
+
+@router.get("/all",
+            response_model=ListApiKeyResponse,
+            status_code=status.HTTP_200_OK)
+async def get_api_keys(
+        db: AsyncSession = Depends(get_read_db),
+        current_user: Principal = Depends(require_permission("api_key.manage"))
+    ):
+
+    try:
+        api_keys = (await db.execute(api_key_query().order_by(ApiKey.id))).scalars().all()
+
+        return ListApiKeyResponse(
+            api_keys=api_keys,
+            tolal_data=len(api_keys)
+        )
+
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
+        )
+
+
+@router.get("/{api_key_id}",
+            response_model=ApiKeyResponse,
+            status_code=status.HTTP_200_OK)
+async def get_api_key_by_id(
+        api_key_id: int,
+        db: AsyncSession = Depends(get_read_db),
+        current_user: Principal = Depends(require_permission("api_key.manage"))
+    ):
+
+    try:
+        api_key = (await db.execute(api_key_query().where(ApiKey.id == api_key_id))).scalars().first()
+        if not api_key:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="API key không tồn tại"
+            )
+
+        return api_key
+
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
+        )
+
+
+@router.post("/create",
+             response_model=ApiKeyCreateResponse,
+             status_code=status.HTTP_201_CREATED)
+async def create_api_key(
+        new_api_key: ApiKeyCreate,
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(require_permission("api_key.manage"))
+    ):
+
+    try:
+        user_id = new_api_key.user_id or current_user.id
+        user = await db.scalar(select(User.id).where(User.id == user_id))
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Tài khoản không tồn tại"
+            )
+        permission_ids = await check_permission_ids(db, user_id, new_api_key.permission_ids)
+
+        key, prefix, secret_hash = generate_api_key()
+        api_key = ApiKey(
+            name=new_api_key.name,
+            prefix=prefix,
+            secret_hash=secret_hash,
+            user_id=user_id,
+            expires_at=new_api_key.expires_at
+        )
+        db.add(api_key)
+        await db.flush()
+        db.add_all([ApiKeyPermission(api_key_id=api_key.id, permission_id=permission_id) for permission_id in permission_ids])
+        await db.commit()
+
+        api_key = (await db.execute(api_key_query().where(ApiKey.id == api_key.id))).scalars().first()
+
+        return ApiKeyCreateResponse(
+            **ApiKeyResponse.model_validate(api_key).model_dump(),
+            key=key
+        )
+
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
+        )
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
+        )
+
+
+@router.put("/update/{api_key_id}",
+            response_model=ApiKeyResponse,
+            status_code=status.HTTP_200_OK)
+async def update_api_key(
+        api_key_id: int,
+        new_api_key: ApiKeyUpdate,
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(require_permission("api_key.manage"))
+    ):
+
+    try:
+        api_key = (await db.execute(select(ApiKey).where(ApiKey.id == api_key_id))).scalars().first()
+        if not api_key:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="API key không tồn tại"
+            )
+
+        for field, value in new_api_key.dict(exclude_unset=True, exclude={"permission_ids"}).items():
+            if field in ("name", "is_active") and value is None:
+                continue
+            setattr(api_key, field, value)
+
+        if new_api_key.permission_ids is not None:
+            permission_ids = await check_permission_ids(db, api_key.user_id, new_api_key.permission_ids)
+            await db.execute(delete(ApiKeyPermission).where(ApiKeyPermission.api_key_id == api_key_id))
+            db.add_all([ApiKeyPermission(api_key_id=api_key_id, permission_id=permission_id) for permission_id in permission_ids])
+
+        prefix = api_key.prefix
+        await db.commit()
+        invalidate_api_keys([prefix])
+
+        return (await db.execute(api_key_query()\
+            .where(ApiKey.id == api_key_id)\
+            .execution_options(populate_existing=True))).scalars().first()
+
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
+        )
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
+        )
+
+
+@router.delete("/delete/{api_key_id}",
+            status_code=status.HTTP_200_OK)
+async def delete_api_key(
+        api_key_id: int,
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(require_permission("api_key.manage"))
+    ):
+
+    try:
+        prefix = await db.scalar(select(ApiKey.prefix).where(ApiKey.id == api_key_id))
+        if not prefix:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="API key không tồn tại"
+            )
+        await db.execute(delete(ApiKey).where(ApiKey.id == api_key_id))
+        await db.commit()
+        invalidate_api_keys([prefix])
+
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"message": "Xóa API key thành công"}
+        )
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
+        )
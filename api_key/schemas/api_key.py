@@ -0,0 +1,45 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import Optional
+
+
+class ApiKeyCreate(BaseModel):
+    name: str
+    user_id: Optional[int] = None
+    permission_ids: list[int] = []
+    expires_at: Optional[datetime] = None
+
+
+class ApiKeyUpdate(BaseModel):
+    name: Optional[str] = None
+    permission_ids: Optional[list[int]] = None
+    is_active: Optional[bool] = None
+    expires_at: Optional[datetime] = None
+
+
+class ApiKeyResponse(BaseModel):
+    id: int
+    name: str
+    prefix: str
+    user_id: int
+    scopes: list[str]
+    is_active: bool
+    expires_at: Optional[datetime]
+    last_used_at: Optional[datetime]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ApiKeyCreateResponse(ApiKeyResponse):
+    # Only returned once, at creation.
+    key: str
+
+
+class ListApiKeyResponse(BaseModel):
+    api_keys: list[ApiKeyResponse]
+    tolal_data: int
+
+    class Config:
+        from_attributes = True
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from configs.conf import settings
-from configs.database import get_db
-from configs.authentication import get_current_user, hash_password
+from configs.database import get_db, get_read_db
+from configs.pagination import CountMode, paginate
+from configs.authentication import get_current_user, hash_password, revoke_user_tokens
+from refresh_token.models.refresh_token import RefreshToken, revoke_refresh_tokens
 from auth_credential.models.auth_credential import AuthCredential
 from auth_credential.schemas.auth_credential import AuthCredentialResponse, AuthCredentialPageableResponse
-import math
 
 
 DEFAULT_PASSWORD = settings.default_password
@@ -22,12 +25,12 @@ router = APIRouter(
             response_model=list[AuthCredentialResponse], 
             status_code=status.HTTP_200_OK)
 async def get_auth_credentials(
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        auth_credentials = db.query(AuthCredential).all()
+        auth_credentials = (await db.execute(select(AuthCredential))).scalars().all()
 
         return auth_credentials
     
@@ -42,22 +45,25 @@ async def get_auth_credentials(
             response_model=AuthCredentialPageableResponse, 
             status_code=status.HTTP_200_OK)
 async def get_auth_credentials_pageable(
-        page: int, 
-        page_size: int, 
-        db: Session = Depends(get_db), 
+        page_size: int,
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)  
     ):
      
     try:
-        total_count = db.query(AuthCredential).count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-        auth_credentials = db.query(AuthCredential).offset(offset).limit(page_size).all()
+        auth_credentials, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, select(AuthCredential), [AuthCredential.id], page_size, page, cursor, include_total, count_mode)
 
         auth_credentials_pageable_res = AuthCredentialPageableResponse(
             auth_credentials=auth_credentials,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
 
         return auth_credentials_pageable_res
@@ -74,12 +80,12 @@ async def get_auth_credentials_pageable(
             status_code=status.HTTP_200_OK)
 async def get_auth_credential_by_id(
         auth_credential_id: int,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        auth_credential = db.query(AuthCredential).filter(AuthCredential.id == auth_credential_id).first()
+        auth_credential = (await db.execute(select(AuthCredential).where(AuthCredential.id == auth_credential_id))).scalars().first()
 
         if not auth_credential:
             raise HTTPException(
@@ -100,35 +106,34 @@ async def get_auth_credential_by_id(
             status_code=status.HTTP_200_OK)
 async def reset_user_password(
         auth_credential_id: int,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        auth_credential = db.query(AuthCredential).filter(AuthCredential.id == auth_credential_id)
-        if not auth_credential.first():
+        auth_credential = (await db.execute(select(AuthCredential).where(AuthCredential.id == auth_credential_id))).scalars().first()
+        if not auth_credential:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail="Tài khoản không tồn tại"
             )
 
-        auth_credential.update(
-            {"password": hash_password(DEFAULT_PASSWORD)}, 
-            synchronize_session=False
-        )
-        db.commit()    
+        await db.execute(update(AuthCredential).where(AuthCredential.id == auth_credential_id).values({"hashed_password": await hash_password(DEFAULT_PASSWORD)}))
+        await db.execute(revoke_refresh_tokens(RefreshToken.user_id == auth_credential.user_id))
+        await db.commit()    
+        revoke_user_tokens([auth_credential.user_id])
 
         return {"message": "Reset mật khẩu thành công"}
     
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, 
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -140,35 +145,34 @@ async def reset_user_password(
 async def update_user_password(
         auth_credential_id: int,
         password: str,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        auth_credential = db.query(AuthCredential).filter(AuthCredential.id == auth_credential_id)
-        if not auth_credential.first():
+        auth_credential = (await db.execute(select(AuthCredential).where(AuthCredential.id == auth_credential_id))).scalars().first()
+        if not auth_credential:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail="Tài khoản không tồn tại"
             )
 
-        auth_credential.update(
-            {"password": hash_password(password)}, 
-            synchronize_session=False
-        )
-        db.commit()
+        await db.execute(update(AuthCredential).where(AuthCredential.id == auth_credential_id).values({"hashed_password": await hash_password(password)}))
+        await db.execute(revoke_refresh_tokens(RefreshToken.user_id == auth_credential.user_id))
+        await db.commit()
+        revoke_user_tokens([auth_credential.user_id])
 
         return {"message": "Cập nhật mật khẩu thành công"}
 
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, 
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -179,32 +183,34 @@ async def update_user_password(
                 status_code=status.HTTP_200_OK)
 async def delete_auth_credential(
         auth_credential_id: int,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        auth_credential = db.query(AuthCredential).filter(AuthCredential.id == auth_credential_id)
-        if not auth_credential.first():
+        auth_credential = (await db.execute(select(AuthCredential).where(AuthCredential.id == auth_credential_id))).scalars().first()
+        if not auth_credential:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail="Tài khoản không tồn tại"
             )
 
-        auth_credential.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(AuthCredential).where(AuthCredential.id == auth_credential_id))
+        await db.execute(revoke_refresh_tokens(RefreshToken.user_id == auth_credential.user_id))
+        await db.commit()
+        revoke_user_tokens([auth_credential.user_id])
 
         return {"message": "Xóa tài khoản thành công"}
     
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, 
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -215,30 +221,33 @@ async def delete_auth_credential(
                 status_code=status.HTTP_200_OK)
 async def delete_user_accounts(
         auth_credential_ids: list[int],
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        auth_credentials = db.query(AuthCredential).filter(AuthCredential.id.in_(auth_credential_ids))
-        if not auth_credentials.first():
+        auth_credentials = (await db.execute(select(AuthCredential).where(AuthCredential.id.in_(auth_credential_ids)))).scalars().first()
+        if not auth_credentials:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                 detail="Tài khoản không tồn tại")
 
-        auth_credentials.delete(synchronize_session=False)
-        db.commit()
+        user_ids = (await db.execute(select(AuthCredential.user_id).where(AuthCredential.id.in_(auth_credential_ids)))).scalars().all()
+        await db.execute(delete(AuthCredential).where(AuthCredential.id.in_(auth_credential_ids)))
+        await db.execute(revoke_refresh_tokens(RefreshToken.user_id.in_(user_ids)))
+        await db.commit()
+        revoke_user_tokens(user_ids)
 
         return {"message": "Xóa tài khoản thành công"}
     
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, 
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
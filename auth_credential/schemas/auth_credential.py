@@ -1,5 +1,6 @@
 from datetime import date, datetime
 from pydantic import BaseModel
+from typing import Optional
 
 
 class AuthCredentialResponse(BaseModel):
@@ -13,8 +14,10 @@ class AuthCredentialResponse(BaseModel):
 class AuthCredentialPageableResponse(BaseModel):
     auth_credentials: list[AuthCredentialResponse]
 
-    total_pages: int
-    total_data: int
+    total_pages: Optional[int] = None
+    total_data: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
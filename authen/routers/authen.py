@@ -1,15 +1,20 @@
 from fastapi import status, HTTPException, Depends, APIRouter
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import delete, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from auth_credential.models.auth_credential import AuthCredential
+from authen.schemas.authen import RefreshTokenRequest
+from refresh_token.models.refresh_token import RefreshToken, revoke_refresh_tokens
 from user.models.user import User
 from user.schemas.user import UserLoginResponse
 from user_role.models.user_role import UserRole
 from role.models.role import Role
 from permission.models.permission import Permission
 from role_permission.models.role_permission import RolePermission
-from configs.authentication import verify_password, create_access_token
+from configs.authentication import create_refresh_token, get_current_user, hash_refresh_token, oauth2_scheme, token_revocations, verify_access_token, verify_password, create_access_token
 from configs.database import get_db
 
 
@@ -20,21 +25,22 @@ router = APIRouter(tags=["Login"])
              status_code=status.HTTP_200_OK)
 async def login_user(
         user_credentials: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
     ):
     
     query = (
-        db.query(
+        select(
             User,
-            func.coalesce(func.array_agg(Role.name).filter(Role.name != None), '{}').label("roles")
+            func.coalesce(func.array_agg(Role.name).filter(Role.name != None), literal_column("'{}'")).label("roles")
         )
         .outerjoin(UserRole, User.id == UserRole.user_id)
         .outerjoin(Role, UserRole.role_id == Role.id)
-        .filter(User.username == user_credentials.username)
+        .where(User.username == user_credentials.username)
         .group_by(User.id)
+        .options(selectinload(User.auth_credential))
     )
     
-    user_result = query.first()
+    user_result = (await db.execute(query)).first()
     if not user_result:
         raise HTTPException(
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
@@ -42,13 +48,20 @@ async def login_user(
         )
 
     user = user_result[0]
-    if not verify_password(user_credentials.password, user.auth_credential.hashed_password):
+    # Hand the connection back to the pool while bcrypt runs; the loaded row stays readable.
+    await db.close()
+    if not await verify_password(user_credentials.password, user.auth_credential.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
             detail="Invalid Credentials!"
         )
     
-    access_token, expire = create_access_token(data={"user_id": user.id})
+    access_token, expire = create_access_token(data={"user_id": user.id, "roles": list(user_result[1]), "pv": user.role_version})
+
+    refresh_token, refresh_token_row = create_refresh_token(user.id)
+    await db.execute(delete(RefreshToken).where(RefreshToken.user_id == user.id, RefreshToken.expires_at < func.now()))
+    db.add(refresh_token_row)
+    await db.commit()
 
     user_res = UserLoginResponse(
         id=user.id,
@@ -61,4 +74,81 @@ async def login_user(
     return {"access_token": access_token,
             "token_type": "bearer", 
             "user": user_res, 
-            "expire": expire}
+            "expire": expire,
+            "refresh_token": refresh_token,
+            "refresh_expire": refresh_token_row.expires_at}
+
+
+@router.post("/login/refresh",
+             status_code=status.HTTP_200_OK)
+async def refresh_access_token(
+        body: RefreshTokenRequest,
+        db: AsyncSession = Depends(get_db)
+    ):
+
+    invalid_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token không hợp lệ hoặc đã hết hạn",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+    stored = (await db.execute(select(RefreshToken)\
+        .where(RefreshToken.token_hash == hash_refresh_token(body.refresh_token))\
+        .with_for_update())).scalars().first()
+    if not stored:
+        raise invalid_exception
+
+    if stored.revoked_at is not None:
+        # A rotated token came back: someone else holds the chain, so end every session derived from it.
+        await db.execute(revoke_refresh_tokens(RefreshToken.family_id == stored.family_id))
+        await db.commit()
+        raise invalid_exception
+
+    if stored.expires_at <= datetime.now(timezone.utc):
+        raise invalid_exception
+
+    # The version is read first: roles changed in between then leave the token's claims stale, not wrong.
+    role_version = await db.scalar(select(User.role_version).where(User.id == stored.user_id))
+    roles = (await db.execute(select(Role.name)\
+        .join(UserRole, UserRole.role_id == Role.id)\
+        .where(UserRole.user_id == stored.user_id))).scalars().all()
+
+    refresh_token, refresh_token_row = create_refresh_token(stored.user_id, stored.family_id)
+    db.add(refresh_token_row)
+    await db.flush()
+    stored.revoked_at = func.now()
+    stored.replaced_by_id = refresh_token_row.id
+    await db.commit()
+
+    access_token, expire = create_access_token(data={"user_id": stored.user_id, "roles": list(roles), "pv": role_version})
+
+    return {"access_token": access_token,
+            "token_type": "bearer",
+            "expire": expire,
+            "refresh_token": refresh_token,
+            "refresh_expire": refresh_token_row.expires_at}
+
+
+@router.post("/logout",
+             status_code=status.HTTP_200_OK)
+async def logout_user(
+        body: Optional[RefreshTokenRequest] = None,
+        token: Optional[str] = Depends(oauth2_scheme),
+        db: AsyncSession = Depends(get_db),
+        current_user = Depends(get_current_user)
+    ):
+
+    if token:
+        token_data = verify_access_token(token, HTTPException(status_code=status.HTTP_401_UNAUTHORIZED))
+        if token_data.jti:
+            token_revocations.revoke_token(token_data.jti, token_data.exp or 0)
+
+    if body and body.refresh_token:
+        stored = (await db.execute(select(RefreshToken)\
+            .where(RefreshToken.token_hash == hash_refresh_token(body.refresh_token),
+                   RefreshToken.user_id == current_user.id))).scalars().first()
+        if stored:
+            await db.execute(revoke_refresh_tokens(RefreshToken.family_id == stored.family_id))
+            await db.commit()
+
+    return {"message": "Đăng xuất thành công"}
@@ -9,5 +9,29 @@ class Token(BaseModel):
     token_type: str
 
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+
 class Tokendata(BaseModel):
-    user_id: Optional[int] = None
\ No newline at end of file
+    user_id: Optional[int] = None
+    roles: Optional[list[str]] = None
+    pv: Optional[float] = None
+    jti: Optional[str] = None
+    iat: Optional[float] = None
+    exp: Optional[int] = None
+
+
+class Principal(BaseModel):
+    id: int
+    username: Optional[str] = None
+    full_name: Optional[str] = None
+    email: Optional[str] = None
+    is_active: Optional[bool] = None
+    roles: list[str] = []
+    # Set when authenticated by API key: only these permissions are granted, and only while the user's roles allow them.
+    api_key_id: Optional[int] = None
+    scopes: Optional[list[str]] = None
+
+    class Config:
+        from_attributes = True
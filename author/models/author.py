@@ -1,18 +1,29 @@
-from sqlalchemy import Column, String, Integer, text
+from sqlalchemy import Column, Index, String, Integer, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from configs.database import Base
+from configs.search import given_name, normalized_column, trigram_index
 
 
 class Author(Base):
     __tablename__ = "authors"
+    __table_args__ = (
+        trigram_index("ix_authors_name_normalized_trgm", "name_normalized"),
+        trigram_index("ix_authors_address_trgm", "address"),
+        trigram_index("ix_authors_pen_name_trgm", "pen_name"),
+        trigram_index("ix_authors_biography_trgm", "biography"),
+    )
 
     id = Column(Integer, primary_key=True, nullable=False)
     name = Column(String, nullable=False)
+    name_normalized = normalized_column("name")
     birthdate = Column(String, nullable=True)
     address = Column(String, nullable=True)
     pen_name = Column(String, nullable=True)
     biography = Column(String, nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
 
-    books = relationship("Book", back_populates="author", uselist=True)
\ No newline at end of file
+    books = relationship("Book", back_populates="author", uselist=True)
+
+
+Index("ix_authors_given_name_id", given_name(Author.name), Author.id)
@@ -1,15 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
-from fastapi.responses import JSONResponse, StreamingResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, Request, status
+from fastapi.responses import JSONResponse
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from sqlalchemy import func
+from sqlalchemy import delete, func, select, update
 from configs.authentication import get_current_user
-from configs.database import get_db
+from configs.database import get_db, get_read_db
+from configs.exports import ExportFormat, export_file
+from configs.imports import collect_errors, duplicated, import_excel, model_rows, to_text
+from configs.pagination import CountMode, paginate
+from configs.search import given_name, normalize_text
+from configs.snapshots import name_snapshot
 from author.models.author import Author
+from book.models.book import Book, search_vector_update
 from author.schemas.author import *
-import math
-import pandas as pd
-from io import BytesIO
 
 
 router = APIRouter(
@@ -22,11 +26,11 @@ router = APIRouter(
             response_model=ListAuthorResponse,
             status_code=status.HTTP_200_OK)
 async def get_authors(
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        authors = db.query(Author).all()
+        authors = (await db.execute(select(Author))).scalars().all()
 
         return ListAuthorResponse(
             authors=authors,
@@ -44,25 +48,24 @@ async def get_authors(
             response_model=AuthorPageableResponse,
             status_code=status.HTTP_200_OK)
 async def get_author_pageable(
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        total_count = db.query(Author).count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-        authors = db.query(Author)\
-            .order_by(
-                func.split_part(Author.name, ' ', func.array_length(func.string_to_array(Author.name, ' '), 1))
-            )\
-            .offset(offset).limit(page_size).all()
+        authors, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, select(Author), [given_name(Author.name), Author.id], page_size, page, cursor, include_total, count_mode)
 
         authors_pageable_res = AuthorPageableResponse(
             authors=authors,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
 
         return authors_pageable_res
@@ -77,37 +80,21 @@ async def get_author_pageable(
 @router.get("/export", 
             status_code=status.HTTP_200_OK)
 async def export_authors(
-        db: Session = Depends(get_db),
+        request: Request,
+        format: ExportFormat = "xlsx",
+        db: AsyncSession = Depends(get_read_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        authors = db.query(Author).all()
-        df = pd.DataFrame([{
-            "Số thứ tự": i + 1,
-            "Tên tác giả": a.name,
-            "Ngày sinh": a.birthdate,
-            "Địa chỉ": a.address,
-            "Bút danh": a.pen_name,
-            "Tiểu sử": a.biography
-        } for i, a in enumerate(authors)])
-        
-        output = BytesIO()
-        writer = pd.ExcelWriter(output, engine='xlsxwriter')
-        df.to_excel(writer, sheet_name='Authors', index=False)
-        writer.close()
-        output.seek(0)
-
-        headers = {
-            'Content-Disposition': 'attachment; filename="authors.xlsx"'
-        }
-        
-        return StreamingResponse(
-            output,
-            headers=headers,
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        query = select(Author.name, Author.birthdate, Author.address, Author.pen_name, Author.biography).order_by(Author.id)
+
+        return await export_file(
+            request, db, query,
+            ["Tên tác giả", "Ngày sinh", "Địa chỉ", "Bút danh", "Tiểu sử"],
+            "Authors", "authors", format, numbered=True
         )
-    
+
     except Exception as e:
         raise HTTPException(
             status_code=500, 
@@ -119,16 +106,11 @@ async def export_authors(
             response_model=ListAuthorNameResponse,
             status_code=status.HTTP_200_OK)
 async def get_author_names(
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
     ):
 
     try:
-        authors = db.query(Author).all()
-        authors_name_res = ListAuthorNameResponse(
-            authors=[AuthorName(id=a.id, name=a.name) for a in authors]
-        )
-
-        return authors_name_res
+        return await name_snapshot(db, Author, "authors")
     
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -141,11 +123,11 @@ async def get_author_names(
             response_model=AuthorResponse)
 async def search_author_by_id(
         id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        author = db.query(Author).filter(Author.id == id).first()
+        author = (await db.execute(select(Author).where(Author.id == id))).scalars().first()
         if not author:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -169,36 +151,36 @@ async def search_author_by_id(
             status_code=status.HTTP_200_OK)
 async def search_authors(
         info: AuthorSearch,
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        authors = db.query(Author)
+        authors = select(Author)
         if info.name and info.name.strip():
-            authors = authors.filter(func.lower(Author.name).like(f"%{info.name.strip().lower()}%"))
+            authors = authors.where(Author.name_normalized.like(f"%{normalize_text(info.name.strip())}%"))
         if info.birthdate:
-            authors = authors.filter(Author.birthdate == info.birthdate)
+            authors = authors.where(Author.birthdate == info.birthdate)
         if info.address and info.address.strip():
-            authors = authors.filter(func.lower(Author.address).like(f"%{info.address.strip().lower()}%"))
+            authors = authors.where(Author.address.ilike(f"%{info.address.strip()}%"))
         if info.pen_name and info.pen_name.strip():
-            authors = authors.filter(func.lower(Author.pen_name).like(f"%{info.pen_name.strip().lower()}%"))
+            authors = authors.where(Author.pen_name.ilike(f"%{info.pen_name.strip()}%"))
         if info.biography and info.biography.strip():
-            authors = authors.filter(func.lower(Author.biography).like(f"%{info.biography.strip().lower()}%"))
+            authors = authors.where(Author.biography.ilike(f"%{info.biography.strip()}%"))
 
-        total_count = authors.count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-        authors = authors.order_by(
-                func.split_part(Author.name, ' ', func.array_length(func.string_to_array(Author.name, ' '), 1))
-            )\
-            .offset(offset).limit(page_size).all()
+        authors, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, authors, [given_name(Author.name), Author.id], page_size, page, cursor, include_total, count_mode)
 
         return AuthorPageableResponse(
             authors=authors,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -212,12 +194,12 @@ async def search_authors(
             status_code=status.HTTP_201_CREATED)
 async def create_author(
         new_author: AuthorCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        author = db.query(Author).filter(Author.name == new_author.name).first()
+        author = (await db.execute(select(Author).where(Author.name == new_author.name))).scalars().first()
         if author:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -226,7 +208,7 @@ async def create_author(
 
         author = Author(**new_author.dict())
         db.add(author)
-        db.commit()
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -234,14 +216,14 @@ async def create_author(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -251,7 +233,7 @@ async def create_author(
 @router.post("/import")
 async def import_author(
         file: UploadFile,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
@@ -263,89 +245,28 @@ async def import_author(
         "Tiểu sử": "biography"
     }
     
-    if file.content_type not in ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel"]:
-        raise HTTPException(
-            status_code=400, 
-            detail="File không hợp lệ. Vui lòng upload file Excel."
-        )
-    
-    content = await file.read()
-    
-    try:
-        df = pd.read_excel(BytesIO(content))
+    existing_authors = set((await db.execute(select(Author.name, Author.birthdate))).all())
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Lỗi đọc file: {str(e)}"
-        )
-    
-    try:
-        df.rename(columns=COLUMN_MAPPING, inplace=True)
+    async def import_chunk(df):
+        df = df.assign(birthdate=to_text(df["birthdate"]))
+        # An author already exists when the same name and birthdate do; without a birthdate any name is accepted.
+        exists = duplicated(df[["name", "birthdate"]], existing_authors)
+        errors = collect_errors([
+            (df["name"].isna(), "Tên tác giả không được để trống."),
+            (exists, "Tác giả '{}' đã tồn tại.", df["name"])
+        ])
 
-    except KeyError as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Tiêu đề cột không hợp lệ: {str(e)}"
-        )
-    
-    existing_author_names = {a.name for a in db.query(Author).all()}
-    existing_author_dates = {a.birthdate for a in db.query(Author).all()}
-    errors = []
-    list_authors = []
-    
-    for index, row in df.iterrows():
-        name = row.get("name")
-        if not name:
-            errors.append({"Dòng": index + 2, "Lỗi": "Tên tác giả không được để trống."})
-            continue
-        
-        date = row.get("birthdate")
-        if name in existing_author_names and date and date in existing_author_dates:
-            errors.append({"Dòng": index + 2, "Lỗi": f"Tác giả '{name}' đã tồn tại."})
-            continue
-        
-        birthdate = None if pd.isna(row.get("birthdate")) else str(row.get("birthdate"))
-        address = None if pd.isna(row.get("address")) else row.get("address")
-        pen_name = None if pd.isna(row.get("pen_name")) else row.get("pen_name")
-        biography = None if pd.isna(row.get("biography")) else row.get("biography")
-        
-        author = Author(
-            name=name,
-            birthdate=birthdate,
-            address=address,
-            pen_name=pen_name,
-            biography=biography
-        )
-        list_authors.append(author)
-    
-    if errors:
-        return JSONResponse(
-            status_code=400,
-            content={"errors": errors}
-        )
-    
-    try:
-        db.bulk_save_objects(list_authors)
-        db.commit()
-        return JSONResponse(
-            status_code=201,
-            content={"message": "Import tác giả thành công"}
-        )
-    
-    except IntegrityError:
-        db.rollback()
-        raise HTTPException(
-            status_code=409, 
-            detail="Lỗi khi lưu dữ liệu vào database."
-        )
-    
-    except SQLAlchemyError as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
-        )
+        if not errors:
+            db.add_all([Author(**row) for row in model_rows(df)])
+        return errors
+
+    def chunk_committed(df):
+        df = df.assign(birthdate=to_text(df["birthdate"]))
+        existing_authors.update(df[["name", "birthdate"]].dropna().itertuples(index=False, name=None))
+
+    return await import_excel(
+        db, file, COLUMN_MAPPING, import_chunk, "Import tác giả thành công", chunk_committed=chunk_committed
+    )
 
 
 @router.put("/update/{id}",
@@ -354,23 +275,21 @@ async def import_author(
 async def update_author(
         id: int,
         new_author: AuthorUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        author = db.query(Author).filter(Author.id == id)
-        if not author.first():
+        author = (await db.execute(select(Author).where(Author.id == id))).scalars().first()
+        if not author:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Tác giả không tồn tại"
             )
         
-        author.update(
-            new_author.dict(), 
-            synchronize_session=False
-        )
-        db.commit()
+        await db.execute(update(Author).where(Author.id == id).values(new_author.dict()))
+        await db.execute(search_vector_update(Book.author_id == id))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -378,14 +297,14 @@ async def update_author(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -396,20 +315,23 @@ async def update_author(
                 status_code=status.HTTP_200_OK)
 async def delete_author(
         id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        author = db.query(Author).filter(Author.id == id)
-        if not author.first():
+        author = (await db.execute(select(Author).where(Author.id == id))).scalars().first()
+        if not author:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Tác giả không tồn tại"
             )
 
-        author.delete(synchronize_session=False)
-        db.commit()
+        book_ids = (await db.execute(select(Book.id).where(Book.author_id == id))).scalars().all()
+        await db.execute(delete(Author).where(Author.id == id))
+        if book_ids:
+            await db.execute(search_vector_update(Book.id.in_(book_ids)))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -417,14 +339,14 @@ async def delete_author(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -435,20 +357,23 @@ async def delete_author(
                 status_code=status.HTTP_200_OK)
 async def delete_authors(
         ids: AuthorDelete,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        authors = db.query(Author).filter(Author.id.in_(ids.list_id))
-        if not authors.first():
+        authors = (await db.execute(select(Author).where(Author.id.in_(ids.list_id)))).scalars().first()
+        if not authors:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Tác giả không tồn tại"
             )
 
-        authors.delete(synchronize_session=False)
-        db.commit()
+        book_ids = (await db.execute(select(Book.id).where(Book.author_id.in_(ids.list_id)))).scalars().all()
+        await db.execute(delete(Author).where(Author.id.in_(ids.list_id)))
+        if book_ids:
+            await db.execute(search_vector_update(Book.id.in_(book_ids)))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -456,14 +381,14 @@ async def delete_authors(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -473,13 +398,14 @@ async def delete_authors(
 @router.delete("/delete-all",
                 status_code=status.HTTP_200_OK)
 async def delete_all_authors(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        db.query(Author).delete()
-        db.commit()
+        await db.execute(delete(Author))
+        await db.execute(search_vector_update(Book.author_id.is_(None)))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -487,14 +413,14 @@ async def delete_all_authors(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
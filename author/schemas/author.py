@@ -38,8 +38,10 @@ class ListAuthorResponse(BaseModel):
 class AuthorPageableResponse(BaseModel):
     authors: list[AuthorResponse]
 
-    total_pages: int
-    total_data: int
+    total_pages: Optional[int] = None
+    total_data: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -1,27 +1,87 @@
-from sqlalchemy import Column, String, Integer, text, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Index, String, Integer, column, func, or_, text, ForeignKey, select, update, values
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from configs.database import Base
+from configs.search import normalized_column, search_document, trigram_index
+from author.models.author import Author
+from book_copy.models.book_copy import BookCopy
 
 
 class Book(Base):
     __tablename__ = "books"
+    __table_args__ = (
+        trigram_index("ix_books_name_normalized_trgm", "name_normalized"),
+        Index("ix_books_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_books_name_id", "name", "id"),
+    )
 
     id = Column(Integer, primary_key=True, nullable=False)
     name = Column(String, nullable=False)
+    name_normalized = normalized_column("name")
     status = Column(String, nullable=True)
     summary = Column(String, nullable=True)
     pages = Column(Integer, nullable=True)
     language = Column(String, nullable=True)
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
+    # Denormalized from book_copies: kept in step by copy_counts_update, repaired by `python -m book.reconcile`.
+    total_copies = Column(Integer, nullable=False, server_default=text("0"))
+    available_copies = Column(Integer, nullable=False, server_default=text("0"))
 
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
 
-    author_id = Column(Integer, ForeignKey("authors.id", ondelete="SET NULL"), nullable=True)
-    publisher_id = Column(Integer, ForeignKey("publishers.id", ondelete="SET NULL"), nullable=True)
-    category_id = Column(Integer, ForeignKey("categories.id", ondelete="SET NULL"), nullable=True)
+    author_id = Column(Integer, ForeignKey("authors.id", ondelete="SET NULL"), nullable=True, index=True)
+    publisher_id = Column(Integer, ForeignKey("publishers.id", ondelete="SET NULL"), nullable=True, index=True)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="SET NULL"), nullable=True, index=True)
 
     author = relationship("Author", back_populates="books")
     publisher = relationship("Publisher", back_populates="books")
     category = relationship("Category", back_populates="books")
 
     book_copies = relationship("BookCopy", back_populates="book", uselist=True)
+
+
+def search_vector_update(*criteria):
+    # Rebuilds search_vector for the matching books in one statement; call it whenever
+    # name, summary, author_id or the author's name changes.
+    author_name = select(Author.name).where(Author.id == Book.author_id).scalar_subquery()
+    return update(Book).where(*criteria).values(
+        search_vector=search_document(("A", Book.name), ("B", author_name), ("C", Book.summary))
+    ).execution_options(synchronize_session=False)
+
+
+def copy_counts_update(added=(), removed=()):
+    # Applies (book_id, status) copies that were inserted (added) or deleted (removed) to the books' counters
+    # in one statement; a status change is the copy removed with its old status and added with the new one.
+    # Increments rather than recounts, so concurrent writers to the same book don't overwrite each other:
+    # pass only the rows the write actually touched (e.g. from RETURNING).
+    deltas = {}
+    for sign, copies in ((1, added), (-1, removed)):
+        for book_id, status in copies:
+            total, available = deltas.get(book_id, (0, 0))
+            deltas[book_id] = (total + sign, available + (sign if status == "Có sẵn" else 0))
+    rows = [(book_id, total, available) for book_id, (total, available) in sorted(deltas.items()) if total or available]
+    if not rows:
+        return None
+
+    delta = values(column("book_id", Integer), column("total", Integer), column("available", Integer), name="delta").data(rows)
+    return update(Book).where(Book.id == delta.c.book_id).values(
+        total_copies=Book.total_copies + delta.c.total,
+        available_copies=Book.available_copies + delta.c.available
+    ).execution_options(synchronize_session=False)
+
+
+def copy_counts_reconcile(*criteria):
+    # Recounts the matching books from book_copies in one set-based UPDATE, touching only rows that drifted.
+    counts = select(
+        Book.id.label("book_id"),
+        func.count(BookCopy.id).label("total"),
+        func.count(BookCopy.id).filter(BookCopy.status == "Có sẵn").label("available")
+    ).outerjoin(BookCopy, BookCopy.book_id == Book.id).where(*criteria).group_by(Book.id).subquery()
+    return update(Book).where(
+        Book.id == counts.c.book_id,
+        or_(Book.total_copies != counts.c.total, Book.available_copies != counts.c.available)
+    ).values(
+        total_copies=counts.c.total,
+        available_copies=counts.c.available
+    ).execution_options(synchronize_session=False)
@@ -0,0 +1,41 @@
+from sqlalchemy import func, select
+from configs.database import engine
+from book.models.book import Book, copy_counts_reconcile
+# Every model has to be registered before the mappers can be configured.
+from api_key.models.api_key import ApiKey, ApiKeyPermission
+from auth_credential.models.auth_credential import AuthCredential
+from author.models.author import Author
+from book_copy.models.book_copy import BookCopy
+from bookshelf.models.bookshelf import Bookshelf
+from borrow.models.borrow import Borrow
+from category.models.category import Category
+from permission.models.permission import Permission
+from publisher.models.publisher import Publisher
+from refresh_token.models.refresh_token import RefreshToken
+from role.models.role import Role
+from role_permission.models.role_permission import RolePermission
+from user.models.user import User
+from user_role.models.user_role import UserRole
+
+
+BATCH_SIZE = 5000
+
+
+def main():
+    # Repairs drift in books.total_copies/available_copies, one id range per transaction.
+    repaired = 0
+    with engine.connect() as conn:
+        low, high = conn.execute(select(func.min(Book.id), func.max(Book.id))).first()
+    if low is not None:
+        for start in range(low, high + 1, BATCH_SIZE):
+            batch = (Book.id >= start, Book.id < start + BATCH_SIZE)
+            with engine.begin() as conn:
+                # Writers bump the counters while holding these row locks, so once they are ours the
+                # recount sees every committed copy and later writers apply their delta on top of it.
+                conn.execute(select(Book.id).where(*batch).with_for_update())
+                repaired += conn.execute(copy_counts_reconcile(*batch)).rowcount
+    print(f"Đã sửa số bản sao của {repaired} sách")
+
+
+if __name__ == "__main__":
+    main()
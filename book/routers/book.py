@@ -1,17 +1,23 @@
-from io import BytesIO
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from fastapi.responses import JSONResponse, StreamingResponse
-from sqlalchemy.orm import Session
+from typing import Optional
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, func, literal, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy.exc import SQLAlchemyError
 from author.models.author import Author
-from book_copy.models.book_copy import BookCopy
 from category.models.category import Category
 from publisher.models.publisher import Publisher
 from configs.authentication import get_current_user
-from configs.database import get_db
-from book.models.book import Book
+from configs.database import get_db, get_read_db
+from configs.exports import ExportFormat, export_file
+from configs.imports import collect_errors, import_excel, lookup, model_rows, to_integer
+from configs.pagination import CountMode, decode_cursor, encode_cursor, paginate
+from configs.query_budget import query_budget
+from configs.search import headline, normalize_text, search_query
+from configs.snapshots import name_snapshot
+from book.models.book import Book, search_vector_update
 from book.schemas.book import *
-import math
 import pandas as pd
 
 
@@ -21,15 +27,20 @@ router = APIRouter(
 )
 
 
+def book_query():
+    return select(Book).options(joinedload(Book.author), joinedload(Book.publisher), joinedload(Book.category))
+
+
 @router.get("/all",
             response_model=ListBookResponse,
-            status_code=status.HTTP_200_OK)
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(5))])
 async def get_books(
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        books = db.query(Book).all()
+        books = (await db.execute(book_query())).scalars().all()
 
         books = [BookResponse(
             id=b.id,
@@ -42,10 +53,8 @@ async def get_books(
             publisher=PublisherBase(id=b.publisher.id, name=b.publisher.name) if b.publisher else None,
             category=CategoryBase(id=b.category.id, name=b.category.name) if b.category else None,
             created_at=b.created_at,
-            available_copies=db.query(BookCopy)\
-                .filter(BookCopy.book_id == b.id, BookCopy.status == "Có sẵn").count(),
-            total_copies=db.query(BookCopy)\
-                .filter(BookCopy.book_id == b.id).count()
+            total_copies=b.total_copies,
+            available_copies=b.available_copies
         ) for b in books]
 
         return ListBookResponse(
@@ -62,18 +71,22 @@ async def get_books(
 
 @router.get("/pageable",
             response_model=BookPageableResponse,
-            status_code=status.HTTP_200_OK)
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(5))])
 async def get_genres_pageable(
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        total_data = db.query(Book).count()
-        total_pages = math.ceil(total_data / page_size)
-        offset = (page - 1) * page_size
-        books = db.query(Book).order_by(Book.name).offset(offset).limit(page_size).all() 
+        books, next_cursor, prev_cursor, total_data, total_pages = await paginate(
+            db,
+            book_query(),
+            [Book.name, Book.id], page_size, page, cursor, include_total, count_mode)
 
         books = [BookResponse(
             id=b.id,
@@ -86,16 +99,16 @@ async def get_genres_pageable(
             publisher=PublisherBase(id=b.publisher.id, name=b.publisher.name) if b.publisher else None,
             category=CategoryBase(id=b.category.id, name=b.category.name) if b.category else None,
             created_at=b.created_at,
-            available_copies=db.query(BookCopy)\
-                .filter(BookCopy.book_id == b.id, BookCopy.status == "Có sẵn").count(),
-            total_copies=db.query(BookCopy)\
-                .filter(BookCopy.book_id == b.id).count()
+            total_copies=b.total_copies,
+            available_copies=b.available_copies
         ) for b in books]
 
         return BookPageableResponse(
             total_data=total_data,
             total_pages=total_pages,
-            books=books
+            books=books,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -105,39 +118,38 @@ async def get_genres_pageable(
         )
         
 
-@router.get("/export", status_code=status.HTTP_200_OK)
+@router.get("/export",
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(5))])
 async def export_books(
-        db: Session = Depends(get_db), 
+        request: Request,
+        format: ExportFormat = "xlsx",
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        books = db.query(Book).all()
-        df = pd.DataFrame([{
-            "Số thứ tự": index + 1,
-            "Tên sách": book.name,
-            "Trạng thái": book.status,
-            "Tóm tắt": book.summary,
-            "Số trang": book.pages,
-            "Ngôn ngữ": book.language,
-            "Tác giả": book.author.name if book.author else "Không có tác giả",
-            "Nhà xuất bản": book.publisher.name if book.publisher else "Không có NXB",
-            "Thể loại": book.category.name if book.category else "Không có thể loại", 
-            "Số bản sao": db.query(BookCopy).filter(BookCopy.book_id == book.id).count()
-        } for index, book in enumerate(books)])
-
-        output = BytesIO()
-        writer = pd.ExcelWriter(output, engine='xlsxwriter')
-        df.to_excel(writer, sheet_name='Books', index=False)
-        writer.close()
-        output.seek(0)
-
-        return StreamingResponse(
-            output,
-            headers={'Content-Disposition': 'attachment; filename="authors.xlsx"'},
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        query = select(
+            Book.name,
+            Book.status,
+            Book.summary,
+            Book.pages,
+            Book.language,
+            func.coalesce(Author.name, "Không có tác giả"),
+            func.coalesce(Publisher.name, "Không có NXB"),
+            func.coalesce(Category.name, "Không có thể loại"),
+            Book.total_copies
+        ).outerjoin(Author, Book.author_id == Author.id)\
+            .outerjoin(Publisher, Book.publisher_id == Publisher.id)\
+            .outerjoin(Category, Book.category_id == Category.id)\
+            .order_by(Book.id)
+
+        return await export_file(
+            request, db, query,
+            ["Tên sách", "Trạng thái", "Tóm tắt", "Số trang", "Ngôn ngữ", "Tác giả", "Nhà xuất bản", "Thể loại", "Số bản sao"],
+            "Books", "books", format, numbered=True
         )
-    
+
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -149,15 +161,12 @@ async def export_books(
             response_model=ListBookNameResponse,
             status_code=status.HTTP_200_OK)
 async def get_all_books_by_name(
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        books = db.query(Book).all()
-        book_names = [BookNameResponse(id=b.id, name=b.name) for b in books]
-
-        return ListBookNameResponse(books=book_names)
+        return await name_snapshot(db, Book, "books")
 
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -167,29 +176,74 @@ async def get_all_books_by_name(
 
 
 
+@router.get("/fulltext",
+            response_model=ListBookFulltextResponse,
+            status_code=status.HTTP_200_OK)
+async def fulltext_search_books(
+        q: str,
+        limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_read_db)
+    ):
+
+    if not q.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Từ khóa tìm kiếm không được để trống"
+        )
+
+    try:
+        query = search_query(q.strip())
+        rank = func.ts_rank_cd(Book.search_vector, query)
+        books = select(Book, rank.label("rank"), headline(Book.name, query, highlight_all=True).label("name_highlight"),
+                       headline(Book.summary, query).label("summary_highlight"))\
+            .options(selectinload(Book.author))\
+            .where(Book.search_vector.op("@@")(query))
+        if cursor:
+            last_rank, last_id = decode_cursor(cursor, 2, (float, int))
+            books = books.where(tuple_(rank, Book.id) < tuple_(literal(last_rank), literal(last_id)))
+
+        rows = (await db.execute(books.order_by(rank.desc(), Book.id.desc()).limit(limit + 1))).all()
+        next_cursor = encode_cursor(rows[limit - 1].rank, rows[limit - 1].Book.id) if len(rows) > limit else None
+
+        books = [BookFulltextResponse(
+            id=row.Book.id,
+            name=row.Book.name,
+            summary=row.Book.summary,
+            author=AuthorBase(id=row.Book.author.id, name=row.Book.author.name) if row.Book.author else None,
+            rank=row.rank,
+            name_highlight=row.name_highlight,
+            summary_highlight=row.summary_highlight
+        ) for row in rows[:limit]]
+
+        return ListBookFulltextResponse(
+            books=books,
+            next_cursor=next_cursor
+        )
+
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
+        )
+
+
 @router.get("/{id}",
             response_model=BookResponse,
             status_code=status.HTTP_200_OK)
 async def get_book_by_id(
         id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        book = db.query(Book).filter(Book.id == id).first()
+        book = (await db.execute(select(Book).where(Book.id == id))).scalars().first()
         if not book:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Sách không tồn tại"
             )
-   
-        available_copies = db.query(Book).filter(
-            Book.id == id, 
-            Book.status == "Có sẵn"
-        ).count()
 
-        total_copies = db.query(Book).filter(Book.id == id).count()
-        
         book_data = {
             "id": book.id,
             "name": book.name,
@@ -200,8 +254,8 @@ async def get_book_by_id(
             "author_id": book.author_id,
             "publisher_id": book.publisher_id,
             "category_id": book.category_id,
-            "available_copies": available_copies, 
-            "total_copies": total_copies
+            "available_copies": book.available_copies,
+            "total_copies": book.total_copies
         }
         
         return JSONResponse(
@@ -218,28 +272,31 @@ async def get_book_by_id(
 
 @router.post("/search",
             response_model=BookPageableResponse, 
-            status_code=status.HTTP_200_OK)
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(5))])
 async def search_books(
         info: BookSearch,
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        books = db.query(Book)
+        books = book_query()
         if info.name:
-            books = books.filter(Book.name.ilike(f"%{info.name.strip()}%"))
+            books = books.where(Book.name_normalized.like(f"%{normalize_text(info.name.strip())}%"))
         if info.author_id:
-            books = books.filter(Book.author_id == info.author_id)
+            books = books.where(Book.author_id == info.author_id)
         if info.category_id:
-            books = books.filter(Book.category_id == info.category_id)
-
-        total_data = books.count()
-        total_pages = math.ceil(total_data / page_size)
-        offset = (page - 1) * page_size
+            books = books.where(Book.category_id == info.category_id)
 
-        books = books.order_by(Book.name).offset(offset).limit(page_size).all()  
+        books, next_cursor, prev_cursor, total_data, total_pages = await paginate(
+            db,
+            books,
+            [Book.name, Book.id], page_size, page, cursor, include_total, count_mode)
 
         books = [BookResponse(
             id=b.id,
@@ -252,16 +309,16 @@ async def search_books(
             publisher=PublisherBase(id=b.publisher.id, name=b.publisher.name) if b.publisher else None,
             category=CategoryBase(id=b.category.id, name=b.category.name) if b.category else None,
             created_at=b.created_at,
-            available_copies=db.query(BookCopy)\
-                .filter(BookCopy.book_id == b.id, BookCopy.status == "Có sẵn").count(),
-            total_copies=db.query(BookCopy)\
-                .filter(BookCopy.book_id == b.id).count()
+            total_copies=b.total_copies,
+            available_copies=b.available_copies
         ) for b in books]
         
         return BookPageableResponse(
             books=books, 
             total_data=total_data, 
-            total_pages=total_pages
+            total_pages=total_pages,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -274,12 +331,12 @@ async def search_books(
 @router.post("/create")
 async def create_book(
         new_book: BookCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        book = db.query(Book).filter(Book.name == new_book.name).first()
+        book = (await db.execute(select(Book).where(Book.name == new_book.name))).scalars().first()
         if book:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -287,7 +344,10 @@ async def create_book(
             )
 
         book = Book(**new_book.dict())
-        db.commit()
+        db.add(book)
+        await db.flush()
+        await db.execute(search_vector_update(Book.id == book.id))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -295,7 +355,7 @@ async def create_book(
         )
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -307,7 +367,7 @@ async def create_book(
             status_code=status.HTTP_201_CREATED)
 async def import_books(
         file: UploadFile = File(...),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
@@ -322,104 +382,56 @@ async def import_books(
         "Thể loại": "category_name"
     }
     
-    if file.content_type not in ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel"]:
-        raise HTTPException(
-            status_code=400, 
-            detail="File không hợp lệ. Vui lòng upload file Excel."
-        )
-    
-    content = await file.read()
-    
-    try:
-        df = pd.read_excel(BytesIO(content))
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Lỗi đọc file: {str(e)}"
-        )
-    
-    try:
-        df.rename(columns=COLUMN_MAPPING, inplace=True)
-    except KeyError as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Tiêu đề cột không hợp lệ: {str(e)}"
-        )
-    
-    author_map = {a.name: a.id for a in db.query(Author).all()}
-    publisher_map = {p.name: p.id for p in db.query(Publisher).all()}
-    category_map = {c.name: c.id for c in db.query(Category).all()}
-    
-    errors = []
-    list_books = []
-    
-    for index, row in df.iterrows():
-        name = row.get("name")
-        if not name:
-            errors.append({"Dòng": index + 2, "Lỗi": "Tên sách không được để trống."})
-            continue
-        
-        author_id = author_map.get(row.get("author_name"))
-        publisher_id = publisher_map.get(row.get("publisher_name"))
-        category_id = category_map.get(row.get("category_name"))
-        
-        status = None if pd.isna(row.get("status")) else row.get("status")
-        summary = None if pd.isna(row.get("summary")) else row.get("summary")
-        pages = None if pd.isna(row.get("pages")) else int(row.get("pages"))
-        language = None if pd.isna(row.get("language")) else row.get("language")
-        
-        book = Book(
-            name=name,
-            status=status,
-            summary=summary,
-            pages=pages,
-            language=language,
-            author_id=author_id,
-            publisher_id=publisher_id,
-            category_id=category_id
-        )
-        list_books.append(book)
-    
-    if errors:
-        return JSONResponse(
-            status_code=400, 
-            content={"errors": errors}
-        )
-    
-    try:
-        db.bulk_save_objects(list_books)
-        db.commit()
-        return JSONResponse(
-            status_code=201, 
-            content={"message": "Import sách thành công"}
-        )
-   
-    except SQLAlchemyError as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=409,
-            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
-        )
+    author_map = dict((await db.execute(select(Author.name, Author.id))).all())
+    publisher_map = dict((await db.execute(select(Publisher.name, Publisher.id))).all())
+    category_map = dict((await db.execute(select(Category.name, Category.id))).all())
+
+    async def import_chunk(df):
+        pages, invalid_pages = to_integer(df["pages"])
+        errors = collect_errors([
+            (df["name"].isna(), "Tên sách không được để trống."),
+            (invalid_pages, "Số trang '{}' không hợp lệ.", df["pages"])
+        ])
+        if errors:
+            return errors
+
+        list_books = [Book(**row) for row in model_rows(pd.DataFrame({
+            "name": df["name"],
+            "status": df["status"],
+            "summary": df["summary"],
+            "pages": pages,
+            "language": df["language"],
+            "author_id": lookup(df["author_name"], author_map),
+            "publisher_id": lookup(df["publisher_name"], publisher_map),
+            "category_id": lookup(df["category_name"], category_map)
+        }))]
+        db.add_all(list_books)
+        await db.flush()
+        await db.execute(search_vector_update(Book.id.in_([b.id for b in list_books])))
+        return errors
+
+    return await import_excel(db, file, COLUMN_MAPPING, import_chunk, "Import sách thành công")
 
 
 @router.put("/update/{id}")
 async def update_book(
         id: int,
         book: BookUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        book_db = db.query(Book).filter(Book.id == id)
-        if not book_db.first():
+        book_db = (await db.execute(select(Book).where(Book.id == id))).scalars().first()
+        if not book_db:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Sách không tồn tại"
             )
 
-        book_db.update(book.dict(), synchronize_session=False)
-        db.commit()
+        await db.execute(update(Book).where(Book.id == id).values(book.dict()))
+        await db.execute(search_vector_update(Book.id == id))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -427,7 +439,7 @@ async def update_book(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -437,20 +449,20 @@ async def update_book(
 @router.delete("/delete/{id}")
 async def delete_book(
         id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        book = db.query(Book).filter(Book.id == id)
-        if not book.first():
+        book = (await db.execute(select(Book).where(Book.id == id))).scalars().first()
+        if not book:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Sách không tồn tại"
             )
 
-        book.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(Book).where(Book.id == id))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -458,7 +470,7 @@ async def delete_book(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -468,20 +480,20 @@ async def delete_book(
 @router.delete("/delete-many")
 async def delete_books(
         ids: DeleteMany,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        books = db.query(Book).filter(Book.id.in_(ids.ids))
-        if not books.first():
+        books = (await db.execute(select(Book).where(Book.id.in_(ids.ids)))).scalars().first()
+        if not books:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Sách không tồn tại"
             )
 
-        books.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(Book).where(Book.id.in_(ids.ids)))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -489,7 +501,7 @@ async def delete_books(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -498,13 +510,13 @@ async def delete_books(
 
 @router.delete("/delete-all")
 async def delete_all_books(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        db.query(Book).delete()
-        db.commit()
+        await db.execute(delete(Book))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -512,7 +524,7 @@ async def delete_all_books(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -73,8 +73,10 @@ class ListBookResponse(BaseModel):
 class BookPageableResponse(BaseModel):
     books: list[BookResponse]
 
-    total_pages: int
-    total_data: int
+    total_pages: Optional[int] = None
+    total_data: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -103,3 +105,24 @@ class ListBookNameResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class BookFulltextResponse(BaseModel):
+    id: int
+    name: str
+    summary: Optional[str] = None
+    author: Optional[AuthorBase] = None
+    rank: float
+    name_highlight: str
+    summary_highlight: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ListBookFulltextResponse(BaseModel):
+    books: list[BookFulltextResponse]
+    next_cursor: Optional[str] = None
+
+    class Config:
+        from_attributes = True
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, text, ForeignKey
+from sqlalchemy import Column, String, Integer, text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from configs.database import Base
@@ -6,14 +6,18 @@ from configs.database import Base
 
 class BookCopy(Base):
     __tablename__ = "book_copies"
+    __table_args__ = (
+        Index("ix_book_copies_book_id_status", "book_id", "status"),
+        Index("ix_book_copies_available_book_id", "book_id", postgresql_where=text("status = 'Có sẵn'")),
+    )
 
     id = Column(Integer, primary_key=True, nullable=False)
-    status = Column(String, nullable=False, server_default=text("'AVAILABLE'"))
+    status = Column(String, nullable=False, server_default=text("'AVAILABLE'"), index=True)
 
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
 
     book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
-    bookshelf_id = Column(Integer, ForeignKey("bookshelfs.id", ondelete="SET NULL"), nullable=True)
+    bookshelf_id = Column(Integer, ForeignKey("bookshelfs.id", ondelete="SET NULL"), nullable=True, index=True)
 
     book = relationship("Book", back_populates="book_copies")
     bookshelf = relationship("Bookshelf", back_populates="book_copies")
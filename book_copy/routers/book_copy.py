@@ -1,16 +1,21 @@
-from io import BytesIO
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, Request, status
 from fastapi.params import File
-from fastapi.responses import JSONResponse, StreamingResponse
-from sqlalchemy.orm import Session, joinedload
+from fastapi.responses import JSONResponse
+from typing import Optional
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import SQLAlchemyError
-from book.models.book import Book
+from book.models.book import Book, copy_counts_update
 from bookshelf.models.bookshelf import Bookshelf
 from configs.authentication import get_current_user
-from configs.database import get_db
+from configs.database import get_db, get_read_db
+from configs.exports import ExportFormat, export_file
+from configs.imports import collect_errors, import_excel, lookup, model_rows
+from configs.pagination import CountMode, paginate
+from configs.query_budget import query_budget
 from book_copy.models.book_copy import BookCopy
 from book_copy.schemas.book_copy import *
-import math
 import pandas as pd
 
 
@@ -24,19 +29,18 @@ router = APIRouter(
             response_model=ListBookCopyResponse,
             status_code=status.HTTP_200_OK)
 async def get_book_copies(
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        book_copies = db.query(BookCopy)\
+        book_copies = (await db.execute(select(BookCopy)\
             .join(Book)\
             .outerjoin(Bookshelf)\
             .options(
                 joinedload(BookCopy.book),
                 joinedload(BookCopy.bookshelf)
             )\
-            .order_by(Book.name)\
-            .all()
+            .order_by(Book.name))).scalars().all()
 
         return ListBookCopyResponse(
             book_copies=book_copies, 
@@ -52,29 +56,28 @@ async def get_book_copies(
 
 @router.get("/pageable",
             response_model=BookCopyPageableResponse,
-            status_code=status.HTTP_200_OK)
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(5))])
 async def get_book_copy_pageable(
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        total_count = db.query(BookCopy).count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-
-        book_copies = db.query(BookCopy)\
-            .join(Book)\
-            .outerjoin(Bookshelf)\
-            .options(
-                joinedload(BookCopy.book),
-                joinedload(BookCopy.bookshelf)
-            )\
-            .order_by(Book.name)\
-            .offset(offset)\
-            .limit(page_size)\
-            .all()
+        book_copies, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db,
+            select(BookCopy)\
+                .join(Book)\
+                .outerjoin(Bookshelf)\
+                .options(
+                    joinedload(BookCopy.book),
+                    joinedload(BookCopy.bookshelf)
+                ),
+            [Book.name, Book.id, BookCopy.id], page_size, page, cursor, include_total, count_mode)
             
         list_book_copies = [BookCopyResponse(
             id=book_copy.id,
@@ -86,7 +89,9 @@ async def get_book_copy_pageable(
         return BookCopyPageableResponse(
             total_data=total_count,
             total_pages=total_pages,
-            book_copies=list_book_copies
+            book_copies=list_book_copies,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -99,38 +104,23 @@ async def get_book_copy_pageable(
 @router.get("/export",
             status_code=status.HTTP_200_OK)
 async def export_book_copies(
-        db: Session = Depends(get_db)
+        request: Request,
+        format: ExportFormat = "xlsx",
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        book_copies = db.query(BookCopy)\
-            .join(Book)\
-            .outerjoin(Bookshelf)\
-            .options(
-                joinedload(BookCopy.book),
-                joinedload(BookCopy.bookshelf)
-            )\
-            .all()
-
-        df = pd.DataFrame([{
-            "Số thứ tự": index + 1,
-            "Tên sách": book_copy.book.name,
-            "Tên kệ sách": book_copy.bookshelf.name if book_copy.bookshelf else None,
-            "Trạng thái": book_copy.status
-        } for index, book_copy in enumerate(book_copies)])
-
-        output = BytesIO()
-        writer = pd.ExcelWriter(output, engine="xlsxwriter")
-        df.to_excel(writer, sheet_name="Book_copy", index=False)
-        writer.close()
-        output.seek(0)
-
-        headers = {
-            'Content-Disposition': 'attachment; filename="book_copies.xlsx"',
-            'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        }
-
-        return StreamingResponse(output, headers=headers)
+        query = select(Book.name, Bookshelf.name, BookCopy.status)\
+            .select_from(BookCopy)\
+            .join(Book, BookCopy.book_id == Book.id)\
+            .outerjoin(Bookshelf, BookCopy.bookshelf_id == Bookshelf.id)\
+            .order_by(BookCopy.id)
+
+        return await export_file(
+            request, db, query,
+            ["Tên sách", "Tên kệ sách", "Trạng thái"],
+            "Book_copy", "book_copies", format, numbered=True
+        )
 
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -144,11 +134,13 @@ async def export_book_copies(
             status_code=status.HTTP_200_OK)
 async def get_book_copy_by_id(
         id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        book_copy = db.query(BookCopy).filter(BookCopy.id == id).first()
+        book_copy = (await db.execute(select(BookCopy)\
+            .options(joinedload(BookCopy.book), joinedload(BookCopy.bookshelf))\
+            .where(BookCopy.id == id))).scalars().first()
         if not book_copy:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -165,31 +157,46 @@ async def get_book_copy_by_id(
     
 
 @router.post("/search",
-            response_model=ListBookCopyResponse,
-            status_code=status.HTTP_200_OK)
+            response_model=BookCopyPageableResponse,
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(5))])
 async def search_book_copy(
         search: BookCopySearch,
-        page: int = 1,
         page_size: int = 10,
-        db: Session = Depends(get_db)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        book_copies = db.query(BookCopy)
+        book_copies = select(BookCopy)\
+            .join(Book)\
+            .options(
+                joinedload(BookCopy.book),
+                joinedload(BookCopy.bookshelf)
+            )
 
         if search.status:
-            book_copies = book_copies.filter(BookCopy.status == search.status)
+            book_copies = book_copies.where(BookCopy.status == search.status)
 
-        total_count = book_copies.count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
+        book_copies, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, book_copies, [Book.name, Book.id, BookCopy.id], page_size, page, cursor, include_total, count_mode)
 
-        book_copies = book_copies.order_by(Book.name).offset(offset).limit(page_size).all()
+        list_book_copies = [BookCopyResponse(
+            id=book_copy.id,
+            book=BookBase(**book_copy.book.__dict__),
+            bookshelf=BookshelfBase(**book_copy.bookshelf.__dict__) if book_copy.bookshelf else None, 
+            status=book_copy.status 
+        ) for book_copy in book_copies]
 
-        return ListBookCopyResponse(
-            book_copies=book_copies, 
+        return BookCopyPageableResponse(
+            book_copies=list_book_copies,
             total_data=total_count,
-            total_pages=total_pages
+            total_pages=total_pages,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -203,14 +210,16 @@ async def search_book_copy(
             status_code=status.HTTP_201_CREATED)
 async def create_book_copy(
         new_book_copy: BookCopyCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
         book_copy = BookCopy(**new_book_copy.dict())
         db.add(book_copy)
-        db.commit()
+        await db.flush()
+        await db.execute(copy_counts_update(added=[(book_copy.book_id, book_copy.status)]))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -218,7 +227,7 @@ async def create_book_copy(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -228,7 +237,7 @@ async def create_book_copy(
 @router.post("/import")
 async def import_book_copies(
         file: UploadFile = File(...),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
@@ -238,71 +247,28 @@ async def import_book_copies(
         "Tên kệ sách": "bookshelf_name"
     }
     
-    if file.content_type not in ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel"]:
-        raise HTTPException(
-            status_code=400, 
-            detail="File không hợp lệ. Vui lòng upload file Excel."
-        )
-    
-    content = await file.read()
-    try:
-        df = pd.read_excel(BytesIO(content))
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Lỗi đọc file: {str(e)}"
-        )
-    
-    try:
-        df.rename(columns=COLUMN_MAPPING, inplace=True)
-    except KeyError as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Tiêu đề cột không hợp lệ: {str(e)}"
-        )
-    
-    book_name_to_id = {b.name: b.id for b in db.query(Book).all()}
-    bookshelf_name_to_id = {bs.name: bs.id for bs in db.query(Bookshelf).all()}
-    
-    errors = []
-    list_book_copies = []
-    
-    for index, row in df.iterrows():
-        book_id = book_name_to_id.get(row.get("book_name"))
-        bookshelf_id = bookshelf_name_to_id.get(row.get("bookshelf_name")) if row.get("bookshelf_name") else None
-        status = row.get("status", "AVAILABLE")
-        
-        if not book_id:
-            errors.append({"Line": index + 2, "Error": f"Sách '{row.get('book_name')}' không tồn tại."})
-            continue
-        
-        book_copy = BookCopy(
-            status=status,
-            book_id=book_id,
-            bookshelf_id=bookshelf_id
-        )
-        list_book_copies.append(book_copy)
-       
-    if errors:
-        return JSONResponse(
-            status_code=400,
-            content={"errors": errors}
-        )
-    
-    try:
-        db.bulk_save_objects(list_book_copies)
-        db.commit()
-        return JSONResponse(
-            status_code=201,
-            content={"message": "Nhập dữ liệu thành công"}
-        )
-    
-    except SQLAlchemyError as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=409,
-            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
-        )
+    book_name_to_id = dict((await db.execute(select(Book.name, Book.id))).all())
+    bookshelf_name_to_id = dict((await db.execute(select(Bookshelf.name, Bookshelf.id))).all())
+
+    async def import_chunk(df):
+        book_ids = lookup(df["book_name"], book_name_to_id)
+        errors = collect_errors([
+            (book_ids.isna(), "Sách '{}' không tồn tại.", df["book_name"])
+        ], "Line", "Error")
+        if errors:
+            return errors
+
+        list_book_copies = [BookCopy(**row) for row in model_rows(pd.DataFrame({
+            "status": df["status"].where(df["status"].notna(), "AVAILABLE"),
+            "book_id": book_ids,
+            "bookshelf_id": lookup(df["bookshelf_name"], bookshelf_name_to_id)
+        }))]
+        db.add_all(list_book_copies)
+        await db.flush()
+        await db.execute(copy_counts_update(added=[(c.book_id, c.status) for c in list_book_copies]))
+        return errors
+
+    return await import_excel(db, file, COLUMN_MAPPING, import_chunk, "Nhập dữ liệu thành công", line_key="Line", error_key="Error")
 
 
 @router.put("/update/{id}",
@@ -310,23 +276,20 @@ async def import_book_copies(
 async def update_book_copy(
         id: int,
         book_copy: BookCopyUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        book_copy_db = db.query(BookCopy).filter(BookCopy.id == id)
-        if not book_copy_db.first():
+        book_copy_db = (await db.execute(select(BookCopy).where(BookCopy.id == id))).scalars().first()
+        if not book_copy_db:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Bản sao sách không tồn tại"
             )
 
-        book_copy_db.update(
-            book_copy.dict(), 
-            synchronize_session=False
-        )
-        db.commit()
+        await db.execute(update(BookCopy).where(BookCopy.id == id).values(book_copy.dict()))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -334,7 +297,7 @@ async def update_book_copy(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -345,20 +308,24 @@ async def update_book_copy(
             status_code=status.HTTP_200_OK)
 async def delete_book_copy(
         id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        book_copy = db.query(BookCopy).filter(BookCopy.id == id)
-        if not book_copy.first():
+        book_copy = (await db.execute(select(BookCopy).where(BookCopy.id == id))).scalars().first()
+        if not book_copy:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Bản sao sách không tồn tại"
             )
 
-        book_copy.delete(synchronize_session=False)
-        db.commit()
+        deleted = (await db.execute(delete(BookCopy)\
+            .where(BookCopy.id == id)\
+            .returning(BookCopy.book_id, BookCopy.status))).all()
+        if deleted:
+            await db.execute(copy_counts_update(removed=deleted))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -366,7 +333,7 @@ async def delete_book_copy(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -377,20 +344,24 @@ async def delete_book_copy(
             status_code=status.HTTP_200_OK)
 async def delete_book_copies(
         ids: DeleteMany, 
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        book_copies = db.query(BookCopy).filter(BookCopy.id.in_(ids.ids))
-        if not book_copies.first():
+        book_copies = (await db.execute(select(BookCopy).where(BookCopy.id.in_(ids.ids)))).scalars().first()
+        if not book_copies:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Bản sao sách không tồn tại"
             )
 
-        book_copies.delete(synchronize_session=False)
-        db.commit()
+        deleted = (await db.execute(delete(BookCopy)\
+            .where(BookCopy.id.in_(ids.ids))\
+            .returning(BookCopy.book_id, BookCopy.status))).all()
+        if deleted:
+            await db.execute(copy_counts_update(removed=deleted))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -398,7 +369,7 @@ async def delete_book_copies(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -408,13 +379,16 @@ async def delete_book_copies(
 @router.delete("/delete-all",
             status_code=status.HTTP_200_OK)
 async def delete_all_book_copies(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        db.query(BookCopy).delete()
-        db.commit()
+        await db.execute(delete(BookCopy))
+        await db.execute(update(Book)\
+            .where(or_(Book.total_copies != 0, Book.available_copies != 0))\
+            .values(total_copies=0, available_copies=0))
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -423,7 +397,7 @@ async def delete_all_book_copies(
 
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
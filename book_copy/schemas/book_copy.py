@@ -51,8 +51,10 @@ class ListBookCopyResponse(BaseModel):
 
 class BookCopyPageableResponse(BaseModel):
     book_copies: List[BookCopyResponse]
-    total_data: int
+    total_data: Optional[int] = None
     total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -2,10 +2,14 @@ from sqlalchemy import Column, String, Integer, text, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from configs.database import Base
+from configs.search import trigram_index
 
 
 class Bookshelf(Base):
     __tablename__ = "bookshelfs"
+    __table_args__ = (
+        trigram_index("ix_bookshelfs_name_trgm", "name"),
+    )
 
     id = Column(Integer, primary_key=True, nullable=False)
     name = Column(String, unique=True, nullable=False)
@@ -1,14 +1,17 @@
-from io import BytesIO
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from fastapi.responses import JSONResponse, StreamingResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, Request, status
+from fastapi.responses import JSONResponse
+from typing import Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from configs.authentication import get_current_user
-from configs.database import get_db
+from configs.database import get_db, get_read_db
+from configs.exports import ExportFormat, export_file
+from configs.imports import collect_errors, duplicated, import_excel, model_rows
+from configs.pagination import CountMode, paginate
+from configs.snapshots import name_snapshot
 from bookshelf.models.bookshelf import Bookshelf
 from bookshelf.schemas.bookshelf import *
-import math
-import pandas as pd
 
 
 router = APIRouter(
@@ -21,11 +24,11 @@ router = APIRouter(
             response_model=ListBookshelfResponse,
             status_code=status.HTTP_200_OK)
 async def get_bookshelfs(
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        bookshelfs = db.query(Bookshelf).all()
+        bookshelfs = (await db.execute(select(Bookshelf))).scalars().all()
 
         return ListBookshelfResponse(
             bookshelfs=bookshelfs,
@@ -43,22 +46,24 @@ async def get_bookshelfs(
             response_model=BookshelfPageableResponse,
             status_code=status.HTTP_200_OK)
 async def get_bookshelf_pageable(
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        total_count = db.query(Bookshelf).count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-
-        bookshelfs = db.query(Bookshelf).offset(offset).limit(page_size).all()
+        bookshelfs, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, select(Bookshelf), [Bookshelf.id], page_size, page, cursor, include_total, count_mode)
 
         return BookshelfPageableResponse(
             total_data=total_count,
             total_pages=total_pages,
-            bookshelfs=bookshelfs
+            bookshelfs=bookshelfs,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -71,33 +76,21 @@ async def get_bookshelf_pageable(
 @router.get("/export",
             status_code=status.HTTP_200_OK)
 async def export_bookshelfs(
-        db: Session = Depends(get_db),
+        request: Request,
+        format: ExportFormat = "xlsx",
+        db: AsyncSession = Depends(get_read_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        bookshelfs = db.query(Bookshelf).all()
-        df = pd.DataFrame([{
-            "Tên kệ sách": b.name,
-            "Trạng thái": b.status
-        } for b in bookshelfs])
-        
-        output = BytesIO()
-        writer = pd.ExcelWriter(output, engine='xlsxwriter')
-        df.to_excel(writer, sheet_name='Bookshelfs', index=False)
-        writer.close()
-        output.seek(0)
-
-        headers = {
-            'Content-Disposition': 'attachment; filename="bookshelfs.xlsx"'
-        }
-        
-        return StreamingResponse(
-            output,
-            headers=headers,
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        query = select(Bookshelf.name, Bookshelf.status).order_by(Bookshelf.id)
+
+        return await export_file(
+            request, db, query,
+            ["Tên kệ sách", "Trạng thái"],
+            "Bookshelfs", "bookshelfs", format
         )
-    
+
     except Exception as e:
         raise HTTPException(
             status_code=500, 
@@ -108,16 +101,11 @@ async def export_bookshelfs(
 @router.get("/name", 
             response_model=ListBookshelfNameResponse)
 async def get_bookshelf_name(
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        bookshelfs = db.query(Bookshelf).all()
-        bookshelf_names = [BookshelfNameResponse(id=b.id, name=b.name) for b in bookshelfs]
-
-        return ListBookshelfNameResponse(
-            bookshelfs=bookshelf_names
-        )
+        return await name_snapshot(db, Bookshelf, "bookshelfs")
 
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -131,11 +119,11 @@ async def get_bookshelf_name(
             status_code=status.HTTP_200_OK)
 async def get_bookshelf_by_id(
         id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        bookshelf = db.query(Bookshelf).filter(Bookshelf.id == id).first()
+        bookshelf = (await db.execute(select(Bookshelf).where(Bookshelf.id == id))).scalars().first()
         if not bookshelf:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -156,28 +144,30 @@ async def get_bookshelf_by_id(
             status_code=status.HTTP_200_OK)
 async def search_bookshelf(
         info: BookshelfSearch,
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        bookshelfs = db.query(Bookshelf)
+        bookshelfs = select(Bookshelf)
         if info.name:
-            bookshelfs = bookshelfs.filter(Bookshelf.name.ilike(f"%{info.name}%"))
+            bookshelfs = bookshelfs.where(Bookshelf.name.ilike(f"%{info.name}%"))
         if info.status:
-            bookshelfs = bookshelfs.filter(Bookshelf.status == info.status)
+            bookshelfs = bookshelfs.where(Bookshelf.status == info.status)
 
-        total_count = bookshelfs.count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-
-        bookshelfs = bookshelfs.order_by(Bookshelf.name).offset(offset).limit(page_size).all()
+        bookshelfs, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, bookshelfs, [Bookshelf.name, Bookshelf.id], page_size, page, cursor, include_total, count_mode)
         
         return BookshelfPageableResponse(
             total_data=total_count,
             total_pages=total_pages,
-            bookshelfs=bookshelfs
+            bookshelfs=bookshelfs,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -192,12 +182,12 @@ async def search_bookshelf(
             status_code=status.HTTP_201_CREATED)
 async def create_bookshelf(
         new_bookshelf: BookshelfCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        bookshelf = db.query(Bookshelf).filter(Bookshelf.name == new_bookshelf.name).first()
+        bookshelf = (await db.execute(select(Bookshelf).where(Bookshelf.name == new_bookshelf.name))).scalars().first()
         if bookshelf:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -206,7 +196,7 @@ async def create_bookshelf(
 
         bookshelf = Bookshelf(**new_bookshelf.dict())
         db.add(bookshelf)
-        db.commit()
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Tạo tủ sách thành công"},
@@ -214,14 +204,14 @@ async def create_bookshelf(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -233,7 +223,7 @@ async def create_bookshelf(
             status_code=status.HTTP_201_CREATED)
 async def import_bookshelfs(
         file: UploadFile = File(...),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
@@ -242,71 +232,26 @@ async def import_bookshelfs(
         "Trạng thái": "status"
     }
     
-    if file.content_type not in ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel"]:
-        raise HTTPException(
-            status_code=400, 
-            detail="File không hợp lệ. Vui lòng upload file Excel."
-        )
-    
-    content = await file.read()
+    existing_bookshelf_names = set((await db.execute(select(Bookshelf.name))).scalars().all())
 
-    try:
-        df = pd.read_excel(BytesIO(content))
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Lỗi đọc file: {str(e)}"
-        )
-    
-    try:
-        df.rename(columns=COLUMN_MAPPING, inplace=True)
-    except KeyError as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Tiêu đề cột không hợp lệ: {str(e)}"
-        )
-    
-    errors = []
-    list_bookshelves = []
-    
-    for index, row in df.iterrows():
-        name = row.get("name")
-        if not name:
-            errors.append({"Line": index + 2, "Error": "Tên kệ sách không được để trống."})
-            continue
-        
-        if db.query(Bookshelf).filter_by(name=name).first():
-            errors.append({"Line": index + 2, "Error": f"Kệ sách '{name}' đã tồn tại."})
-            continue
-        
-        status = None if pd.isna(row.get("status")) else row.get("status")
-        
-        bookshelf = Bookshelf(
-            name=name,
-            status=status
-        )
-        list_bookshelves.append(bookshelf)
-    
-    if errors:
-        return JSONResponse(
-            content={"errors": errors},
-            status_code=400
-        )
-    
-    try:
-        db.bulk_save_objects(list_bookshelves)
-        db.commit()
-        return JSONResponse(
-            content={"message": "Import dữ liệu thành công"},
-            status_code=201
-        )
-    
-    except SQLAlchemyError as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=409,
-            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
-        )
+    async def import_chunk(df):
+        exists = duplicated(df["name"], existing_bookshelf_names)
+        errors = collect_errors([
+            (df["name"].isna(), "Tên kệ sách không được để trống."),
+            (exists, "Kệ sách '{}' đã tồn tại.", df["name"])
+        ], "Line", "Error")
+
+        if not errors:
+            db.add_all([Bookshelf(**row) for row in model_rows(df)])
+        return errors
+
+    def chunk_committed(df):
+        existing_bookshelf_names.update(df["name"].dropna())
+
+    return await import_excel(
+        db, file, COLUMN_MAPPING, import_chunk, "Import dữ liệu thành công",
+        line_key="Line", error_key="Error", chunk_committed=chunk_committed
+    )
 
 
 @router.put("/update/{id}",
@@ -315,23 +260,20 @@ async def import_bookshelfs(
 async def update_bookshelf(
         id: int,
         bookshelf: BookshelfUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        bookshelf_db = db.query(Bookshelf).filter(Bookshelf.id == id)
-        if not bookshelf_db.first():
+        bookshelf_db = (await db.execute(select(Bookshelf).where(Bookshelf.id == id))).scalars().first()
+        if not bookshelf_db:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Tủ sách không tồn tại"
             )
 
-        bookshelf_db.update(
-            bookshelf.dict(), 
-            synchronize_session=False
-        )
-        db.commit()
+        await db.execute(update(Bookshelf).where(Bookshelf.id == id).values(bookshelf.dict()))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Cập nhật tủ sách thành công"},
@@ -339,14 +281,14 @@ async def update_bookshelf(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -357,20 +299,20 @@ async def update_bookshelf(
             status_code=status.HTTP_200_OK)
 async def delete_bookshelf(
         id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        bookshelf = db.query(Bookshelf).filter(Bookshelf.id == id)
-        if not bookshelf.first():
+        bookshelf = (await db.execute(select(Bookshelf).where(Bookshelf.id == id))).scalars().first()
+        if not bookshelf:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Tủ sách không tồn tại"
             )
 
-        bookshelf.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(Bookshelf).where(Bookshelf.id == id))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Xóa tủ sách thành công"},
@@ -378,14 +320,14 @@ async def delete_bookshelf(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -396,20 +338,20 @@ async def delete_bookshelf(
             status_code=status.HTTP_200_OK)
 async def delete_bookshelfs(
         ids: DeleteMany,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        bookshelfs = db.query(Bookshelf).filter(Bookshelf.id.in_(ids.ids))
-        if not bookshelfs.first():
+        bookshelfs = (await db.execute(select(Bookshelf).where(Bookshelf.id.in_(ids.ids)))).scalars().first()
+        if not bookshelfs:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Tủ sách không tồn tại"
             )
 
-        bookshelfs.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(Bookshelf).where(Bookshelf.id.in_(ids.ids)))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Xóa danh sách tủ sách thành công"},
@@ -417,14 +359,14 @@ async def delete_bookshelfs(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -434,13 +376,13 @@ async def delete_bookshelfs(
 @router.delete("/delete-all",
             status_code=status.HTTP_200_OK)
 async def delete_all_bookshelfs(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        db.query(Bookshelf).delete()
-        db.commit()
+        await db.execute(delete(Bookshelf))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Xóa tất cả tủ sách thành công"},
@@ -448,7 +390,7 @@ async def delete_all_bookshelfs(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -36,8 +36,10 @@ class ListBookshelfResponse(BaseModel):
 class BookshelfPageableResponse(BaseModel):
     bookshelfs: list[BookshelfResponse]
 
-    total_pages: int
-    total_data: int
+    total_pages: Optional[int] = None
+    total_data: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
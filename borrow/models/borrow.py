@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, text, ForeignKey, DateTime
+from sqlalchemy import Column, String, Integer, text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from configs.database import Base
@@ -6,16 +6,20 @@ from configs.database import Base
 
 class Borrow(Base):
     __tablename__ = "borrows"
+    __table_args__ = (
+        Index("ix_borrows_user_id_status", "user_id", "status"),
+        Index("ix_borrows_status_created_at", "status", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, nullable=False)
     duration = Column(Integer, nullable=True)
     status = Column(String, nullable=True)
     borrow_date = Column(DateTime, nullable=True)
-    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'), index=True)
 
-    book_copy_id = Column(Integer, ForeignKey("book_copies.id", ondelete="CASCADE"), nullable=False)
+    book_copy_id = Column(Integer, ForeignKey("book_copies.id", ondelete="CASCADE"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    staff_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    staff_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
 
     book_copy = relationship("BookCopy", back_populates="borrows")
     user = relationship("User", back_populates="borrows", foreign_keys=[user_id])
@@ -1,19 +1,23 @@
-from io import BytesIO
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, Request, status
 from fastapi.params import File
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session, aliased
+from typing import Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 from sqlalchemy.exc import SQLAlchemyError
-from book.models.book import Book
+from book.models.book import Book, copy_counts_update
 from book_copy.models.book_copy import BookCopy
 from configs.authentication import get_current_user
-from configs.database import get_db
+from configs.database import get_db, get_read_db
+from configs.exports import ExportFormat, export_file
+from configs.imports import collect_errors, import_excel, lookup, model_rows, to_integer
+from configs.pagination import CountMode, paginate
+from configs.permissions import allow_api_key, has_permission
+from configs.query_budget import query_budget
 from borrow.models.borrow import Borrow
 from borrow.schemas.borrow import *
-from role.models.role import Role
 from user.models.user import User
-from user_role.models.user_role import UserRole
-import math
 import pandas as pd
 
 
@@ -25,17 +29,18 @@ router = APIRouter(
 
 @router.get("/all",
             response_model=ListBorrowResponse,
-            status_code=status.HTTP_200_OK)
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(5))])
 async def get_borrows(
-        db: Session = Depends(get_db),
-        current_user = Depends(get_current_user)
+        db: AsyncSession = Depends(get_read_db),
+        current_user = Depends(allow_api_key("borrow.read"))
     ):
 
     try:
         UserAlias = aliased(User, name="borrower")
         StaffAlias = aliased(User, name="staff")
         
-        borrows_query = db.query(
+        borrows_query = select(
             Borrow,
             BookCopy,
             Book,
@@ -47,7 +52,7 @@ async def get_borrows(
             .join(UserAlias, Borrow.user_id == UserAlias.id)\
             .outerjoin(StaffAlias, Borrow.staff_id == StaffAlias.id)
         
-        borrows_data = borrows_query.all()
+        borrows_data = (await db.execute(borrows_query)).all()
         
         borrows = []
         for borrow, book_copy, book, user, staff in borrows_data:
@@ -97,19 +102,23 @@ async def get_borrows(
 
 @router.get("/pageable",
             response_model=BorrowPageableResponse,
-            status_code=status.HTTP_200_OK)
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(5))])
 async def get_borrows_pageable(
-        page: int = 1,
         page_size: int = 10,
-        db: Session = Depends(get_db),
-        current_user = Depends(get_current_user)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db),
+        current_user = Depends(allow_api_key("borrow.read"))
     ):
 
     try:
         UserAlias = aliased(User, name="borrower")
         StaffAlias = aliased(User, name="staff")
         
-        base_query = db.query(
+        base_query = select(
             Borrow,
             BookCopy,
             Book,
@@ -120,12 +129,9 @@ async def get_borrows_pageable(
             .join(Book, BookCopy.book_id == Book.id)\
             .join(UserAlias, Borrow.user_id == UserAlias.id)\
             .outerjoin(StaffAlias, Borrow.staff_id == StaffAlias.id)
-        
-        total_count = base_query.count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
 
-        borrows_data = base_query.offset(offset).limit(page_size).all()
+        borrows_data, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, base_query, [Borrow.id], page_size, page, cursor, include_total, count_mode)
         
         borrows = []
         for borrow, book_copy, book, user, staff in borrows_data:
@@ -164,7 +170,9 @@ async def get_borrows_pageable(
         return BorrowPageableResponse(
             total_data=total_count,
             total_pages=total_pages,
-            borrows=borrows
+            borrows=borrows,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -174,20 +182,65 @@ async def get_borrows_pageable(
         )
 
 
+@router.get("/export",
+            status_code=status.HTTP_200_OK)
+async def export_borrows(
+        request: Request,
+        format: ExportFormat = "xlsx",
+        db: AsyncSession = Depends(get_read_db),
+        current_user = Depends(get_current_user)
+    ):
+
+    try:
+        UserAlias = aliased(User, name="borrower")
+        StaffAlias = aliased(User, name="staff")
+
+        query = select(
+            Borrow.id,
+            Book.name,
+            Borrow.book_copy_id,
+            UserAlias.full_name,
+            UserAlias.username,
+            StaffAlias.full_name,
+            Borrow.borrow_date,
+            Borrow.duration,
+            Borrow.status,
+            Borrow.created_at
+        )\
+            .join(BookCopy, Borrow.book_copy_id == BookCopy.id)\
+            .join(Book, BookCopy.book_id == Book.id)\
+            .join(UserAlias, Borrow.user_id == UserAlias.id)\
+            .outerjoin(StaffAlias, Borrow.staff_id == StaffAlias.id)\
+            .order_by(Borrow.id)
+
+        return await export_file(
+            request, db, query,
+            ["Mã phiếu mượn", "Tên sách", "Mã bản sao", "Người mượn", "Tên người dùng", "Nhân viên",
+             "Ngày mượn", "Thời hạn", "Trạng thái", "Ngày tạo"],
+            "Borrows", "borrows", format
+        )
+
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
+        )
+
+
 @router.get("/{id}",
             response_model=BorrowResponse,
             status_code=status.HTTP_200_OK)
 async def get_borrow_by_id(
         id: int,
-        db: Session = Depends(get_db),
-        current_user = Depends(get_current_user)
+        db: AsyncSession = Depends(get_read_db),
+        current_user = Depends(allow_api_key("borrow.read"))
     ):
 
     try:
         UserAlias = aliased(User, name="borrower")
         StaffAlias = aliased(User, name="staff")
         
-        borrow_data = db.query(
+        borrow_data = (await db.execute(select(
             Borrow,
             BookCopy,
             Book,
@@ -198,7 +251,7 @@ async def get_borrow_by_id(
             .join(Book, BookCopy.book_id == Book.id)\
             .join(UserAlias, Borrow.user_id == UserAlias.id)\
             .outerjoin(StaffAlias, Borrow.staff_id == StaffAlias.id)\
-            .filter(Borrow.id == id).first()
+            .where(Borrow.id == id))).first()
 
         if not borrow_data:
             raise HTTPException(
@@ -250,20 +303,24 @@ async def get_borrow_by_id(
 
 @router.post("/search",
              response_model=BorrowPageableResponse,
-             status_code=status.HTTP_200_OK)
+             status_code=status.HTTP_200_OK,
+             dependencies=[Depends(query_budget(5))])
 async def search_borrows(
         search_borrow: BorrowSearch,
-        page: int = 1,
         page_size: int = 10,
-        db: Session = Depends(get_db),
-        current_user = Depends(get_current_user)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db),
+        current_user = Depends(allow_api_key("borrow.read"))
     ):
 
     try:
         UserAlias = aliased(User, name="borrower")
         StaffAlias = aliased(User, name="staff")
         
-        base_query = db.query(
+        base_query = select(
             Borrow,
             BookCopy,
             Book,
@@ -276,21 +333,18 @@ async def search_borrows(
             .outerjoin(StaffAlias, Borrow.staff_id == StaffAlias.id)
         
         if search_borrow.duration:
-            base_query = base_query.filter(Borrow.duration == search_borrow.duration)
+            base_query = base_query.where(Borrow.duration == search_borrow.duration)
         if search_borrow.status:
-            base_query = base_query.filter(Borrow.status == search_borrow.status)
+            base_query = base_query.where(Borrow.status == search_borrow.status)
         if search_borrow.book_copy_id:
-            base_query = base_query.filter(Borrow.book_copy_id == search_borrow.book_copy_id)
+            base_query = base_query.where(Borrow.book_copy_id == search_borrow.book_copy_id)
         if search_borrow.user_id:
-            base_query = base_query.filter(Borrow.user_id == search_borrow.user_id)
+            base_query = base_query.where(Borrow.user_id == search_borrow.user_id)
         if search_borrow.staff_id:
-            base_query = base_query.filter(Borrow.staff_id == search_borrow.staff_id)
-
-        total_count = base_query.count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
+            base_query = base_query.where(Borrow.staff_id == search_borrow.staff_id)
 
-        borrows_data = base_query.offset(offset).limit(page_size).all()
+        borrows_data, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, base_query, [Borrow.id], page_size, page, cursor, include_total, count_mode)
         
         borrows = []
         for borrow, book_copy, book, user, staff in borrows_data:
@@ -329,7 +383,9 @@ async def search_borrows(
         return BorrowPageableResponse(
             borrows=borrows,
             total_data=total_count,
-            total_pages=total_pages
+            total_pages=total_pages,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -342,36 +398,36 @@ async def search_borrows(
 @router.post("/create")
 async def create_borrow(
         new_borrow: BorrowCreate,
-        db: Session = Depends(get_db),
-        current_user = Depends(get_current_user)
+        db: AsyncSession = Depends(get_db),
+        current_user = Depends(allow_api_key("borrow.create"))
     ):
 
     try:
 
-        if not db.query(Book).filter(Book.id == new_borrow.book_id).first():
+        if not (await db.execute(select(Book).where(Book.id == new_borrow.book_id))).scalars().first():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Sách không tồn tại"
             )
         
-        book_copy = db.query(BookCopy)\
+        book_copy = (await db.execute(select(BookCopy)\
             .join(Book, BookCopy.book_id == Book.id)\
-            .filter(Book.id == new_borrow.book_id, 
-                    BookCopy.status == "Có sẵn")
+            .where(Book.id == new_borrow.book_id, 
+                    BookCopy.status == "Có sẵn"))).scalars().first()
         
-        if not book_copy.first():
+        if not book_copy:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Hiện không còn bản sao của sách này"
             )
         
-        if new_borrow.user_id and not db.query(User).filter(User.id == new_borrow.user_id).first():
+        if new_borrow.user_id and not (await db.execute(select(User).where(User.id == new_borrow.user_id))).scalars().first():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Người mượn không tồn tại"
             )
         
-        if new_borrow.staff_id and not db.query(User).filter(User.id == new_borrow.staff_id).first():
+        if new_borrow.staff_id and not (await db.execute(select(User).where(User.id == new_borrow.staff_id))).scalars().first():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Nhân viên không tồn tại"
@@ -383,24 +439,31 @@ async def create_borrow(
                 detail="Thời hạn không hợp lệ"
             )
         
-        is_admin = db.query(User)\
-            .join(UserRole)\
-            .join(Role)\
-            .filter(User.id == current_user.id, Role.name == "admin").first()
+        can_approve = await has_permission(db, current_user, "borrow.approve")
 
         borrow = Borrow(
             duration=new_borrow.duration,
-            status="Đang mượn" if is_admin else "Đang chờ",
-            book_copy_id=book_copy.first().id,
+            status="Đang mượn" if can_approve else "Đang chờ",
+            book_copy_id=book_copy.id,
             user_id=new_borrow.user_id if new_borrow.user_id else current_user.id,
             staff_id=new_borrow.staff_id
         )
         db.add(borrow)
-        db.flush()
+        await db.flush()
 
-        book_copy_to_update = db.query(BookCopy).filter(BookCopy.id == book_copy.first().id)
-        book_copy_to_update.update({"status": "Đã mượn"})
-        db.commit()
+        # Only flip the copy if it is still available, so two concurrent borrows can't both take it.
+        book_id = await db.scalar(update(BookCopy)\
+            .where(BookCopy.id == book_copy.id, BookCopy.status == "Có sẵn")\
+            .values({"status": "Đã mượn"})\
+            .returning(BookCopy.book_id))
+        if not book_id:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Hiện không còn bản sao của sách này"
+            )
+        await db.execute(copy_counts_update(added=[(book_id, "Đã mượn")], removed=[(book_id, "Có sẵn")]))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Tạo phiếu mượn thành công"},
@@ -408,7 +471,7 @@ async def create_borrow(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -418,7 +481,7 @@ async def create_borrow(
 @router.post("/import")
 async def import_borrows(
         file: UploadFile = File(...),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
@@ -430,108 +493,62 @@ async def import_borrows(
         "Nhân viên": "staff_name"
     }
     
-    if file.content_type not in ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel"]:
-        raise HTTPException(
-            status_code=400, 
-            detail="File không hợp lệ. Vui lòng upload file Excel."
-        )
-    
-    content = await file.read()
-    try:
-        df = pd.read_excel(BytesIO(content))
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Lỗi đọc file: {str(e)}"
-        )
-    
-    try:
-        df.rename(columns=COLUMN_MAPPING, inplace=True)
-    except KeyError as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Tiêu đề cột không hợp lệ: {str(e)}"
-        )
-    
-    book_name_to_id = {b.name: b.id for b in db.query(Book).all()}
-    book_copy_to_id = {bc.book_id: bc.id for bc in db.query(BookCopy).all()}
-    user_name_to_id = {u.name: u.id for u in db.query(User).all()}
-    staff_name_to_id = {s.name: s.id for s in db.query(User).all()}
-    
-    errors = []
-    list_borrows = []
-    
-    for index, row in df.iterrows():
-        book_id = book_name_to_id.get(row.get("book_name"))
-        book_copy_id = book_copy_to_id.get(book_id) if book_id else None
-        user_id = user_name_to_id.get(row.get("user_name"))
-        staff_id = staff_name_to_id.get(row.get("staff_name")) if row.get("staff_name") else None
-        duration = row.get("duration")
-        status = row.get("status", "PENDING")
-        
-        if not book_id:
-            errors.append({"Dòng": index + 2, "Lỗi": f"Tên sách '{row.get('book_name')}' không tồn tại."})
-            continue
-        if not book_copy_id:
-            errors.append({"Dòng": index + 2, "Lỗi": f"Không tìm thấy bản sao của sách '{row.get('book_name')}'"})
-            continue
-        if not user_id:
-            errors.append({"Dòng": index + 2, "Lỗi": f"Người mượn '{row.get('user_name')}' không tồn tại."})
-            continue
-        
-        borrow = Borrow(
-            duration=duration,
-            status=status,
-            book_copy_id=book_copy_id,
-            user_id=user_id,
-            staff_id=staff_id
-        )
-        list_borrows.append(borrow)
-    
-    if errors:
-        return JSONResponse(
-            content={"errors": errors},
-            status_code=400
-        )
-    
-    try:
-        db.bulk_save_objects(list_borrows)
-        db.commit()
-        return JSONResponse(
-            content={"message": "Import phiếu mượn thành công"},
-            status_code=201
-        )
-    
-    except SQLAlchemyError as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=409,
-            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
-        )
-    
+    book_name_to_id = dict((await db.execute(select(Book.name, Book.id))).all())
+    book_copy_to_id = dict((await db.execute(select(BookCopy.book_id, BookCopy.id))).all())
+    user_name_to_id = dict((await db.execute(select(User.full_name, User.id))).all())
+
+    async def import_chunk(df):
+        book_ids = lookup(df["book_name"], book_name_to_id)
+        book_copy_ids = lookup(book_ids, book_copy_to_id)
+        user_ids = lookup(df["user_name"], user_name_to_id)
+        duration, invalid_duration = to_integer(df["duration"])
+        errors = collect_errors([
+            (book_ids.isna(), "Tên sách '{}' không tồn tại.", df["book_name"]),
+            (book_ids.notna() & book_copy_ids.isna(), "Không tìm thấy bản sao của sách '{}'", df["book_name"]),
+            (user_ids.isna(), "Người mượn '{}' không tồn tại.", df["user_name"]),
+            (invalid_duration, "Thời hạn '{}' không hợp lệ.", df["duration"])
+        ])
+        if errors:
+            return errors
+
+        db.add_all([Borrow(**row) for row in model_rows(pd.DataFrame({
+            "duration": duration,
+            "status": df["status"].where(df["status"].notna(), "PENDING"),
+            "book_copy_id": book_copy_ids,
+            "user_id": user_ids,
+            "staff_id": lookup(df["staff_name"], user_name_to_id)
+        }))])
+        return errors
+
+    return await import_excel(db, file, COLUMN_MAPPING, import_chunk, "Import phiếu mượn thành công")
+
 
 @router.put("/update/{id}")
 async def update_borrow(
         id: int,
         updated_borrow: BorrowUpdate,
-        db: Session = Depends(get_db),
-        current_user = Depends(get_current_user)
+        db: AsyncSession = Depends(get_db),
+        current_user = Depends(allow_api_key("borrow.update"))
     ):
 
     try:
-        borrow = db.query(Borrow).filter(Borrow.id == id)
-        if not borrow.first():
+        borrow = (await db.execute(select(Borrow).where(Borrow.id == id))).scalars().first()
+        if not borrow:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Phiếu mượn không tồn tại"
             )
         
         if updated_borrow.status == "Đã trả":
-            book_copy_to_update = db.query(BookCopy).filter(BookCopy.id == borrow.first().book_copy_id)
-            book_copy_to_update.update({"status": "Có sẵn"})
+            book_id = await db.scalar(update(BookCopy)\
+                .where(BookCopy.id == borrow.book_copy_id, BookCopy.status != "Có sẵn")\
+                .values({"status": "Có sẵn"})\
+                .returning(BookCopy.book_id))
+            if book_id:
+                await db.execute(copy_counts_update(added=[(book_id, "Có sẵn")], removed=[(book_id, "Đã mượn")]))
 
-        borrow.update(updated_borrow.dict(), synchronize_session=False)
-        db.commit()
+        await db.execute(update(Borrow).where(Borrow.id == id).values(updated_borrow.dict()))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Cập nhật phiếu mượn thành công"},
@@ -539,7 +556,7 @@ async def update_borrow(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -549,20 +566,20 @@ async def update_borrow(
 @router.delete("/delete/{id}")
 async def delete_borrow(
         id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        borrow = db.query(Borrow).filter(Borrow.id == id)
-        if not borrow.first():
+        borrow = (await db.execute(select(Borrow).where(Borrow.id == id))).scalars().first()
+        if not borrow:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Phiếu mượn không tồn tại"
             )
         
-        borrow.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(Borrow).where(Borrow.id == id))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Xóa phiếu mượn thành công"},
@@ -570,7 +587,7 @@ async def delete_borrow(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -580,20 +597,20 @@ async def delete_borrow(
 @router.delete("/delete-many")
 async def delete_borrows(
         ids: DeleteMany,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        borrows = db.query(Borrow).filter(Borrow.id.in_(ids.ids))
-        if not borrows.first():
+        borrows = (await db.execute(select(Borrow).where(Borrow.id.in_(ids.ids)))).scalars().first()
+        if not borrows:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Phiếu mượn không tồn tại"
             )
         
-        borrows.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(Borrow).where(Borrow.id.in_(ids.ids)))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Xóa danh sách phiếu mượn thành công"},
@@ -601,7 +618,7 @@ async def delete_borrows(
         )
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -610,13 +627,13 @@ async def delete_borrows(
 
 @router.delete("/delete-all")
 async def delete_all_borrows(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        db.query(Borrow).delete()
-        db.commit()
+        await db.execute(delete(Borrow))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Xóa tất cả phiếu mượn thành công"},
@@ -624,7 +641,7 @@ async def delete_all_borrows(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
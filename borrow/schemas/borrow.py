@@ -61,8 +61,10 @@ class ListBorrowResponse(BaseModel):
 class BorrowPageableResponse(BaseModel):
     borrows: list[BorrowResponse]
     
-    total_pages: int
-    total_data: int
+    total_pages: Optional[int] = None
+    total_data: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -2,10 +2,15 @@ from sqlalchemy import Column, String, Integer, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from configs.database import Base
+from configs.search import trigram_index
 
 
 class Category(Base): # the loai
     __tablename__ = "categories"
+    __table_args__ = (
+        trigram_index("ix_categories_name_trgm", "name"),
+        trigram_index("ix_categories_description_trgm", "description"),
+    )
 
     id = Column(Integer, primary_key=True, nullable=False)
     name = Column(String, nullable=False, unique=True)
@@ -1,14 +1,17 @@
-from io import BytesIO
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
-from fastapi.responses import JSONResponse, StreamingResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, Request, status
+from fastapi.responses import JSONResponse
+from typing import Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from configs.authentication import get_current_user
-from configs.database import get_db
+from configs.database import get_db, get_read_db
+from configs.exports import ExportFormat, export_file
+from configs.imports import collect_errors, duplicated, import_excel, model_rows, to_integer
+from configs.pagination import CountMode, paginate
+from configs.snapshots import name_snapshot
 from category.models.category import Category
 from category.schemas.category import *
-import math
-import pandas as pd
 
 
 router = APIRouter(
@@ -21,11 +24,11 @@ router = APIRouter(
             response_model=ListCategoryResponse,
             status_code=status.HTTP_200_OK)
 async def get_categories(
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        categories = db.query(Category).all()
+        categories = (await db.execute(select(Category))).scalars().all()
         
         return ListCategoryResponse(
             categories=categories,
@@ -43,23 +46,24 @@ async def get_categories(
             response_model=CategoryPageableResponse,
             status_code=status.HTTP_200_OK)
 async def get_categories_pageable(
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        total_count = db.query(Category).count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-        categories = db.query(Category)\
-            .order_by(Category.name)\
-            .offset(offset).limit(page_size).all()
+        categories, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, select(Category), [Category.name, Category.id], page_size, page, cursor, include_total, count_mode)
 
         return CategoryPageableResponse(
             categories=categories,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -70,35 +74,15 @@ async def get_categories_pageable(
 
 
 @router.get("/export", status_code=status.HTTP_200_OK)
-async def export_categories(db: Session = Depends(get_db)):
+async def export_categories(request: Request, format: ExportFormat = "xlsx", db: AsyncSession = Depends(get_read_db)):
     try:
-        categories = db.query(Category).all()
-        df = pd.DataFrame([{
-            "Số thứ tự": i + 1,
-            "Tên danh mục": c.name,
-            "Độ tuổi": c.age_limit,
-            "Mô tả": c.description
-        } for i, c in enumerate(categories)])
-
-        # Kiểm tra nếu không có dữ liệu
-        if df.empty:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Không có dữ liệu để xuất"
-            )
+        query = select(Category.name, Category.age_limit, Category.description).order_by(Category.id)
 
-        # Tạo file Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-            df.to_excel(writer, index=False, sheet_name="Categories")
-        output.seek(0)
-
-        headers = {
-            "Content-Disposition": "attachment; filename=categories.xlsx",
-            "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        }
-
-        return StreamingResponse(output, headers=headers, media_type=headers["Content-Type"])
+        return await export_file(
+            request, db, query,
+            ["Tên danh mục", "Độ tuổi", "Mô tả"],
+            "Categories", "categories", format, numbered=True, allow_empty=False
+        )
 
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -111,16 +95,11 @@ async def export_categories(db: Session = Depends(get_db)):
             response_model=ListCategoryNameResponse,
             status_code=status.HTTP_200_OK)
 async def get_category_names(
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
     ):
 
     try:
-        categories = db.query(Category).all()
-        category_names = [CategoryName(name=c.name, id=c.id) for c in categories]
-
-        return ListCategoryNameResponse(
-            categories=category_names
-        )
+        return await name_snapshot(db, Category, "categories")
     
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -134,11 +113,11 @@ async def get_category_names(
             status_code=status.HTTP_200_OK)
 async def search_category_by_id(
         id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        category = db.query(Category).filter(Category.id == id).first()
+        category = (await db.execute(select(Category).where(Category.id == id))).scalars().first()
         if not category:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -159,31 +138,33 @@ async def search_category_by_id(
             status_code=status.HTTP_200_OK)
 async def search_category(
         info: CategorySearch,
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db), 
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        category = db.query(Category)
+        category = select(Category)
         if info.name:
-            category = category.filter(Category.name.ilike(f"%{info.name.strip()}%"))
+            category = category.where(Category.name.ilike(f"%{info.name.strip()}%"))
         if info.age_limit:
-            category = category.filter(Category.age_limit == info.age_limit)
+            category = category.where(Category.age_limit == info.age_limit)
         if info.description:
-            category = category.filter(Category.description.ilike(f"%{info.description.strip()}%"))
+            category = category.where(Category.description.ilike(f"%{info.description.strip()}%"))
 
-        total_count = category.count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-        categories = category.order_by(Category.name)\
-            .offset(offset).limit(page_size).all()
+        categories, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, category, [Category.name, Category.id], page_size, page, cursor, include_total, count_mode)
 
         return CategoryPageableResponse(
             categories=categories,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -198,12 +179,12 @@ async def search_category(
             status_code=status.HTTP_201_CREATED)
 async def create_category(
         new_category: CategoryCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        category = db.query(Category).filter(Category.name == new_category.name).first()
+        category = (await db.execute(select(Category).where(Category.name == new_category.name))).scalars().first()
         if category:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -212,7 +193,7 @@ async def create_category(
 
         category = Category(**new_category.dict())
         db.add(category)
-        db.commit()
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Tạo thể loại thành công"},
@@ -220,14 +201,14 @@ async def create_category(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -238,7 +219,7 @@ async def create_category(
             status_code=status.HTTP_201_CREATED)
 async def import_categories(
         file: UploadFile,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
@@ -248,80 +229,27 @@ async def import_categories(
         "Mô tả": "description"
     }
     
-    if file.content_type not in ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel"]:
-        raise HTTPException(
-            status_code=400, 
-            detail="File không hợp lệ. Vui lòng upload file Excel."
-        )
-    
-    content = await file.read()
-    try:
-        df = pd.read_excel(BytesIO(content))
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Lỗi đọc file: {str(e)}"
-        )
-    
-    try:
-        df.rename(columns=COLUMN_MAPPING, inplace=True)
-    except KeyError as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Tiêu đề cột không hợp lệ: {str(e)}"
-        )
-    
-    existing_category_names = {c.name for c in db.query(Category).all()}
-    errors = []
-    list_categories = []
-    
-    for index, row in df.iterrows():
-        name = row.get("name")
-        if not name:
-            errors.append({"Dòng": index + 2, "Lỗi": "Tên danh mục không được để trống."})
-            continue
-        
-        if name in existing_category_names:
-            errors.append({"Dòng": index + 2, "Lỗi": f"Danh mục '{name}' đã tồn tại."})
-            continue
-        
-        age_limit = None if pd.isna(row.get("age_limit")) else int(row.get("age_limit"))
-        description = None if pd.isna(row.get("description")) else row.get("description")
-        
-        category = Category(
-            name=name,
-            age_limit=age_limit,
-            description=description
-        )
-        list_categories.append(category)
-    
-    if errors:
-        return JSONResponse(
-            content={"errors": errors},
-            status_code=400
-        )
-    
-    try:
-        db.bulk_save_objects(list_categories)
-        db.commit()
-        return JSONResponse(
-            content={"message": "Import danh sách thể loại thành công"},
-            status_code=201
-        )
-    
-    except IntegrityError:
-        db.rollback()
-        raise HTTPException(
-            status_code=409, 
-            detail="Lỗi khi lưu dữ liệu vào database."
-        )
-    
-    except SQLAlchemyError as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
-        )
+    existing_category_names = set((await db.execute(select(Category.name))).scalars().all())
+
+    async def import_chunk(df):
+        exists = duplicated(df["name"], existing_category_names)
+        age_limit, invalid_age_limit = to_integer(df["age_limit"])
+        errors = collect_errors([
+            (df["name"].isna(), "Tên danh mục không được để trống."),
+            (exists, "Danh mục '{}' đã tồn tại.", df["name"]),
+            (invalid_age_limit, "Giới hạn tuổi '{}' không hợp lệ.", df["age_limit"])
+        ])
+
+        if not errors:
+            db.add_all([Category(**row) for row in model_rows(df.assign(age_limit=age_limit))])
+        return errors
+
+    def chunk_committed(df):
+        existing_category_names.update(df["name"].dropna())
+
+    return await import_excel(
+        db, file, COLUMN_MAPPING, import_chunk, "Import danh sách thể loại thành công", chunk_committed=chunk_committed
+    )
 
 
 @router.put("/update/{id}",
@@ -330,23 +258,20 @@ async def import_categories(
 async def update_category(
         id: int,
         category: CategoryUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        category_db = db.query(Category).filter(Category.id == id)
-        if not category_db.first():
+        category_db = (await db.execute(select(Category).where(Category.id == id))).scalars().first()
+        if not category_db:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Thể loại không tồn tại"
             )
 
-        category_db.update(
-            category.dict(), 
-            synchronize_session=False
-        )
-        db.commit()
+        await db.execute(update(Category).where(Category.id == id).values(category.dict()))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Cập nhật thể loại thành công"},
@@ -354,14 +279,14 @@ async def update_category(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -372,20 +297,20 @@ async def update_category(
             status_code=status.HTTP_200_OK)
 async def delete_category(
         id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        category = db.query(Category).filter(Category.id == id)
-        if not category.first():
+        category = (await db.execute(select(Category).where(Category.id == id))).scalars().first()
+        if not category:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Thể loại không tồn tại"
             )
 
-        category.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(Category).where(Category.id == id))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Xóa thể loại thành công"},
@@ -393,14 +318,14 @@ async def delete_category(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -411,20 +336,20 @@ async def delete_category(
             status_code=status.HTTP_200_OK)
 async def delete_categories(
         ids: CategoryDelete,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        categories = db.query(Category).filter(Category.id.in_(ids.list_id))
-        if not categories.first():
+        categories = (await db.execute(select(Category).where(Category.id.in_(ids.list_id)))).scalars().first()
+        if not categories:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Thể loại không tồn tại"
             )
 
-        categories.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(Category).where(Category.id.in_(ids.list_id)))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Xóa danh sách thể loại thành công"},
@@ -432,14 +357,14 @@ async def delete_categories(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:    
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -449,13 +374,13 @@ async def delete_categories(
 @router.delete("/delete-all",
             status_code=status.HTTP_200_OK)
 async def delete_all_categories(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        db.query(Category).delete()
-        db.commit()
+        await db.execute(delete(Category))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Xóa tất cả thể loại thành công"},
@@ -463,7 +388,7 @@ async def delete_all_categories(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
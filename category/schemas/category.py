@@ -35,8 +35,10 @@ class ListCategoryResponse(BaseModel):
 class CategoryPageableResponse(BaseModel):
     categories: list[CategoryResponse]
 
-    total_pages: int
-    total_data: int
+    total_pages: Optional[int] = None
+    total_data: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from api_key.models.api_key import ApiKey, ApiKeyPermission
+from authen.schemas.authen import Principal
+from configs.cache import TTLCache
+from configs.database import AsyncSessionLocal
+from permission.models.permission import Permission
+from role.models.role import Role
+from user.models.user import User
+from user_role.models.user_role import UserRole
+from .conf import settings
+
+
+API_KEY_PREFIX = "yk_"
+API_KEY_HEADER = "X-API-Key"
+
+
+@dataclass(frozen=True)
+class ApiKeyEntry:
+    id: int
+    user_id: int
+    secret_hash: str
+    scopes: tuple
+    # The owner's roles: a key is never granted more than they allow.
+    roles: tuple
+    is_active: bool
+    expires_at: Optional[datetime]
+
+
+def hash_api_key_secret(secret: str) -> str:
+    # Keys carry 256 random bits, so a keyed HMAC (microseconds) is as strong as bcrypt here.
+    return hmac.new(settings.secret_key.encode(), secret.encode(), hashlib.sha256).hexdigest()
+
+
+def generate_api_key():
+    prefix = secrets.token_hex(6)
+    secret = secrets.token_urlsafe(32)
+    return f"{API_KEY_PREFIX}{prefix}_{secret}", prefix, hash_api_key_secret(secret)
+
+
+def split_api_key(key: str):
+    if not key.startswith(API_KEY_PREFIX):
+        return None, None
+    prefix, _, secret = key[len(API_KEY_PREFIX):].partition("_")
+    if not prefix or not secret:
+        return None, None
+    return prefix, secret
+
+
+# prefix -> ApiKeyEntry, or False for prefixes that do not exist (so garbage keys do not reach the database).
+api_key_cache = TTLCache(settings.api_key_cache_size, settings.api_key_cache_ttl_seconds)
+
+
+def invalidate_api_keys(prefixes=None):
+    if prefixes is None:
+        api_key_cache.clear()
+    else:
+        for prefix in prefixes:
+            api_key_cache.pop(prefix)
+
+
+async def load_api_key(db: AsyncSession, prefix: str):
+    rows = (await db.execute(select(ApiKey, User.is_active, Permission.name)\
+        .join(User, User.id == ApiKey.user_id)\
+        .outerjoin(ApiKeyPermission, ApiKeyPermission.api_key_id == ApiKey.id)\
+        .outerjoin(Permission, Permission.id == ApiKeyPermission.permission_id)\
+        .where(ApiKey.prefix == prefix))).all()
+    if not rows:
+        return False
+
+    api_key, user_active = rows[0][0], rows[0][1]
+    roles = (await db.execute(select(Role.name)\
+        .join(UserRole, UserRole.role_id == Role.id)\
+        .where(UserRole.user_id == api_key.user_id))).scalars().all()
+    return ApiKeyEntry(
+        id=api_key.id,
+        user_id=api_key.user_id,
+        secret_hash=api_key.secret_hash,
+        scopes=tuple(sorted({name for _, _, name in rows if name is not None})),
+        roles=tuple(sorted(set(roles))),
+        is_active=api_key.is_active and user_active is not False,
+        expires_at=api_key.expires_at
+    )
+
+
+class ApiKeyUsage:
+    # Last-used timestamps are collected in memory and written in one bulk UPDATE per interval.
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._task = None
+        self.flushed = 0
+
+    def record(self, api_key_id: int):
+        with self._lock:
+            self._pending[api_key_id] = datetime.now(timezone.utc)
+            due = time.monotonic() - self._last_flush >= self.interval and self._task is None
+            if due:
+                self._last_flush = time.monotonic()
+        if due:
+            self._task = asyncio.get_running_loop().create_task(self.flush())
+            self._task.add_done_callback(self._flushed)
+
+    def _flushed(self, task):
+        self._task = None
+        if not task.cancelled():
+            task.exception()
+
+    async def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(ApiKey), [
+                    {"id": api_key_id, "last_used_at": used_at} for api_key_id, used_at in pending.items()
+                ])
+                await db.commit()
+            self.flushed += len(pending)
+        except Exception:
+            with self._lock:
+                for api_key_id, used_at in pending.items():
+                    self._pending.setdefault(api_key_id, used_at)
+            raise
+
+
+api_key_usage = ApiKeyUsage(settings.api_key_last_used_flush_seconds)
+
+
+async def authenticate_api_key(db: AsyncSession, key: str) -> Optional[Principal]:
+    prefix, secret = split_api_key(key)
+    if prefix is None:
+        return None
+
+    entry = api_key_cache.get(prefix)
+    if entry is None:
+        entry = await load_api_key(db, prefix)
+        api_key_cache.set(prefix, entry)
+    if not entry or not entry.is_active:
+        return None
+    if entry.expires_at is not None and entry.expires_at <= datetime.now(timezone.utc):
+        return None
+    if not hmac.compare_digest(entry.secret_hash, hash_api_key_secret(secret)):
+        return None
+
+    api_key_usage.record(entry.id)
+    return Principal(id=entry.user_id, roles=list(entry.roles), api_key_id=entry.id, scopes=list(entry.scopes))
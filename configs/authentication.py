@@ -1,67 +1,251 @@
+import hashlib
 import re
+import secrets
+import threading
+import time
+import uuid
 from fastapi import Depends, status, HTTPException
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from authen.schemas.authen import Tokendata
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from authen.schemas.authen import Principal, Tokendata
+from configs.api_keys import API_KEY_HEADER, authenticate_api_key, invalidate_api_keys
+from configs.cache import TTLCache
 from configs.database import get_db
+from configs.workers import BoundedExecutor
+from refresh_token.models.refresh_token import RefreshToken
 from user.models.user import User
+from user_role.models.user_role import UserRole
 from .conf import settings
 
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
+api_key_scheme = APIKeyHeader(name=API_KEY_HEADER, auto_error=False)
 pwd_context = CryptContext(schemes=["bcrypt"])
 
 
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+# create_access_token adds 7 hours on top of the configured lifetime.
+ACCESS_TOKEN_MAX_AGE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60 + 7 * 3600
 
 
-def hash_password(password: str):
-    return pwd_context.hash(password)
+class TokenRevocations:
+    # O(1) in-memory checks that reject a token: revoked jti (logout) and per-user "issued before" cut-offs
+    # (password change, deletion), compared with the token's iat.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked_jtis = {}
+        self._revoked_before = {}
+        self._revoked_before_all = 0.0
+
+    def _purge(self, now: float):
+        if len(self._revoked_jtis) > 10000:
+            self._revoked_jtis = {jti: exp for jti, exp in self._revoked_jtis.items() if exp > now}
+        if len(self._revoked_before) > 10000:
+            horizon = now - ACCESS_TOKEN_MAX_AGE_SECONDS
+            self._revoked_before = {k: v for k, v in self._revoked_before.items() if v > horizon}
+
+    def revoke_token(self, jti: str, exp: float):
+        with self._lock:
+            self._revoked_jtis[jti] = exp
+            self._purge(time.time())
+
+    def revoke_users(self, user_ids=None):
+        now = time.time()
+        with self._lock:
+            if user_ids is None:
+                self._revoked_before_all = now
+            else:
+                for user_id in user_ids:
+                    self._revoked_before[user_id] = now
+            self._purge(now)
+
+    def is_revoked(self, token_data: Tokendata) -> bool:
+        if token_data.jti is not None and token_data.jti in self._revoked_jtis:
+            return True
+        cutoff = max(self._revoked_before.get(token_data.user_id, 0), self._revoked_before_all)
+        return cutoff > 0 and (token_data.iat or 0) < cutoff
+
+
+token_revocations = TokenRevocations()
+verified_tokens = TTLCache(settings.verified_token_cache_size, ACCESS_TOKEN_MAX_AGE_SECONDS)
+principal_cache = TTLCache(settings.principal_cache_size, settings.principal_cache_ttl_seconds)
+# user id -> users.role_version. Dropped here when this process changes the user's roles; a change made by
+# another worker is seen once the entry expires, the same bound as for cached principals.
+role_versions = TTLCache(settings.principal_cache_size, settings.principal_cache_ttl_seconds)
+
+
+async def claims_current(db: AsyncSession, token_data: Tokendata) -> bool:
+    # A token's role claims hold until its user's roles change: pv is the role_version they were issued at.
+    if token_data.roles is None or token_data.pv is None:
+        return False
+    version = role_versions.get(token_data.user_id)
+    if version is None:
+        version = await db.scalar(select(User.role_version).where(User.id == token_data.user_id))
+        if version is None:
+            return False
+        role_versions.set(token_data.user_id, version)
+    return token_data.pv == version
+
+
+def invalidate_principals(user_ids=None):
+    # Drop cached principals and role versions for the given users, or all of them (e.g. after a role change).
+    # API keys of these users are reloaded too. The role change itself must run role_version_bump.
+    invalidate_api_keys()
+    if user_ids is None:
+        principal_cache.clear()
+        role_versions.clear()
+    else:
+        user_ids = set(user_ids)
+        principal_cache.discard_where(lambda key: key[0] in user_ids)
+        for user_id in user_ids:
+            role_versions.pop(user_id)
+
+
+def revoke_user_tokens(user_ids=None):
+    # Reject every token issued so far to these users (all users when None).
+    token_revocations.revoke_users(None if user_ids is None else set(user_ids))
+    invalidate_principals(user_ids)
+
+
+password_executor = BoundedExecutor("bcrypt", settings.password_hash_workers, settings.password_hash_queue_size)
+
+
+async def hash_password(password: str):
+    return await password_executor.run(pwd_context.hash, password)
     
 
-def verify_password(plain_password, hassed_password):
-    return pwd_context.verify(plain_password, hassed_password)
+async def verify_password(plain_password, hassed_password):
+    return await password_executor.run(pwd_context.verify, plain_password, hassed_password)
 
 
 def create_access_token(data: dict):
     
     to_encode = data.copy()
+    now = time.time()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES) + timedelta(hours=7)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
 
     encode_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
     return encode_jwt, expire
 
 
+def hash_refresh_token(token: str) -> str:
+    # Refresh tokens are 256-bit random strings, so a plain sha256 is enough (no bcrypt) and keeps lookups indexed.
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_refresh_token(user_id: int, family_id: str = None):
+    token = secrets.token_urlsafe(32)
+    expire = datetime.now(timezone.utc) + timedelta(days=settings.refresh_token_expire_days)
+    refresh_token = RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        family_id=family_id or uuid.uuid4().hex,
+        expires_at=expire
+    )
+    return token, refresh_token
+
+
 def verify_access_token(token: str, credentials_exception):
+    # Tokens whose signature was already checked are remembered until their exp.
+    token_data = verified_tokens.get(token)
+    if token_data is not None:
+        return token_data
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHM)
         user_id: str = payload.get("user_id")
         if not user_id:
             raise credentials_exception
-        token_data = Tokendata(user_id=user_id)
+        token_data = Tokendata(
+            user_id=user_id,
+            roles=payload.get("roles"),
+            pv=payload.get("pv"),
+            jti=payload.get("jti"),
+            iat=payload.get("iat"),
+            exp=payload.get("exp")
+        )
 
     except JWTError:
         raise credentials_exception
     
+    if token_data.exp:
+        verified_tokens.set(token, token_data, ttl=token_data.exp - time.time())
     return token_data
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_principal(
+        token: Optional[str] = Depends(oauth2_scheme),
+        api_key: Optional[str] = Depends(api_key_scheme),
+        db: AsyncSession = Depends(get_db)
+    ):
+    # The caller as a user or as an API key. Only require_permission and allow_api_key depend on this directly,
+    # since they check an API key's scopes; every other route goes through get_current_user, which accepts users only.
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials", 
         headers={"WWW-Authenticate": "Bearer"}
     )
-    token = verify_access_token(token, credentials_exception) 
-    user = db.query(User).filter(User.id == token.user_id).first()
-    return user
+    if api_key:
+        principal = await authenticate_api_key(db, api_key)
+        if principal is None:
+            raise credentials_exception
+        return principal
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    token_data = verify_access_token(token, credentials_exception)
+    if token_revocations.is_revoked(token_data):
+        raise credentials_exception
+    if await claims_current(db, token_data):
+        return Principal(id=token_data.user_id, roles=token_data.roles)
+
+    key = (token_data.user_id, token)
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
+
+    user = (await db.execute(select(User)\
+        .options(selectinload(User.user_roles).joinedload(UserRole.role))\
+        .where(User.id == token_data.user_id))).scalars().first()
+    if not user:
+        return None
+
+    principal = Principal(
+        id=user.id,
+        username=user.username,
+        full_name=user.full_name,
+        email=user.email,
+        is_active=user.is_active,
+        roles=[user_role.role.name for user_role in user.user_roles if user_role.role]
+    )
+    principal_cache.set(key, principal)
+    return principal
+
+
+async def get_current_user(principal: Optional[Principal] = Depends(get_principal)):
+    # API keys are limited to their scopes, which only require_permission and allow_api_key check, so they fail
+    # closed everywhere else.
+    if principal is not None and principal.scopes is not None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Khóa API không được phép truy cập tài nguyên này"
+        )
+    return principal
 
 
 def validate_pwd(password):
@@ -1,21 +1,104 @@
-from sqlalchemy import create_engine
+from uuid import uuid4
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from .conf import settings
+from .pool import InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool
 
 
 SQLALCHEMY_DATABASE_URL = f'postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}'
+SQLALCHEMY_ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace('postgresql://', f'postgresql+{settings.database_async_driver}://', 1)
+SQLALCHEMY_ASYNC_REPLICA_URL = settings.database_replica_url.replace('postgresql://', f'postgresql+{settings.database_async_driver}://', 1) \
+    if settings.database_replica_url else None
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+READ_PRIMARY_COOKIE = "read_primary"
+READ_PRIMARY_HEADER = "X-Read-Primary"
+
+POOL_OPTIONS = dict(
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
+    pool_timeout=settings.database_pool_timeout,
+    pool_recycle=settings.database_pool_recycle,
+    pool_pre_ping=settings.database_pool_pre_ping,
+)
+
+# PgBouncer in transaction mode hands each transaction a different server
+# connection, so asyncpg must not cache prepared statements across them.
+ASYNC_CONNECT_ARGS = {
+    "statement_cache_size": 0,
+    "prepared_statement_cache_size": 0,
+    "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+} if settings.database_pgbouncer and settings.database_async_driver == "asyncpg" else {}
+
+# Sync engine: only used for schema creation, migrations and offline scripts.
+engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=InstrumentedQueuePool, **POOL_OPTIONS)
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    poolclass=InstrumentedAsyncAdaptedQueuePool,
+    connect_args=ASYNC_CONNECT_ARGS,
+    **POOL_OPTIONS
+)
+replica_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_REPLICA_URL,
+    poolclass=InstrumentedAsyncAdaptedQueuePool,
+    connect_args=ASYNC_CONNECT_ARGS,
+    **POOL_OPTIONS
+) if SQLALCHEMY_ASYNC_REPLICA_URL else None
+
+# Engines reported by the /system/db-pool endpoint.
+ENGINES = {
+    "primary": async_engine.sync_engine,
+    "sync": engine,
+}
+if replica_engine is not None:
+    ENGINES["replica"] = replica_engine.sync_engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+ReplicaSessionLocal = async_sessionmaker(bind=replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False) \
+    if replica_engine is not None else None
 
 Base = declarative_base()
 
-def get_db():
+
+@event.listens_for(Session, "after_commit")
+def _mark_primary_write(session):
+    request_state = session.info.get("request_state")
+    if request_state is not None:
+        request_state.primary_write = True
+
+
+async def get_db(request: Request):
+    async with AsyncSessionLocal(info={"request_state": request.state}) as db:
+        yield db
+
+
+def reads_from_primary(request: Request) -> bool:
+    return ReplicaSessionLocal is None \
+        or request.headers.get(READ_PRIMARY_HEADER, "").lower() in ("1", "true") \
+        or READ_PRIMARY_COOKIE in request.cookies
+
+
+async def get_read_db(request: Request):
+    session_factory = AsyncSessionLocal if reads_from_primary(request) else ReplicaSessionLocal
+    async with session_factory() as db:
+        yield db
+
+
+def mark_read_your_writes(request: Request, response: Response):
+    if ReplicaSessionLocal is not None and getattr(request.state, "primary_write", False):
+        response.set_cookie(
+            READ_PRIMARY_COOKIE, "1",
+            max_age=settings.database_read_your_writes_seconds,
+            httponly=True, samesite="lax"
+        )
+
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
-
@@ -0,0 +1,263 @@
+import asyncio
+import contextlib
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+import time
+import uuid
+from typing import Literal
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+from fastapi import HTTPException, Request, status
+from fastapi.responses import FileResponse, Response
+from sqlalchemy import Integer
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from configs.cache import TTLCache
+from configs.table_versions import statement_tables, table_versions
+from .conf import settings
+
+
+# xlsx for people; csv/ndjson stream row by row for scripts; parquet/feather are columnar (Arrow) for BI jobs.
+ExportFormat = Literal["xlsx", "csv", "ndjson", "parquet", "feather"]
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+DIALECT = postgresql.dialect()
+
+
+class XlsxExport:
+    media_type = XLSX_MEDIA_TYPE
+
+    def __init__(self, output, headers: list[str], types: list, sheet_name: str):
+        self.workbook = xlsxwriter.Workbook(output, {
+            "constant_memory": True,
+            "default_date_format": "yyyy-mm-dd",
+            "remove_timezone": True,
+            "strings_to_formulas": False,
+            "strings_to_urls": False
+        })
+        self.worksheet = self.workbook.add_worksheet(sheet_name)
+        self.worksheet.write_row(0, 0, headers, self.workbook.add_format({"bold": True}))
+        self.row = 1
+
+    def write(self, rows):
+        for row in rows:
+            self.worksheet.write_row(self.row, 0, row)
+            self.row += 1
+
+    def close(self):
+        self.workbook.close()
+
+
+class CsvExport:
+    media_type = "text/csv; charset=utf-8"
+
+    def __init__(self, output, headers: list[str], types: list, sheet_name: str):
+        # The BOM lets Excel open the file as UTF-8.
+        self.text = io.TextIOWrapper(output, encoding="utf-8-sig", newline="")
+        self.writer = csv.writer(self.text)
+        self.writer.writerow(headers)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.text.flush()
+        self.text.detach()
+
+
+class NdjsonExport:
+    media_type = "application/x-ndjson"
+
+    def __init__(self, output, headers: list[str], types: list, sheet_name: str):
+        self.output = output
+        self.headers = headers
+
+    def write(self, rows):
+        self.output.write("".join(
+            json.dumps(dict(zip(self.headers, row)), ensure_ascii=False, default=str) + "\n" for row in rows
+        ).encode())
+
+    def close(self):
+        pass
+
+
+def arrow_type(sql_type):
+    try:
+        python_type = sql_type.python_type
+    except NotImplementedError:
+        return pa.string()
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is datetime.datetime:
+        return pa.timestamp("us", tz="UTC" if getattr(sql_type, "timezone", False) else None)
+    if python_type is datetime.date:
+        return pa.date32()
+    return pa.string()
+
+
+class ArrowExport:
+    # Each batch of rows becomes one Arrow record batch under a schema fixed from the selected column types,
+    # so an all-NULL batch can't change a column's type halfway through the file.
+
+    def __init__(self, output, headers: list[str], types: list, sheet_name: str):
+        self.schema = pa.schema([(header, arrow_type(sql_type)) for header, sql_type in zip(headers, types)])
+        self.writer = self.open(output)
+
+    def open(self, output):
+        raise NotImplementedError
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_batch(pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+
+    def close(self):
+        self.writer.close()
+
+
+class ParquetExport(ArrowExport):
+    media_type = "application/vnd.apache.parquet"
+
+    def open(self, output):
+        return pq.ParquetWriter(output, self.schema, compression="zstd")
+
+
+class FeatherExport(ArrowExport):
+    media_type = "application/vnd.apache.arrow.file"
+
+    def open(self, output):
+        return pa.ipc.new_file(output, self.schema, options=pa.ipc.IpcWriteOptions(compression="lz4"))
+
+
+EXPORTERS = {
+    "xlsx": XlsxExport,
+    "csv": CsvExport,
+    "ndjson": NdjsonExport,
+    "parquet": ParquetExport,
+    "feather": FeatherExport,
+}
+
+
+# (filename, format, numbered, headers, sql, params) -> (table versions, path). Rebuilt after one of the
+# query's tables is written (in this process), and at least every ttl for writes made by other workers or
+# not yet visible on the replica. Files outlive their entry by EXPORT_FILE_GRACE_SECONDS so a response
+# that already holds one can still send it; older files are removed on the next build.
+export_cache = TTLCache(64, settings.export_cache_ttl_seconds)
+export_locks = {}
+
+EXPORT_FILE_GRACE_SECONDS = 60
+
+
+def export_dir() -> str:
+    path = settings.export_cache_dir or os.path.join(tempfile.gettempdir(), "library-exports")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def prune_exports(directory: str):
+    expired = time.time() - settings.export_cache_ttl_seconds - EXPORT_FILE_GRACE_SECONDS
+    for entry in os.scandir(directory):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < expired:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+async def render_export(db: AsyncSession, query, headers: list[str], types: list, sheet_name: str,
+                        format: ExportFormat, numbered: bool, allow_empty: bool, path: str):
+    # Rows come through a server-side cursor in batches of export_batch_size and each batch is encoded
+    # (off the event loop) straight into `path`, so memory stays flat whatever the row count.
+    with open(path, "wb") as output:
+        exporter = EXPORTERS[format](output, headers, types, sheet_name)
+
+        def write_rows(start: int, rows):
+            exporter.write([(index, *row) for index, row in enumerate(rows, start)] if numbered else rows)
+
+        total = 0
+        result = await db.stream(query.execution_options(yield_per=settings.export_batch_size))
+        async for rows in result.partitions():
+            await asyncio.to_thread(write_rows, total + 1, rows)
+            total += len(rows)
+
+        if not total and not allow_empty:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Không có dữ liệu để xuất"
+            )
+
+        await asyncio.to_thread(exporter.close)
+
+
+async def export_file(
+        request: Request,
+        db: AsyncSession,
+        query,
+        headers: list[str],
+        sheet_name: str,
+        filename: str,
+        format: ExportFormat = "xlsx",
+        numbered: bool = False,
+        allow_empty: bool = True
+    ) -> Response:
+    # `query` selects plain columns in `headers` order; `filename` has no extension. The rendered file is
+    # kept on disk until a table the query reads is written, and served with an ETag (304 on If-None-Match)
+    # and byte ranges (Range/If-Range), so a repeated or resumed download is a file read. The file is
+    # finished before the first byte is sent: xlsx and parquet write their index last, and the request's
+    # session is closed before the response body runs.
+    types = [column.type for column in query.selected_columns]
+    if numbered:
+        headers, types = ["Số thứ tự"] + headers, [Integer()] + types
+
+    compiled = query.compile(dialect=DIALECT)
+    key = (filename, format, numbered, tuple(headers), str(compiled), repr(sorted(compiled.params.items())))
+    tables = statement_tables(query)
+
+    # One render per export at a time; requests arriving meanwhile wait for it and reuse the file.
+    async with export_locks.setdefault(key, asyncio.Lock()):
+        versions = table_versions.snapshot(tables)
+        cached = export_cache.get(key)
+        if cached is None or cached[0] != versions or not os.path.exists(cached[1]):
+            directory = export_dir()
+            await asyncio.to_thread(prune_exports, directory)
+            path = os.path.join(directory, f"{filename}-{uuid.uuid4().hex}.{format}")
+            try:
+                await render_export(db, query, headers, types, sheet_name, format, numbered, allow_empty, path)
+            except BaseException:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(path)
+                raise
+            # Stored under the versions read before the query, so a write racing it only forces one more render.
+            cached = (versions, path)
+            export_cache.set(key, cached)
+
+    response = FileResponse(
+        cached[1],
+        stat_result=os.stat(cached[1]),
+        headers={"Cache-Control": "private, no-cache"},
+        media_type=EXPORTERS[format].media_type,
+        filename=f"{filename}.{format}"
+    )
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, response.headers["etag"]):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={name: response.headers[name] for name in ("etag", "last-modified", "cache-control")}
+        )
+    return response
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Iterator, Optional
+import numpy as np
+import openpyxl
+import pandas as pd
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from .conf import settings
+
+
+EXCEL_CONTENT_TYPES = ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel"]
+
+logger = logging.getLogger(__name__)
+
+
+def excel_chunks(file, column_mapping: dict, chunk_size: int) -> Iterator[pd.DataFrame]:
+    # Streams the first sheet with openpyxl in read-only mode and yields DataFrames of at most chunk_size rows,
+    # indexed by Excel line number, with one column per column_mapping value (missing headers read as None).
+    # Values keep their Python types (dtype object); empty cells are None and blank rows are skipped.
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [column_mapping.get(name.strip() if isinstance(name, str) else name) for name in next(rows, ())]
+        positions = [(position, column) for position, column in enumerate(header) if column is not None]
+        columns = list(column_mapping.values())
+
+        lines, records = [], []
+        for line, values in enumerate(rows, 2):
+            record = dict.fromkeys(columns)
+            for position, column in positions:
+                value = values[position] if position < len(values) else None
+                record[column] = (value.strip() or None) if isinstance(value, str) else value
+            if all(value is None for value in record.values()):
+                continue
+            lines.append(line)
+            records.append(record)
+            if len(records) == chunk_size:
+                yield pd.DataFrame(records, index=pd.Index(lines, name="line"), columns=columns, dtype=object)
+                lines, records = [], []
+
+        if records:
+            yield pd.DataFrame(records, index=pd.Index(lines, name="line"), columns=columns, dtype=object)
+
+    finally:
+        workbook.close()
+
+
+def collect_errors(checks, line_key: str = "Dòng", error_key: str = "Lỗi") -> list[dict]:
+    # Turns (mask, message[, values]) checks over one chunk into a single error list ordered by line, every
+    # failed check of a row included. A message given values is formatted with each failing row's value.
+    failures = []
+    for mask, message, *values in checks:
+        if not mask.any():
+            continue
+        if values:
+            failures.append(values[0][mask].map(message.format))
+        else:
+            failures.append(pd.Series(message, index=mask.index[mask.to_numpy()]))
+    if not failures:
+        return []
+
+    errors = pd.concat(failures).sort_index(kind="stable")
+    return [{line_key: int(line), error_key: message} for line, message in errors.items()]
+
+
+def duplicated(values, existing) -> pd.Series:
+    # Values already in the hashed set `existing` or seen earlier in the chunk (missing values never match).
+    keys = values if isinstance(values, pd.Series) else pd.MultiIndex.from_frame(values)
+    mask = pd.Series(keys.isin(existing) | keys.duplicated(), index=values.index)
+    return mask & values.notna().all(axis=1) if isinstance(values, pd.DataFrame) else mask & values.notna()
+
+
+def lookup(values: pd.Series, mapping: dict) -> pd.Series:
+    # Ids for names (or other keys) through a dict; missing or unknown keys give <NA>.
+    return values.map(mapping).astype("Int64")
+
+
+def to_integer(values: pd.Series) -> tuple[pd.Series, pd.Series]:
+    # Whole numbers parsed from a column (truncated, as int() would), and the mask of given values that aren't numbers.
+    numbers = pd.to_numeric(values, errors="coerce")
+    numbers = numbers.where(np.isfinite(numbers))
+    return np.trunc(numbers).astype("Int64"), values.notna() & numbers.isna()
+
+
+def to_text(values: pd.Series) -> pd.Series:
+    # Cell values as strings (numbers typed into text columns, e.g. phone numbers), keeping missing values.
+    return values.map(str, na_action="ignore")
+
+
+def model_rows(df: pd.DataFrame) -> list[dict]:
+    # Chunk rows as dicts of plain Python values, None for missing, ready for the model constructors.
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+async def import_excel(
+        db: AsyncSession,
+        file: UploadFile,
+        column_mapping: dict,
+        import_chunk: Callable[[pd.DataFrame], Awaitable[list]],
+        message: str,
+        error_status_code: int = status.HTTP_400_BAD_REQUEST,
+        line_key: str = "Dòng",
+        error_key: str = "Lỗi",
+        chunk_committed: Optional[Callable[[pd.DataFrame], None]] = None
+    ) -> JSONResponse:
+    # Reads the upload chunk by chunk (import_chunk_size rows) and commits each chunk in its own transaction.
+    # import_chunk validates one chunk (with the column checks above) and returns its errors; when there are none
+    # it adds the rows to db (flushing as needed) and the chunk is committed, otherwise the whole chunk is rolled
+    # back and skipped. Read and database errors are reported under line_key/error_key, which should be the keys
+    # import_chunk passes to collect_errors, so one report has one schema. chunk_committed is called with each
+    # chunk once it is committed: keys it records (e.g. names now taken) must not come from rejected chunks.
+    # The upload is already spooled to a temporary file by Starlette, so only one chunk is in memory at a time.
+    if file.content_type not in EXCEL_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail="File không hợp lệ. Vui lòng upload file Excel."
+        )
+
+    chunks = excel_chunks(file.file, column_mapping, settings.import_chunk_size)
+    report = []
+    errors = []
+    error_count = 0
+    inserted = 0
+
+    while True:
+        try:
+            df = await asyncio.to_thread(next, chunks, None)
+        except Exception as e:
+            if not report:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Lỗi đọc file: {str(e)}"
+                )
+            # The rows before the unreadable part are already committed; report where reading stopped.
+            errors.append({line_key: None, error_key: f"Lỗi đọc file: {str(e)}"})
+            error_count += 1
+            break
+
+        if df is None:
+            break
+
+        try:
+            chunk_errors = await import_chunk(df)
+            if chunk_errors:
+                await db.rollback()
+            else:
+                await db.commit()
+                if chunk_committed is not None:
+                    chunk_committed(df)
+
+        except SQLAlchemyError as e:
+            await db.rollback()
+            chunk_errors = [{line_key: f"{df.index[0]}-{df.index[-1]}", error_key: f"Lỗi cơ sở dữ liệu: {str(e)}"}]
+
+        chunk_inserted = 0 if chunk_errors else len(df)
+        inserted += chunk_inserted
+        error_count += len(chunk_errors)
+        errors.extend(chunk_errors[:max(settings.import_max_errors - len(errors), 0)])
+        report.append({
+            "chunk": len(report) + 1,
+            "lines": [int(df.index[0]), int(df.index[-1])],
+            "inserted": chunk_inserted,
+            "errors": len(chunk_errors)
+        })
+        logger.info("%s: chunk %d (lines %d-%d), %d inserted, %d errors",
+                    message, len(report), df.index[0], df.index[-1], chunk_inserted, len(chunk_errors))
+
+    if not error_count:
+        return JSONResponse(
+            status_code=201,
+            content={"message": message, "inserted": inserted, "chunks": report}
+        )
+    return JSONResponse(
+        status_code=207 if inserted else error_status_code,
+        content={"inserted": inserted, "error_count": error_count, "errors": errors, "chunks": report}
+    )
@@ -0,0 +1,173 @@
+import base64
+import binascii
+import json
+import math
+from typing import Literal, NamedTuple, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import Table, func, literal, select, text, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import CompileError
+from sqlalchemy.ext.asyncio import AsyncSession
+from configs.cache import TTLCache
+from configs.table_versions import statement_tables, table_versions
+from .conf import settings
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int, types: Optional[tuple] = None) -> list:
+    # `types` converts each value (e.g. (float, int)); a value that doesn't convert makes the cursor invalid.
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if types is not None and isinstance(values, list) and len(values) == size:
+            values = [type_(value) for type_, value in zip(types, values)]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor không hợp lệ"
+        )
+    return values
+
+
+NEXT = "n"
+PREV = "p"
+
+# exact: count(*) over the filtered query, cached until a table it reads is written;
+# window: count(*) OVER() computed by the page query itself (one scan, page mode only);
+# estimate: planner row estimate, from pg_class for unfiltered listings, else from EXPLAIN.
+CountMode = Literal["exact", "window", "estimate"]
+
+DIALECT = postgresql.dialect()
+
+count_cache = TTLCache(settings.count_cache_size, settings.count_cache_ttl_seconds)
+
+
+class Page(NamedTuple):
+    rows: list
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+    total_data: Optional[int]
+    total_pages: Optional[int]
+
+
+async def exact_count(db: AsyncSession, query) -> int:
+    statement = select(func.count()).select_from(query.order_by(None).subquery())
+    compiled = statement.compile(dialect=DIALECT)
+    key = (str(compiled), repr(sorted(compiled.params.items())))
+    tables = statement_tables(statement)
+    versions = table_versions.snapshot(tables)
+
+    cached = count_cache.get(key)
+    if cached is not None and cached[0] == versions:
+        return cached[1]
+
+    total = await db.scalar(statement)
+    count_cache.set(key, (versions, total))
+    return total
+
+
+async def estimated_count(db: AsyncSession, query) -> Optional[int]:
+    froms = query.get_final_froms()
+    if query.whereclause is None and len(froms) == 1 and isinstance(froms[0], Table):
+        reltuples = await db.scalar(text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:name)"), {"name": froms[0].name})
+        # -1 until the table has been vacuumed or analyzed once.
+        if reltuples is not None and reltuples >= 0:
+            return int(reltuples)
+
+    try:
+        sql = str(query.order_by(None).compile(dialect=DIALECT, compile_kwargs={"literal_binds": True}))
+    except (CompileError, NotImplementedError):
+        return None
+    plan = (await (await db.connection()).exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _cursor_values(keys, values):
+    params = []
+    for key, value in zip(keys, values):
+        try:
+            python_type = key.type.python_type
+        except NotImplementedError:
+            python_type = None
+        if value is None or isinstance(value, bool) or not isinstance(value, python_type or (str, int, float)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor không hợp lệ"
+            )
+        params.append(literal(value) if python_type is None else literal(value, key.type))
+    return params
+
+
+async def paginate(
+        db: AsyncSession,
+        query,
+        keys: list,
+        page_size: int,
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        count_query=None
+    ) -> Page:
+    # `keys` is the sort order: ascending, NOT NULL, and ending with a unique column (the id).
+    # With a cursor the page starts right after/before the row it encodes, so any depth costs one index range
+    # scan of page_size rows; without one, `page` falls back to OFFSET for older clients.
+    # Rows are entities for single-entity queries, else tuples. `count_query` replaces `query` for the
+    # total when the listing joins things that do not change the row count.
+    count_query = query if count_query is None else count_query
+    width = len(query.column_descriptions)
+    query = query.add_columns(*[key.label(f"cursor_{index}") for index, key in enumerate(keys)])
+    window = include_total and count_mode == "window" and not cursor
+    if window:
+        query = query.add_columns(func.count().over().label("total_count"))
+
+    direction = NEXT
+    if cursor:
+        direction, *values = decode_cursor(cursor, len(keys) + 1)
+        if direction not in (NEXT, PREV):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor không hợp lệ"
+            )
+        bound = _cursor_values(keys, values)
+        # The extra bound on the leading key alone lets Postgres seek its index even when the keys span a join.
+        if direction == NEXT:
+            query = query.where(keys[0] >= bound[0], tuple_(*keys) > tuple_(*bound)).order_by(*keys)
+        else:
+            query = query.where(keys[0] <= bound[0], tuple_(*keys) < tuple_(*bound)).order_by(*[key.desc() for key in keys])
+    else:
+        query = query.order_by(*keys).offset((page - 1) * page_size)
+
+    rows = (await db.execute(query.limit(page_size + 1))).all()
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == PREV:
+        rows.reverse()
+
+    has_next = more if direction == NEXT else True
+    has_prev = (bool(cursor) or page > 1) if direction == NEXT else more
+    next_cursor = encode_cursor(NEXT, *rows[-1][width:width + len(keys)]) if rows and has_next else None
+    prev_cursor = encode_cursor(PREV, *rows[0][width:width + len(keys)]) if rows and has_prev else None
+
+    total = None
+    if window and rows:
+        total = rows[0][-1]
+    elif include_total and count_mode == "estimate":
+        total = await estimated_count(db, count_query)
+    if include_total and total is None:
+        total = await exact_count(db, count_query)
+
+    return Page(
+        rows=[row[0] if width == 1 else tuple(row[:width]) for row in rows],
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+        total_data=total,
+        total_pages=None if total is None else math.ceil(total / page_size)
+    )
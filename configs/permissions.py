@@ -0,0 +1,122 @@
+import asyncio
+import time
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from authen.schemas.authen import Principal
+from configs.api_keys import invalidate_api_keys
+from configs.authentication import get_principal
+from configs.database import get_db
+from permission.models.permission import Permission
+from role.models.role import Role
+from role_permission.models.role_permission import RolePermission
+from .conf import settings
+
+
+SUPERUSER_ROLE = "admin"
+
+
+class PermissionRegistry:
+    # role name -> bitmask over permission bits, rebuilt from role_permissions in a single query.
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.bits = {}
+        self.role_masks = {}
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._generation += 1
+        self._expires_at = 0.0
+
+    async def ensure_loaded(self, db: AsyncSession):
+        if time.monotonic() < self._expires_at:
+            return
+        async with self._lock:
+            if time.monotonic() < self._expires_at:
+                return
+            generation = self._generation
+            rows = (await db.execute(select(Role.name, Permission.name)\
+                .select_from(Role)\
+                .outerjoin(RolePermission, RolePermission.role_id == Role.id)\
+                .outerjoin(Permission, Permission.id == RolePermission.permission_id))).all()
+
+            bits, role_masks = {}, {}
+            for role_name, permission_name in rows:
+                role_masks.setdefault(role_name, 0)
+                if permission_name is not None:
+                    bit = bits.setdefault(permission_name, len(bits))
+                    role_masks[role_name] |= 1 << bit
+
+            self.bits, self.role_masks = bits, role_masks
+            # A mutation that landed while we were reading keeps the registry stale.
+            if generation == self._generation:
+                self._expires_at = time.monotonic() + self.ttl
+
+    def allows(self, roles, permission: str) -> bool:
+        if SUPERUSER_ROLE in roles:
+            return True
+        bit = self.bits.get(permission)
+        if bit is None:
+            return False
+        mask = 0
+        for role in roles:
+            mask |= self.role_masks.get(role, 0)
+        return bool(mask >> bit & 1)
+
+
+permission_registry = PermissionRegistry(settings.permission_cache_ttl_seconds)
+
+
+def invalidate_permissions():
+    permission_registry.invalidate()
+    invalidate_api_keys()
+
+
+async def has_permission(db: AsyncSession, current_user: Principal, permission: str) -> bool:
+    if current_user is None:
+        return False
+    # An API key acts for its owner: it needs the permission in its scopes and in the owner's current roles.
+    if current_user.scopes is not None and permission not in current_user.scopes:
+        return False
+    if SUPERUSER_ROLE in current_user.roles:
+        return True
+    await permission_registry.ensure_loaded(db)
+    return permission_registry.allows(current_user.roles, permission)
+
+
+def require_permission(permission: str):
+    async def checker(
+            db: AsyncSession = Depends(get_db),
+            current_user: Principal = Depends(get_principal)
+        ):
+
+        if not await has_permission(db, current_user, permission):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Bạn không có quyền truy cập tài nguyên này"
+            )
+        return current_user
+
+    return checker
+
+
+def allow_api_key(permission: str):
+    # Users as with get_current_user; an API key only when it is granted `permission`, so machine-facing routes
+    # (kiosks, self-checkout) open to keys scope by scope while every other route keeps rejecting them.
+    async def checker(
+            db: AsyncSession = Depends(get_db),
+            current_user: Principal = Depends(get_principal)
+        ):
+
+        if current_user is not None and current_user.scopes is not None \
+                and not await has_permission(db, current_user, permission):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Khóa API không được phép truy cập tài nguyên này"
+            )
+        return current_user
+
+    return checker
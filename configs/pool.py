@@ -0,0 +1,81 @@
+import bisect
+import threading
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+# Upper bounds (ms) of the checkout wait-time histogram buckets; the last bucket is +Inf.
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolWaitStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.timeouts = 0
+
+    def observe(self, wait_ms: float, timed_out: bool = False):
+        with self._lock:
+            self.buckets[bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+            self.count += 1
+            self.total_ms += wait_ms
+            self.max_ms = max(self.max_ms, wait_ms)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"le_{b}ms" for b in WAIT_BUCKETS_MS] + ["le_inf"]
+            cumulative, histogram = 0, {}
+            for label, n in zip(labels, self.buckets):
+                cumulative += n
+                histogram[label] = cumulative
+            return {
+                "count": self.count,
+                "timeouts": self.timeouts,
+                "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+                "max_ms": round(self.max_ms, 3),
+                "histogram": histogram,
+            }
+
+
+class _InstrumentedPoolMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.observe((time.perf_counter() - start) * 1000, timed_out=True)
+            raise
+        self.wait_stats.observe((time.perf_counter() - start) * 1000)
+        return conn
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_status(pool) -> dict:
+    size = pool.size()
+    checked_out = pool.checkedout()
+    return {
+        "pool_size": size,
+        "max_overflow": pool._max_overflow,
+        "checked_out": checked_out,
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "available": size + max(pool._max_overflow, 0) - checked_out if pool._max_overflow >= 0 else None,
+        "wait": pool.wait_stats.snapshot() if hasattr(pool, "wait_stats") else None,
+    }
@@ -0,0 +1,66 @@
+import logging
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import Request, status
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, raiseload
+from .conf import settings
+
+
+QUERY_COUNT_HEADER = "X-SQL-Queries"
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    # SQL statements run on behalf of one request, against the budget of the route that served it.
+
+    def __init__(self, budget: int):
+        self.count = 0
+        self.budget = budget
+
+
+query_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = query_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _raise_on_lazy_load(orm_execute_state):
+    # Strict mode: any relationship a query didn't load eagerly raises on access instead of emitting SQL.
+    if settings.sql_strict_mode and orm_execute_state.is_select \
+            and not orm_execute_state.is_column_load and not orm_execute_state.is_relationship_load:
+        orm_execute_state.statement = orm_execute_state.statement.options(raiseload("*", sql_only=True))
+
+
+def query_budget(limit: int):
+    # Route dependency: the most SQL statements one request to this route may run.
+    def set_budget():
+        counter = query_counter.get()
+        if counter is not None:
+            counter.budget = limit
+
+    return set_budget
+
+
+def check_query_budget(request: Request, counter: QueryCounter, response: Response) -> Response:
+    response.headers[QUERY_COUNT_HEADER] = str(counter.count)
+    if counter.count <= counter.budget:
+        return response
+
+    route = getattr(request.scope.get("route"), "path", request.url.path)
+    logger.warning("%s %s ran %d SQL statements (budget %d)", request.method, route, counter.count, counter.budget)
+    if not settings.sql_strict_mode:
+        return response
+    return JSONResponse(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        content={"detail": f"Vượt quá số truy vấn SQL cho phép: {counter.count} > {counter.budget}"},
+        headers={QUERY_COUNT_HEADER: str(counter.count)}
+    )
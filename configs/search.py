@@ -0,0 +1,101 @@
+import unicodedata
+from sqlalchemy import DDL, Column, Computed, Index, String, event, func, literal_column
+from configs.database import Base
+
+
+def pg_trgm_available(bind) -> bool:
+    if bind is None:
+        return True
+    return bind.exec_driver_sql(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    ).first() is not None
+
+
+def _pg_trgm_ready(ddl, target, bind, **kw) -> bool:
+    return pg_trgm_available(bind)
+
+
+# Trigram indexes need the extension; servers without contrib still get the
+# tables, and substring search falls back to a sequential scan.
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql", callable_=_pg_trgm_ready),
+)
+
+
+def trigram_index(name: str, column: str) -> Index:
+    # GIN trigram index serving `column ILIKE '%term%'`.
+    return Index(
+        name, column,
+        postgresql_using="gin",
+        postgresql_ops={column: "gin_trgm_ops"},
+    ).ddl_if(dialect="postgresql", callable_=_pg_trgm_ready)
+
+
+def normalize_text(value: str) -> str:
+    # "Nguyễn Văn Đức" -> "nguyen van duc"; đ has no decomposition so it is mapped by hand.
+    value = unicodedata.normalize("NFD", value.replace("đ", "d").replace("Đ", "D"))
+    return "".join(c for c in value if not unicodedata.combining(c)).lower()
+
+
+def _accent_table() -> tuple[str, str]:
+    # Latin-1, Latin Extended-A/B and Vietnamese letters that fold to a single ASCII letter.
+    accented, plain = [], []
+    for code in [*range(0xC0, 0x250), *range(0x1E00, 0x1F00)]:
+        char = chr(code)
+        folded = normalize_text(char)
+        if len(folded) == 1 and folded.isascii() and folded.isalpha():
+            accented.append(char)
+            plain.append(folded)
+    return "".join(accented), "".join(plain)
+
+
+ACCENTED_CHARS, PLAIN_CHARS = _accent_table()
+
+
+def normalized_expression(column: str) -> str:
+    # translate() and lower() are immutable, so Postgres can keep a STORED generated column
+    # in sync on every insert/update; letters are folded before lower() so it also holds under the C locale.
+    return f"lower(translate({column}, '{ACCENTED_CHARS}', '{PLAIN_CHARS}'))"
+
+
+def normalized_column(column: str) -> Column:
+    return Column(String, Computed(normalized_expression(column), persisted=True))
+
+
+def given_name(full_name):
+    # Vietnamese names sort by their last word. Literal arguments keep the expression identical to
+    # the one in the ix_*_given_name_id indexes, so prepared statements can still use them.
+    return func.split_part(full_name, literal_column("' '"), literal_column("-1"))
+
+
+# Full-text search uses the language-neutral 'simple' configuration; every text part is indexed
+# both as written and accent-folded so "nguyen" and "Nguyễn" both match.
+TS_CONFIG = literal_column("'simple'::regconfig")
+
+
+def fold_accents(expr):
+    return func.lower(func.translate(expr, literal_column(f"'{ACCENTED_CHARS}'"), literal_column(f"'{PLAIN_CHARS}'")))
+
+
+def search_document(*parts):
+    # parts: (weight, expression) pairs, weight being one of 'A'..'D'.
+    document = None
+    for weight, expr in parts:
+        text = func.coalesce(expr, literal_column("''"))
+        vector = func.setweight(
+            func.to_tsvector(TS_CONFIG, text).op("||")(func.to_tsvector(TS_CONFIG, fold_accents(text))),
+            literal_column(f"'{weight}'"),
+        )
+        document = vector if document is None else document.op("||")(vector)
+    return document
+
+
+def search_query(term: str):
+    return func.websearch_to_tsquery(TS_CONFIG, term).op("||")(func.websearch_to_tsquery(TS_CONFIG, normalize_text(term)))
+
+
+def headline(expr, query, highlight_all: bool = False):
+    options = "StartSel=<mark>, StopSel=</mark>, " + ("HighlightAll=true" if highlight_all else "MaxFragments=2, MinWords=5, MaxWords=20")
+    return func.ts_headline(TS_CONFIG, expr, query, literal_column(f"'{options}'"))
@@ -0,0 +1,29 @@
+import json
+from typing import Optional
+from fastapi.responses import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from configs.cache import TTLCache
+from configs.table_versions import table_versions
+from .conf import settings
+
+
+# table name -> (table version, encoded body). Rebuilt after the table is written (in this process),
+# and at least every ttl for writes made by other workers or not yet visible on the replica.
+name_snapshot_cache = TTLCache(64, settings.name_snapshot_ttl_seconds)
+
+
+async def name_snapshot(db: AsyncSession, model, field: Optional[str] = None) -> Response:
+    # (id, name) of every row as ready-to-send JSON, wrapped in {field: [...]} unless field is None.
+    table = model.__tablename__
+    version = table_versions.snapshot((table,))
+    cached = name_snapshot_cache.get(table)
+    if cached is None or cached[0] != version:
+        rows = (await db.execute(select(model.id, model.name).order_by(model.id))).all()
+        items = [{"id": id, "name": name} for id, name in rows]
+        body = json.dumps(items if field is None else {field: items}, ensure_ascii=False, separators=(",", ":")).encode()
+        # Stored under the version read before the query, so a write racing it only forces one more rebuild.
+        cached = (version, body)
+        name_snapshot_cache.set(table, cached)
+
+    return Response(content=cached[1], media_type="application/json")
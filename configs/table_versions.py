@@ -0,0 +1,54 @@
+import threading
+from sqlalchemy import Table, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.dml import UpdateBase
+
+
+class TableVersions:
+    # Per-table write counters used to invalidate cached query results in this process.
+    # A table is bumped when a write statement runs and again when its transaction commits,
+    # so a value read in between is never kept past the commit.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def bump(self, tables):
+        with self._lock:
+            for name in tables:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def snapshot(self, tables) -> tuple:
+        return tuple(self._versions.get(name, 0) for name in tables)
+
+
+table_versions = TableVersions()
+
+
+def statement_tables(statement) -> tuple:
+    # Names of every table a statement reads, aliases and subqueries included.
+    return tuple(sorted({element.name for element in visitors.iterate(statement) if isinstance(element, Table)}))
+
+
+@event.listens_for(Engine, "after_execute")
+def _track_writes(conn, clauseelement, multiparams, params, execution_options, result):
+    if not isinstance(clauseelement, UpdateBase):
+        return
+    name = getattr(clauseelement.table, "name", None)
+    if name is None:
+        return
+    conn.info.setdefault("written_tables", set()).add(name)
+    table_versions.bump([name])
+
+
+@event.listens_for(Engine, "commit")
+def _bump_committed(conn):
+    tables = conn.info.pop("written_tables", None)
+    if tables:
+        table_versions.bump(tables)
+
+
+@event.listens_for(Engine, "rollback")
+def _forget_rolled_back(conn):
+    conn.info.pop("written_tables", None)
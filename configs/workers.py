@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+
+
+class BoundedExecutor:
+    # Thread pool for blocking CPU work (bcrypt releases the GIL) with a cap on queued jobs:
+    # once `workers + max_queue` jobs are in flight new ones are refused with 503 instead of piling up.
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_ms = 0.0
+        self.total_run_ms = 0.0
+
+    def _reserve(self) -> bool:
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            self.submitted += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return True
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _timed(self, queued_at: float, fn, args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.total_wait_ms += (started - queued_at) * 1000
+                self.total_run_ms += (finished - started) * 1000
+
+    async def run(self, fn, *args):
+        if not self._reserve():
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Hệ thống đang quá tải, vui lòng thử lại sau",
+                headers={"Retry-After": "1"}
+            )
+        future = self._executor.submit(self._timed, time.perf_counter(), fn, args)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A job cancelled while still queued never reaches _timed, so its slot is released here;
+            # one already running releases it itself when it finishes.
+            if future.cancel():
+                self._release()
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queued": max(self.in_flight - self.workers, 0),
+                "max_in_flight": self.max_in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait_ms / self.completed, 3) if self.completed else 0.0,
+                "avg_run_ms": round(self.total_run_ms / self.completed, 3) if self.completed else 0.0,
+            }
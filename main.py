@@ -1,7 +1,9 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from configs.database import Base, engine
+from configs.database import Base, engine, mark_read_your_writes
 from configs.conf import settings
+from configs.api_keys import api_key_usage
+from configs.query_budget import QueryCounter, check_query_budget, query_counter
 from role.routers import role
 from permission.routers import permission
 from role_permission.routers import role_permission
@@ -9,6 +11,7 @@ from user.routers import user
 from auth_credential.routers import auth_credential
 from user_role.routers import user_role
 from authen.routers import authen
+from api_key.routers import api_key
 from author.routers import author
 from category.routers import category
 from publisher.routers import publisher
@@ -17,12 +20,14 @@ from book_copy.routers import book_copy
 from bookshelf.routers import bookshelf
 from borrow.routers import borrow
 from stats.routers import stats
+from system.routers import system
 import uvicorn
 
 
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI()
+app.router.add_event_handler("shutdown", api_key_usage.flush)
 
 origins = [
     '*'
@@ -37,6 +42,24 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    mark_read_your_writes(request, response)
+    return response
+
+
+@app.middleware("http")
+async def sql_query_budget(request: Request, call_next):
+    counter = QueryCounter(settings.sql_query_budget)
+    token = query_counter.set(counter)
+    try:
+        response = await call_next(request)
+    finally:
+        query_counter.reset(token)
+    return check_query_budget(request, counter, response)
+
+
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
@@ -49,6 +72,7 @@ app.router.include_router(user.router)
 app.router.include_router(auth_credential.router)
 app.router.include_router(user_role.router)
 app.router.include_router(authen.router)
+app.router.include_router(api_key.router)
 app.router.include_router(author.router)
 app.router.include_router(category.router)
 app.router.include_router(publisher.router)
@@ -57,6 +81,7 @@ app.router.include_router(bookshelf.router)
 app.router.include_router(book_copy.router)
 app.router.include_router(borrow.router)
 app.router.include_router(stats.router)
+app.router.include_router(system.router)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from configs.authentication import get_current_user
-from configs.database import get_db
+from configs.database import get_db, get_read_db
+from configs.pagination import CountMode, paginate
+from configs.permissions import invalidate_permissions
 from permission.models.permission import Permission
 from permission.schemas.permission import *
-import math
 
 
 router = APIRouter(
@@ -19,12 +22,12 @@ router = APIRouter(
             response_model=ListPermissionResponse, 
             status_code=status.HTTP_200_OK)
 async def get_permissions(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        permissions = db.query(Permission).all()
+        permissions = (await db.execute(select(Permission))).scalars().all()
 
         return ListPermissionResponse(
             permissions=permissions, 
@@ -42,22 +45,25 @@ async def get_permissions(
             response_model=PermissionPageableResponse, 
             status_code=status.HTTP_200_OK)
 async def get_permission_pageable(
-        page: int, 
-        page_size: int, 
-        db: Session = Depends(get_db), 
+        page_size: int,
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
      
     try:
-        total_count = db.query(Permission).count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-        permissions = db.query(Permission).offset(offset).limit(page_size).all()
+        permissions, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, select(Permission), [Permission.id], page_size, page, cursor, include_total, count_mode)
 
         return PermissionPageableResponse(
             permissions=permissions,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -72,12 +78,12 @@ async def get_permission_pageable(
             status_code=status.HTTP_200_OK)
 async def get_permission_by_id(
         permission_id: int,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
     
     try:
-        permission = db.query(Permission).filter(Permission.id == permission_id).first()
+        permission = (await db.execute(select(Permission).where(Permission.id == permission_id))).scalars().first()
         if not permission:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
@@ -97,17 +103,17 @@ async def get_permission_by_id(
             response_model=ListPermissionResponse)
 async def search_permissions_by_name(
         info: PermissionSearch,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        permissions = db.query(Permission)
+        permissions = select(Permission)
         if info.name:
-            permissions = permissions.filter(Permission.name.like(f"%{info.name}%"))
+            permissions = permissions.where(Permission.name.like(f"%{info.name}%"))
         if info.detail:
-            permissions = permissions.filter(Permission.detail.like(f"%{info.detail}%"))
-        permissions = permissions.all()
+            permissions = permissions.where(Permission.detail.like(f"%{info.detail}%"))
+        permissions = (await db.execute(permissions)).scalars().all()
 
         return ListPermissionResponse(
             permissions=permissions,
@@ -126,12 +132,12 @@ async def search_permissions_by_name(
              status_code=status.HTTP_201_CREATED)
 async def create_permission(
         new_permission: PermissionCreate,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        permission = db.query(Permission).filter(Permission.name == new_permission.name).first()
+        permission = (await db.execute(select(Permission).where(Permission.name == new_permission.name))).scalars().first()
         if permission:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
@@ -140,7 +146,8 @@ async def create_permission(
 
         permission = Permission(**new_permission.dict())
         db.add(permission)
-        db.commit()    
+        await db.commit()    
+        invalidate_permissions()
 
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -148,14 +155,14 @@ async def create_permission(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -167,26 +174,27 @@ async def create_permission(
             status_code=status.HTTP_201_CREATED)
 async def import_permissions(
         permissions: list[PermissionCreate],
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
         permissions = [Permission(**permission.dict()) for permission in permissions]
         db.add_all(permissions)
-        db.commit()
+        await db.commit()
+        invalidate_permissions()
 
         return permissions
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -199,32 +207,35 @@ async def import_permissions(
 async def update_permission(
         permission_id: int,
         new_permission: PermissionUpdate,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        permission = db.query(Permission).filter(Permission.id == permission_id)
-        if not permission.first():
+        permission = (await db.execute(select(Permission).where(Permission.id == permission_id))).scalars().first()
+        if not permission:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
                 detail="Quyền không tồn tại"
             )
 
-        permission.update(new_permission.dict())
-        db.commit()
+        await db.execute(update(Permission).where(Permission.id == permission_id).values(new_permission.dict()))
+        await db.commit()
+        invalidate_permissions()
+
+        await db.refresh(permission)
 
-        return permission.first()
+        return permission
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -235,19 +246,20 @@ async def update_permission(
             status_code=status.HTTP_200_OK)
 async def delete_permission(
         permission_id: int,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        permission = db.query(Permission).filter(Permission.id == permission_id)
-        if not permission.first():
+        permission = (await db.execute(select(Permission).where(Permission.id == permission_id))).scalars().first()
+        if not permission:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
                 detail="Quyền không tồn tại"
             )
-        permission.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(Permission).where(Permission.id == permission_id))
+        await db.commit()
+        invalidate_permissions()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -255,14 +267,14 @@ async def delete_permission(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -273,19 +285,20 @@ async def delete_permission(
             status_code=status.HTTP_200_OK)
 async def delete_roles(
         permission_ids: list[int],
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        permissions = db.query(Permission).filter(Permission.id.in_(permission_ids))
-        if not permissions.first():
+        permissions = (await db.execute(select(Permission).where(Permission.id.in_(permission_ids)))).scalars().first()
+        if not permissions:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
                 detail="Quyền không tồn tại"
             )
-        permissions.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(Permission).where(Permission.id.in_(permission_ids)))
+        await db.commit()
+        invalidate_permissions()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -293,14 +306,14 @@ async def delete_roles(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -310,13 +323,14 @@ async def delete_roles(
 @router.delete("/delete-all",
             status_code=status.HTTP_200_OK)
 async def delete_all_permissions(
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        db.query(Permission).delete()
-        db.commit()
+        await db.execute(delete(Permission))
+        await db.commit()
+        invalidate_permissions()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -324,14 +338,14 @@ async def delete_all_permissions(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -1,14 +1,23 @@
-from sqlalchemy import Column, String, Integer, text
+from sqlalchemy import Column, Index, String, Integer, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from configs.database import Base
+from configs.search import normalized_column, trigram_index
 
 
 class Publisher(Base):
     __tablename__ = "publishers"
+    __table_args__ = (
+        trigram_index("ix_publishers_name_normalized_trgm", "name_normalized"),
+        trigram_index("ix_publishers_email_trgm", "email"),
+        trigram_index("ix_publishers_address_trgm", "address"),
+        trigram_index("ix_publishers_phone_number_trgm", "phone_number"),
+        Index("ix_publishers_name_id", "name", "id"),
+    )
 
     id = Column(Integer, primary_key=True, nullable=False)
     name = Column(String, nullable=False)
+    name_normalized = normalized_column("name")
     email = Column(String, nullable=True)
     address = Column(String, nullable=True)
     phone_number = Column(String, nullable=True)
@@ -1,15 +1,18 @@
-from io import BytesIO
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from fastapi.responses import JSONResponse, StreamingResponse
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, Request, status
+from fastapi.responses import JSONResponse
+from typing import Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from configs.authentication import get_current_user
-from configs.database import get_db
+from configs.database import get_db, get_read_db
+from configs.exports import ExportFormat, export_file
+from configs.imports import collect_errors, duplicated, import_excel, model_rows, to_text
+from configs.pagination import CountMode, paginate
+from configs.search import normalize_text
+from configs.snapshots import name_snapshot
 from publisher.models.publisher import Publisher
 from publisher.schemas.publisher import *
-import math
-import pandas as pd
 
 
 router = APIRouter(
@@ -22,11 +25,11 @@ router = APIRouter(
             response_model=ListPublisherResponse,
             status_code=status.HTTP_200_OK)
 async def get_publishers(
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        publishers = db.query(Publisher).all()
+        publishers = (await db.execute(select(Publisher))).scalars().all()
 
         return ListPublisherResponse(
             publishers=publishers,
@@ -44,23 +47,24 @@ async def get_publishers(
             response_model=PublisherPageableResponse,
             status_code=status.HTTP_200_OK)
 async def get_publishers_pageable(
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        total_count = db.query(Publisher).count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-        publishers = db.query(Publisher)\
-            .order_by(Publisher.name)\
-            .offset(offset).limit(page_size).all()
+        publishers, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, select(Publisher), [Publisher.name, Publisher.id], page_size, page, cursor, include_total, count_mode)
 
         return PublisherPageableResponse(
             publishers=publishers,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -73,36 +77,21 @@ async def get_publishers_pageable(
 @router.get("/export",
             status_code=status.HTTP_200_OK)
 async def export_publishers(
-        db: Session = Depends(get_db), 
+        request: Request,
+        format: ExportFormat = "xlsx",
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        publishers = db.query(Publisher).all()
-        df = pd.DataFrame([{
-            "Số thứ tự": i + 1,
-            "Tên nhà xuất bản": p.name,
-            "Email": p.email,
-            "Địa chỉ": p.address,
-            "Số điện thoại": p.phone_number
-        } for i, p in enumerate(publishers)])
-        
-        output = BytesIO()
-        writer = pd.ExcelWriter(output, engine='xlsxwriter')
-        df.to_excel(writer, sheet_name='Publishers', index=False)
-        writer.close()
-        output.seek(0)
-
-        headers = {
-            'Content-Disposition': 'attachment; filename="publishers.xlsx"'
-        }
-        
-        return StreamingResponse(
-            output,
-            headers=headers,
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        query = select(Publisher.name, Publisher.email, Publisher.address, Publisher.phone_number).order_by(Publisher.id)
+
+        return await export_file(
+            request, db, query,
+            ["Tên nhà xuất bản", "Email", "Địa chỉ", "Số điện thoại"],
+            "Publishers", "publishers", format, numbered=True
         )
-    
+
     except Exception as e:
         raise HTTPException(
             status_code=500, 
@@ -112,15 +101,11 @@ async def export_publishers(
 
 @router.get("/name")
 async def get_publisher_names(
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        publishers = db.query(Publisher).all()
-        
-        return ListPublisherNameResponse(
-            publishers=[PublisherName(name=p.name, id=p.id) for p in publishers]
-        )
+        return await name_snapshot(db, Publisher, "publishers")
     
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -135,11 +120,11 @@ async def get_publisher_names(
             status_code=status.HTTP_200_OK)
 async def search_publisher_by_id(
         id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
-        publisher = db.query(Publisher).filter(Publisher.id == id).first()
+        publisher = (await db.execute(select(Publisher).where(Publisher.id == id))).scalars().first()
         if not publisher:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -160,35 +145,36 @@ async def search_publisher_by_id(
             status_code=status.HTTP_200_OK)
 async def search_publisher(
         info: PublisherSearch,
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db)
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db)
     ):
 
     try:
         print(info.dict())
 
-        publishers = db.query(Publisher)
+        publishers = select(Publisher)
         if info.name and info.name.strip():
-            publishers = publishers.filter(func.lower(Publisher.name).ilike(f"%{info.name.strip().lower()}%"))
+            publishers = publishers.where(Publisher.name_normalized.like(f"%{normalize_text(info.name.strip())}%"))
         if info.email and info.email.strip():
-            publishers = publishers.filter(func.lower(Publisher.email).ilike(f"%{info.email.strip().lower()}%"))
+            publishers = publishers.where(Publisher.email.ilike(f"%{info.email.strip()}%"))
         if info.address and info.address.strip():
-            publishers = publishers.filter(func.lower(Publisher.address).ilike(f"%{info.address.strip().lower()}%"))
+            publishers = publishers.where(Publisher.address.ilike(f"%{info.address.strip()}%"))
         if info.phone_number and info.phone_number.strip():
-            publishers = publishers.filter(Publisher.phone_number.ilike(f"%{info.phone_number.strip()}%"))
-
-        total_count = publishers.count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
+            publishers = publishers.where(Publisher.phone_number.ilike(f"%{info.phone_number.strip()}%"))
 
-        publishers = publishers.order_by(Publisher.name)\
-            .offset(offset).limit(page_size).all()
+        publishers, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, publishers, [Publisher.name, Publisher.id], page_size, page, cursor, include_total, count_mode)
 
         return PublisherPageableResponse(
             publishers=publishers,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -203,12 +189,12 @@ async def search_publisher(
             status_code=status.HTTP_201_CREATED)
 async def create_publisher(
         new_publisher: PublisherCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        publisher = db.query(Publisher).filter(Publisher.name == new_publisher.name).first()
+        publisher = (await db.execute(select(Publisher).where(Publisher.name == new_publisher.name))).scalars().first()
         if publisher:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -217,19 +203,19 @@ async def create_publisher(
 
         publisher = Publisher(**new_publisher.dict())
         db.add(publisher)
-        db.commit()
+        await db.commit()
 
         return publisher
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -240,7 +226,7 @@ async def create_publisher(
             status_code=status.HTTP_201_CREATED)
 async def import_publishers(
         file: UploadFile = File(...),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
@@ -251,84 +237,25 @@ async def import_publishers(
         "Số điện thoại": "phone_number"
     }
     
-    if file.content_type not in ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel"]:
-        raise HTTPException(
-            status_code=400, 
-            detail="File không hợp lệ. Vui lòng upload file Excel."
-        )
-    
-    content = await file.read()
+    existing_publisher_names = set((await db.execute(select(Publisher.name))).scalars().all())
 
-    try:
-        df = pd.read_excel(BytesIO(content))
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Lỗi đọc file: {str(e)}"
-        )
-    
-    try:
-        df.rename(columns=COLUMN_MAPPING, inplace=True)
-    except KeyError as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Tiêu đề cột không hợp lệ: {str(e)}"
-        )
-    
-    existing_publisher_names = {p.name for p in db.query(Publisher).all()}
-    errors = []
-    list_publishers = []
-    
-    for index, row in df.iterrows():
-        name = row.get("name")
-        if not name:
-            errors.append({"Dòng": index + 2, "Lỗi": "Tên nhà xuất bản không được để trống."})
-            continue
-        
-        if name in existing_publisher_names:
-            errors.append({"Dòng": index + 2, "Lỗi": f"Nhà xuất bản '{name}' đã tồn tại."})
-            continue
-        
-        email = None if pd.isna(row.get("email")) else row.get("email")
-        address = None if pd.isna(row.get("address")) else row.get("address")
-        phone_number = None if pd.isna(row.get("phone_number")) else str(row.get("phone_number"))
-        
-        publisher = Publisher(
-            name=name,
-            email=email,
-            address=address,
-            phone_number=phone_number
-        )
-        list_publishers.append(publisher)
-    
-    if errors:
-        return JSONResponse(
-            content={"errors": errors}, 
-            status_code=400
-        )
-    
-    try:
+    async def import_chunk(df):
+        exists = duplicated(df["name"], existing_publisher_names)
+        errors = collect_errors([
+            (df["name"].isna(), "Tên nhà xuất bản không được để trống."),
+            (exists, "Nhà xuất bản '{}' đã tồn tại.", df["name"])
+        ])
 
-        db.bulk_save_objects(list_publishers)
-        db.commit()
-        return JSONResponse(
-            content={"message": "Import nhà xuất bản thành công."}, 
-            status_code=201
-        )
+        if not errors:
+            db.add_all([Publisher(**row) for row in model_rows(df.assign(phone_number=to_text(df["phone_number"])))])
+        return errors
 
-    except IntegrityError:
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
-        )
-    
-    except SQLAlchemyError as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
-        )
+    def chunk_committed(df):
+        existing_publisher_names.update(df["name"].dropna())
+
+    return await import_excel(
+        db, file, COLUMN_MAPPING, import_chunk, "Import nhà xuất bản thành công.", chunk_committed=chunk_committed
+    )
 
 
 @router.put("/update/{id}",
@@ -337,20 +264,20 @@ async def import_publishers(
 async def update_publisher(
         id: int,
         new_publisher: PublisherUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        publisher = db.query(Publisher).filter(Publisher.id == id)
-        if not publisher.first():
+        publisher = (await db.execute(select(Publisher).where(Publisher.id == id))).scalars().first()
+        if not publisher:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Nhà xuất bản không tồn tại"
             )
 
-        publisher.update(new_publisher.dict(), synchronize_session=False)
-        db.commit()
+        await db.execute(update(Publisher).where(Publisher.id == id).values(new_publisher.dict()))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Cập nhật nhà xuất bản thành công."},
@@ -358,14 +285,14 @@ async def update_publisher(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -376,20 +303,20 @@ async def update_publisher(
             status_code=status.HTTP_200_OK)
 async def delete_publisher(
         id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        publisher = db.query(Publisher).filter(Publisher.id == id)
-        if not publisher.first():
+        publisher = (await db.execute(select(Publisher).where(Publisher.id == id))).scalars().first()
+        if not publisher:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Nhà xuất bản không tồn tại"
             )
 
-        publisher.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(Publisher).where(Publisher.id == id))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Xóa nhà xuất bản thành công."},
@@ -397,14 +324,14 @@ async def delete_publisher(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -415,20 +342,20 @@ async def delete_publisher(
             status_code=status.HTTP_200_OK)
 async def delete_publishers(
         publishers: DeleteMany,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        publishers = db.query(Publisher).filter(Publisher.id.in_(publishers.list_id))
-        if not publishers.first():
+        publishers = (await db.execute(select(Publisher).where(Publisher.id.in_(publishers.list_id)))).scalars().first()
+        if not publishers:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Nhà xuất bản không tồn tại"
             )
 
-        publishers.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(Publisher).where(Publisher.id.in_(publishers.list_id)))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Xóa danh sách nhà xuất bản thành công."},
@@ -436,14 +363,14 @@ async def delete_publishers(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -453,13 +380,13 @@ async def delete_publishers(
 @router.delete("/delete-all",
             status_code=status.HTTP_200_OK)
 async def delete_all_publishers(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        db.query(Publisher).delete()
-        db.commit()
+        await db.execute(delete(Publisher))
+        await db.commit()
 
         return JSONResponse(
             content={"message": "Xóa tất cả nhà xuất bản thành công."},
@@ -467,7 +394,7 @@ async def delete_all_publishers(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -37,8 +37,10 @@ class ListPublisherResponse(BaseModel):
 class PublisherPageableResponse(BaseModel):
     publishers: list[PublisherResponse]
 
-    total_pages: int
-    total_data: int
+    total_pages: Optional[int] = None
+    total_data: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
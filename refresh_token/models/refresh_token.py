@@ -0,0 +1,24 @@
+from sqlalchemy import Column, ForeignKey, Integer, String, func, text, update
+from sqlalchemy.sql.sqltypes import TIMESTAMP
+from configs.database import Base
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    # sha256 of the opaque token; the token itself is never stored.
+    token_hash = Column(String(64), nullable=False, unique=True)
+    # All tokens produced by rotating one login share a family; reusing a rotated token revokes the family.
+    family_id = Column(String(32), nullable=False, index=True)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    revoked_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    replaced_by_id = Column(Integer, ForeignKey("refresh_tokens.id", ondelete="SET NULL"), nullable=True)
+
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+
+
+def revoke_refresh_tokens(*criteria):
+    return update(RefreshToken).where(RefreshToken.revoked_at.is_(None), *criteria)\
+        .values(revoked_at=func.now()).execution_options(synchronize_session=False)
@@ -1,12 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from configs.authentication import get_current_user
-from configs.database import get_db
+from configs.authentication import get_current_user, invalidate_principals
+from configs.database import get_db, get_read_db
+from configs.pagination import CountMode, paginate
+from configs.permissions import invalidate_permissions
+from configs.snapshots import name_snapshot
 from role.models.role import Role
 from role.schemas.role import *
-import math
+from user.models.user import User, role_version_bump
+from user_role.models.user_role import UserRole
 
 
 router = APIRouter(
@@ -19,12 +25,12 @@ router = APIRouter(
             response_model=ListRoleResponse, 
             status_code=status.HTTP_200_OK)
 async def get_roles(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        roles = db.query(Role).all()
+        roles = (await db.execute(select(Role))).scalars().all()
 
         return ListRoleResponse(
             roles=roles, 
@@ -42,22 +48,25 @@ async def get_roles(
             response_model=RolePageableResponse, 
             status_code=status.HTTP_200_OK)
 async def get_roles_pageable(
-        page: int, 
-        page_size: int, 
-        db: Session = Depends(get_db), 
+        page_size: int,
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
      
     try:
-        total_count = db.query(Role).count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-        roles = db.query(Role).offset(offset).limit(page_size).all()
+        roles, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, select(Role), [Role.id], page_size, page, cursor, include_total, count_mode)
 
         roles_pageable_res = RolePageableResponse(
             roles=roles,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
 
         return roles_pageable_res
@@ -73,15 +82,12 @@ async def get_roles_pageable(
             response_model=list[RoleNameResponse], 
             status_code=status.HTTP_200_OK)
 async def get_roles_name(
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        roles = db.query(Role).all()
-        roles_name_res = [RoleNameResponse(id=role.id, name=role.name) for role in roles]
-
-        return roles_name_res
+        return await name_snapshot(db, Role)
     
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -95,12 +101,12 @@ async def get_roles_name(
             status_code=status.HTTP_200_OK)
 async def get_role_by_id(
         id: int,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
     
     try:
-        role = db.query(Role).filter(Role.id == id).first()
+        role = (await db.execute(select(Role).where(Role.id == id))).scalars().first()
         if not role:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
@@ -120,28 +126,31 @@ async def get_role_by_id(
             response_model=RolePageableResponse)
 async def search_roles_by_name(
         search: RoleSearch,
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db), 
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        roles = db.query(Role)
+        roles = select(Role)
         if search.name:
-            roles = roles.filter(Role.name.like(f"%{search.name}%"))
+            roles = roles.where(Role.name.like(f"%{search.name}%"))
         if search.detail:
-            roles = roles.filter(Role.detail.like(f"%{search.detail}%"))
+            roles = roles.where(Role.detail.like(f"%{search.detail}%"))
 
-        total_count = roles.count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-        roles = roles.offset(offset).limit(page_size).all()
+        roles, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, roles, [Role.id], page_size, page, cursor, include_total, count_mode)
 
         return RolePageableResponse(
             roles=roles,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -156,12 +165,12 @@ async def search_roles_by_name(
              status_code=status.HTTP_201_CREATED)
 async def create_role(
         new_role: RoleCreate,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        role = db.query(Role).filter(Role.name == new_role.name).first()
+        role = (await db.execute(select(Role).where(Role.name == new_role.name))).scalars().first()
         if role:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
@@ -170,7 +179,8 @@ async def create_role(
 
         role = Role(**new_role.dict())
         db.add(role)
-        db.commit()    
+        await db.commit()    
+        invalidate_permissions()
 
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -178,14 +188,14 @@ async def create_role(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -197,14 +207,15 @@ async def create_role(
             status_code=status.HTTP_201_CREATED)
 async def import_roles(
         roles: list[RoleCreate],
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
         roles = [Role(**role.dict()) for role in roles]
         db.add_all(roles)
-        db.commit()
+        await db.commit()
+        invalidate_permissions()
 
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -212,14 +223,14 @@ async def import_roles(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -232,32 +243,37 @@ async def import_roles(
 async def update_role(
         id: int,
         new_role: RoleUpdate,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        role = db.query(Role).filter(Role.id == id)
-        if not role.first():
+        role = (await db.execute(select(Role).where(Role.id == id))).scalars().first()
+        if not role:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
                 detail="Quyền không tồn tại"
             )
 
-        role.update(new_role.dict())
-        db.commit()
+        await db.execute(update(Role).where(Role.id == id).values(new_role.dict()))
+        await db.execute(role_version_bump(User.id.in_(select(UserRole.user_id).where(UserRole.role_id == id))))
+        await db.commit()
+        invalidate_permissions()
+        invalidate_principals()
 
-        return role.first()
+        await db.refresh(role)
+
+        return role
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -268,19 +284,22 @@ async def update_role(
             status_code=status.HTTP_200_OK)
 async def delete_role(
         id: int,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        role = db.query(Role).filter(Role.id == id)
-        if not role.first():
+        role = (await db.execute(select(Role).where(Role.id == id))).scalars().first()
+        if not role:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
                 detail="Quyền không tồn tại"
             )
-        role.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(role_version_bump(User.id.in_(select(UserRole.user_id).where(UserRole.role_id == id))))
+        await db.execute(delete(Role).where(Role.id == id))
+        await db.commit()
+        invalidate_permissions()
+        invalidate_principals()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -288,14 +307,14 @@ async def delete_role(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -306,19 +325,22 @@ async def delete_role(
             status_code=status.HTTP_200_OK)
 async def delete_roles(
         ids: list[int],
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        roles = db.query(Role).filter(Role.id.in_(ids))
-        if not roles.first():
+        roles = (await db.execute(select(Role).where(Role.id.in_(ids)))).scalars().first()
+        if not roles:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
                 detail="Quyền không tồn tại"
             )
-        roles.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(role_version_bump(User.id.in_(select(UserRole.user_id).where(UserRole.role_id.in_(ids)))))
+        await db.execute(delete(Role).where(Role.id.in_(ids)))
+        await db.commit()
+        invalidate_permissions()
+        invalidate_principals()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -326,14 +348,14 @@ async def delete_roles(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -343,13 +365,16 @@ async def delete_roles(
 @router.delete("/delete-all",
             status_code=status.HTTP_200_OK)
 async def delete_all_roles(
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        db.query(Role).delete()
-        db.commit()
+        await db.execute(role_version_bump(User.id.in_(select(UserRole.user_id))))
+        await db.execute(delete(Role))
+        await db.commit()
+        invalidate_permissions()
+        invalidate_principals()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -357,7 +382,7 @@ async def delete_all_roles(
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
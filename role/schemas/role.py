@@ -35,8 +35,10 @@ class ListRoleResponse(BaseModel):
 class RolePageableResponse(BaseModel):
     roles: list[RoleResponse]
 
-    total_pages: int
-    total_data: int
+    total_pages: Optional[int] = None
+    total_data: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
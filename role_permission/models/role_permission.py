@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, String, Integer, text
+from sqlalchemy import Column, ForeignKey, Index, String, Integer, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from configs.database import Base
@@ -6,10 +6,13 @@ from configs.database import Base
 
 class RolePermission (Base):
     __tablename__ = "role_permissions"
+    __table_args__ = (
+        Index("ix_role_permissions_role_id_permission_id", "role_id", "permission_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     role_id = Column(Integer, ForeignKey('roles.id', ondelete='CASCADE'), nullable=False)
-    permission_id = Column(Integer, ForeignKey('permissions.id', ondelete='CASCADE'), nullable=False)
+    permission_id = Column(Integer, ForeignKey('permissions.id', ondelete='CASCADE'), nullable=False, index=True)
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
 
     role = relationship("Role", back_populates="role_permissions", passive_deletes=True)
@@ -1,10 +1,14 @@
-import math
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from configs.authentication import get_current_user
-from configs.database import get_db
+from configs.database import get_db, get_read_db
+from configs.pagination import CountMode, paginate
+from configs.permissions import invalidate_permissions
 from permission.models.permission import Permission
 from role.models.role import Role
 from role_permission.models.role_permission import RolePermission
@@ -21,12 +25,12 @@ router = APIRouter(
             response_model=ListRolePermissionResponse, 
             status_code=status.HTTP_200_OK)
 async def get_role_permissions(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        role_permissions = db.query(RolePermission).all()
+        role_permissions = (await db.execute(select(RolePermission).options(selectinload(RolePermission.role), selectinload(RolePermission.permission)))).scalars().all()
 
         return ListRolePermissionResponse(
             role_permissions=role_permissions,
@@ -44,22 +48,27 @@ async def get_role_permissions(
             response_model=RolePermissionPageableResponse, 
             status_code=status.HTTP_200_OK)
 async def get_role_permission_pageable(
-        page: int, 
-        page_size: int, 
-        db: Session = Depends(get_db), 
+        page_size: int,
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
      
     try:
-        total_count = db.query(RolePermission).count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-        role_permissions = db.query(RolePermission).offset(offset).limit(page_size).all()
+        role_permissions, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db,
+            select(RolePermission).options(selectinload(RolePermission.role), selectinload(RolePermission.permission)),
+            [RolePermission.id], page_size, page, cursor, include_total, count_mode)
 
         return RolePermissionPageableResponse(
             role_permissions=role_permissions,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -74,12 +83,12 @@ async def get_role_permission_pageable(
             status_code=status.HTTP_200_OK)
 async def search_role_permission_by_id(
         role_permission_id: int,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
     
     try:
-        role_permission = db.query(RolePermission).filter(RolePermission.id == role_permission_id).first()
+        role_permission = (await db.execute(select(RolePermission).options(selectinload(RolePermission.role), selectinload(RolePermission.permission)).where(RolePermission.id == role_permission_id))).scalars().first()
         if not role_permission:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
@@ -99,17 +108,17 @@ async def search_role_permission_by_id(
             response_model=ListRolePermissionResponse)
 async def search_role_permissions_by_name(
         info: RolePermissionSearch,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        role_permissions = db.query(RolePermission)
+        role_permissions = select(RolePermission).options(selectinload(RolePermission.role), selectinload(RolePermission.permission))
         if info.role_id:
-            role_permissions = role_permissions.filter(RolePermission.role_id == info.role_id)
+            role_permissions = role_permissions.where(RolePermission.role_id == info.role_id)
         if info.permission_id:
-            role_permissions = role_permissions.filter(RolePermission.permission_id == info.permission_id)
-        role_permissions = role_permissions.all()
+            role_permissions = role_permissions.where(RolePermission.permission_id == info.permission_id)
+        role_permissions = (await db.execute(role_permissions)).scalars().all()
 
         return ListRolePermissionResponse(
             role_permissions=role_permissions,
@@ -128,29 +137,29 @@ async def search_role_permissions_by_name(
              status_code=status.HTTP_201_CREATED)
 async def create_role_permission(
         new_role_permission: RolePermissionCreate,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        permission = db.query(Permission).filter(Permission.id == new_role_permission.permission_id).first()
+        permission = (await db.execute(select(Permission).where(Permission.id == new_role_permission.permission_id))).scalars().first()
         if not permission:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail="Quyền không tồn tại"
             )
         
-        role = db.query(Role).filter(Role.id == new_role_permission.role_id).first()
+        role = (await db.execute(select(Role).where(Role.id == new_role_permission.role_id))).scalars().first()
         if not role:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail="Vai trò không tồn tại"
             )
         
-        role_permission = db.query(RolePermission).filter(
+        role_permission = (await db.execute(select(RolePermission).where(
             RolePermission.role_id == new_role_permission.role_id,
             RolePermission.permission_id == new_role_permission.permission_id
-        ).first()
+        ))).scalars().first()
 
         if role_permission:
             raise HTTPException(
@@ -160,7 +169,8 @@ async def create_role_permission(
 
         role_permission = RolePermission(**new_role_permission.dict())
         db.add(role_permission)
-        db.commit()    
+        await db.commit()    
+        invalidate_permissions()
 
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -168,14 +178,14 @@ async def create_role_permission(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -187,26 +197,29 @@ async def create_role_permission(
             status_code=status.HTTP_201_CREATED)
 async def import_role_permissions(
         role_permissions: list[RolePermissionCreate],
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
         role_permissions = [RolePermission(**role_permission.dict()) for role_permission in role_permissions]
         db.add_all(role_permissions)
-        db.commit()
+        await db.commit()
+        invalidate_permissions()
+        for role_permission in role_permissions:
+            await db.refresh(role_permission, ["role", "permission"])
 
         return role_permissions
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -219,32 +232,34 @@ async def import_role_permissions(
 async def update_role_permission(
         role_permission_id: int,
         new_role_permission: RolePermissionUpdate,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        role_permission = db.query(RolePermission).filter(RolePermission.id == role_permission_id)
-        if not role_permission.first():
+        role_permission = (await db.execute(select(RolePermission).where(RolePermission.id == role_permission_id))).scalars().first()
+        if not role_permission:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
                 detail="Quyền không tồn tại"
             )
 
-        role_permission.update(new_role_permission.dict())
-        db.commit()
+        await db.execute(update(RolePermission).where(RolePermission.id == role_permission_id).values(new_role_permission.dict()))
+        await db.commit()
+        invalidate_permissions()
+        await db.refresh(role_permission, ["role", "permission"])
 
-        return role_permission.first()
+        return role_permission
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -255,19 +270,20 @@ async def update_role_permission(
             status_code=status.HTTP_200_OK)
 async def delete_role_permission(
         role_permission_id: int,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        role_permission = db.query(RolePermission).filter(RolePermission.id == role_permission_id)
-        if not role_permission.first():
+        role_permission = (await db.execute(select(RolePermission).where(RolePermission.id == role_permission_id))).scalars().first()
+        if not role_permission:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
                 detail="Quyền không tồn tại"
             )
-        role_permission.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(RolePermission).where(RolePermission.id == role_permission_id))
+        await db.commit()
+        invalidate_permissions()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -275,14 +291,14 @@ async def delete_role_permission(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -293,19 +309,20 @@ async def delete_role_permission(
                status_code=status.HTTP_200_OK)
 async def delete_role_permissions(
         ids: list[int],
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        role_permissions = db.query(RolePermission).filter(RolePermission.id.in_(ids))
-        if not role_permissions.first():
+        role_permissions = (await db.execute(select(RolePermission).where(RolePermission.id.in_(ids)))).scalars().first()
+        if not role_permissions:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
                 detail="Quyền không tồn tại"
             )
-        role_permissions.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(RolePermission).where(RolePermission.id.in_(ids)))
+        await db.commit()
+        invalidate_permissions()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -313,14 +330,14 @@ async def delete_role_permissions(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -330,13 +347,14 @@ async def delete_role_permissions(
 @router.delete("/delete-all",
                status_code=status.HTTP_200_OK)
 async def delete_all_role_permissions(
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        db.query(RolePermission).delete()
-        db.commit()
+        await db.execute(delete(RolePermission))
+        await db.commit()
+        invalidate_permissions()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -344,14 +362,14 @@ async def delete_all_role_permissions(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -47,8 +47,10 @@ class ListRolePermissionResponse(BaseModel):
 class RolePermissionPageableResponse(BaseModel):
     role_permissions: list[RolePermissionResponse]
 
-    total_pages: int
-    total_data: int
+    total_pages: Optional[int] = None
+    total_data: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -1,17 +1,16 @@
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
-from sqlalchemy import func, extract
-from sqlalchemy.orm import Session
+from sqlalchemy import extract, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from book_copy.models.book_copy import BookCopy
-from configs.authentication import get_current_user
-from configs.database import get_db
+from authen.schemas.authen import Principal
+from configs.permissions import require_permission
+from configs.database import get_read_db
 from book.models.book import Book
-from role.models.role import Role
 from user.models.user import User
 from borrow.models.borrow import Borrow
 from stats.schemas.stats import *
-from user_role.models.user_role import UserRole
 from category.models.category import Category
 
 router = APIRouter(
@@ -20,28 +19,16 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=StatsResponse)
-def get_library_stats(
-        db: Session = Depends(get_db), 
-        current_user: User = Depends(get_current_user)
+async def get_library_stats(
+        db: AsyncSession = Depends(get_read_db), 
+        current_user: Principal = Depends(require_permission("stats.read"))
     ):
         
     try:
-        is_admin = db.query(User)\
-            .join(UserRole)\
-            .join(Role)\
-            .filter(User.id == current_user.id, 
-                    Role.name == "admin").first()
-        
-        if not is_admin:
-            return JSONResponse(
-                content={"error": "You are not authorized to access this resource."}, 
-                status_code=status.HTTP_403_FORBIDDEN
-            )
-
-        total_books = db.query(BookCopy).count()
-        total_borrowings = db.query(Borrow).count()
-        borrowed_books = db.query(Borrow).filter(Borrow.status.in_(["Quá hạn", "Đang mượn"])).count()
-        active_users = db.query(User).count()
+        total_books = await db.scalar(select(func.count()).select_from(BookCopy))
+        total_borrowings = await db.scalar(select(func.count()).select_from(Borrow))
+        borrowed_books = await db.scalar(select(func.count()).select_from(Borrow).where(Borrow.status.in_(["Quá hạn", "Đang mượn"])))
+        active_users = await db.scalar(select(func.count()).select_from(User))
 
         return {
             "total_books": total_books,
@@ -59,31 +46,21 @@ def get_library_stats(
 
 @router.get("/monthly", 
             response_model=MonthlyBorrowsResponse)
-def get_monthly_borrowing_stats(
-        db: Session = Depends(get_db), 
-        current_user: User = Depends(get_current_user)
+async def get_monthly_borrowing_stats(
+        db: AsyncSession = Depends(get_read_db), 
+        current_user: Principal = Depends(require_permission("stats.read"))
     ):
 
     try:
-        is_admin = db.query(User)\
-            .join(UserRole)\
-            .join(Role)\
-            .filter(User.id == current_user.id, 
-                    Role.name == "admin").first()
-        
-        if not is_admin:
-            return {"error": "You are not authorized to access this resource."}
-
         today = datetime.today()
         last_6_months = today - timedelta(days=180)
 
-        results = (
-            db.query(func.date_trunc('month', Borrow.created_at), func.count())
-            .filter(Borrow.created_at >= last_6_months)
-            .group_by(func.date_trunc('month', Borrow.created_at))
-            .order_by(func.date_trunc('month', Borrow.created_at))
-            .all()
-        )
+        results = (await db.execute(
+            select(func.date_trunc(literal_column("'month'"), Borrow.created_at), func.count())
+            .where(Borrow.created_at >= last_6_months)
+            .group_by(func.date_trunc(literal_column("'month'"), Borrow.created_at))
+            .order_by(func.date_trunc(literal_column("'month'"), Borrow.created_at))
+        )).all()
 
         return JSONResponse(
             content={
@@ -100,29 +77,19 @@ def get_monthly_borrowing_stats(
 
 
 @router.get("/top-books", response_model=TopBooksResponse)
-def get_top_borrowed_books(
-        db: Session = Depends(get_db), 
-        current_user: User = Depends(get_current_user)
+async def get_top_borrowed_books(
+        db: AsyncSession = Depends(get_read_db), 
+        current_user: Principal = Depends(require_permission("stats.read"))
     ):
     try:
-        is_admin = db.query(User)\
-            .join(UserRole)\
-            .join(Role)\
-            .filter(User.id == current_user.id, 
-                    Role.name == "admin").first()
-        
-        if not is_admin:
-            return {"error": "You are not authorized to access this resource."}
-        
-        results = (
-            db.query(Book.name, func.count(Borrow.id))
+        results = (await db.execute(
+            select(Book.name, func.count(Borrow.id))
             .join(BookCopy, BookCopy.book_id == Book.id)
             .join(Borrow, Borrow.book_copy_id == BookCopy.id)  # Fixed join condition
             .group_by(Book.id)
             .order_by(func.count(Borrow.id).desc())
             .limit(10)
-            .all()
-        )
+        )).all()
 
         return JSONResponse(
             content={
@@ -138,30 +105,17 @@ def get_top_borrowed_books(
         )
 
 @router.get("/books/by-category", response_model=CategoryStatsResponse)
-def get_books_by_category(
-        db: Session = Depends(get_db), 
-        current_user: User = Depends(get_current_user)
+async def get_books_by_category(
+        db: AsyncSession = Depends(get_read_db), 
+        current_user: Principal = Depends(require_permission("stats.read"))
     ):
     try:
-        is_admin = db.query(User)\
-            .join(UserRole)\
-            .join(Role)\
-            .filter(User.id == current_user.id, 
-                    Role.name == "admin").first()
-        
-        if not is_admin:
-            return JSONResponse(
-                content={"error": "You are not authorized to access this resource."},
-                status_code=status.HTTP_403_FORBIDDEN
-            )
-        
-        results = (
-            db.query(Category.name, func.count(Book.id))
+        results = (await db.execute(
+            select(Category.name, func.count(Book.id))
             .join(Book, Book.category_id == Category.id)
             .group_by(Category.name)
             .order_by(func.count(Book.id).desc())
-            .all()
-        )
+        )).all()
 
         return JSONResponse(
             content={
@@ -178,32 +132,19 @@ def get_books_by_category(
 
 
 @router.get("/books/status", response_model=BookStatusResponse)
-def get_books_by_status(
-        db: Session = Depends(get_db), 
-        current_user: User = Depends(get_current_user)
+async def get_books_by_status(
+        db: AsyncSession = Depends(get_read_db), 
+        current_user: Principal = Depends(require_permission("stats.read"))
     ):
     try:
-        is_admin = db.query(User)\
-            .join(UserRole)\
-            .join(Role)\
-            .filter(User.id == current_user.id, 
-                    Role.name == "admin").first()
-        
-        if not is_admin:
-            return JSONResponse(
-                content={"error": "You are not authorized to access this resource."},
-                status_code=status.HTTP_403_FORBIDDEN
-            )
-        
-        total_books = db.query(func.count(BookCopy.id)).scalar()
+        total_books = await db.scalar(select(func.count(BookCopy.id)))
         
-        borrowed_counts = (
-            db.query(Borrow.status, func.count(BookCopy.id))
+        borrowed_counts = (await db.execute(
+            select(Borrow.status, func.count(BookCopy.id))
             .join(BookCopy, BookCopy.id == Borrow.book_copy_id)
-            .filter(Borrow.status.in_(["Đang mượn", "Quá hạn"]))
+            .where(Borrow.status.in_(["Đang mượn", "Quá hạn"]))
             .group_by(Borrow.status)
-            .all()
-        )
+        )).all()
         
         borrowed_total = sum(count for _, count in borrowed_counts)
         available_books = total_books - borrowed_total
@@ -225,51 +166,37 @@ def get_books_by_status(
         )
 
 @router.get("/borrowing/monthly", response_model=MonthlyTrendsResponse)
-def get_monthly_borrowing_trends(
-        db: Session = Depends(get_db), 
-        current_user: User = Depends(get_current_user)
+async def get_monthly_borrowing_trends(
+        db: AsyncSession = Depends(get_read_db), 
+        current_user: Principal = Depends(require_permission("stats.read"))
     ):
     try:
-        is_admin = db.query(User)\
-            .join(UserRole)\
-            .join(Role)\
-            .filter(User.id == current_user.id, 
-                    Role.name == "admin").first()
-        
-        if not is_admin:
-            return JSONResponse(
-                content={"error": "You are not authorized to access this resource."},
-                status_code=status.HTTP_403_FORBIDDEN
-            )
-        
         # Get last 5 months
         today = datetime.today()
         last_5_months = today - timedelta(days=150)
         
         # Query for borrowed books by month
-        borrowed_by_month = (
-            db.query(
-                func.to_char(Borrow.created_at, 'MM/YYYY').label('month'),
+        borrowed_by_month = (await db.execute(
+            select(
+                func.to_char(Borrow.created_at, literal_column("'MM/YYYY'")).label('month'),
                 func.count().label('count')
             )
-            .filter(Borrow.created_at >= last_5_months)
-            .group_by(func.to_char(Borrow.created_at, 'MM/YYYY'))
-            .all()
-        )
+            .where(Borrow.created_at >= last_5_months)
+            .group_by(func.to_char(Borrow.created_at, literal_column("'MM/YYYY'")))
+        )).all()
         
         # Query for returned books by month
-        returned_by_month = (
-            db.query(
-                func.to_char(Borrow.return_date, 'MM/YYYY').label('month'),
+        returned_by_month = (await db.execute(
+            select(
+                func.to_char(Borrow.return_date, literal_column("'MM/YYYY'")).label('month'),
                 func.count().label('count')
             )
-            .filter(
+            .where(
                 Borrow.return_date.isnot(None),
                 Borrow.return_date >= last_5_months
             )
-            .group_by(func.to_char(Borrow.return_date, 'MM/YYYY'))
-            .all()
-        )
+            .group_by(func.to_char(Borrow.return_date, literal_column("'MM/YYYY'")))
+        )).all()
         
         # Create month-based dictionary for easier data manipulation
         borrowed_dict = {month: count for month, count in borrowed_by_month}
@@ -300,33 +227,20 @@ def get_monthly_borrowing_trends(
         )
 
 @router.get("/borrowing/by-day", response_model=BorrowingByDayResponse)
-def get_borrowing_by_day(
-        db: Session = Depends(get_db), 
-        current_user: User = Depends(get_current_user)
+async def get_borrowing_by_day(
+        db: AsyncSession = Depends(get_read_db), 
+        current_user: Principal = Depends(require_permission("stats.read"))
     ):
     try:
-        is_admin = db.query(User)\
-            .join(UserRole)\
-            .join(Role)\
-            .filter(User.id == current_user.id, 
-                    Role.name == "admin").first()
-        
-        if not is_admin:
-            return JSONResponse(
-                content={"error": "You are not authorized to access this resource."},
-                status_code=status.HTTP_403_FORBIDDEN
-            )
-        
         # Query borrowings grouped by day of week (1-7, where 1 is Monday)
-        results = (
-            db.query(
+        results = (await db.execute(
+            select(
                 extract('dow', Borrow.created_at).label('dow'),
                 func.count().label('count')
             )
             .group_by('dow')
             .order_by('dow')
-            .all()
-        )
+        )).all()
         
         # Map day of week number to Vietnamese day names
         day_names = {
@@ -362,50 +276,35 @@ def get_borrowing_by_day(
         )
 
 @router.get("/borrowing/status", response_model=ReturnStatusResponse)
-def get_return_status(
-        db: Session = Depends(get_db), 
-        current_user: User = Depends(get_current_user)
+async def get_return_status(
+        db: AsyncSession = Depends(get_read_db), 
+        current_user: Principal = Depends(require_permission("stats.read"))
     ):
     try:
-        is_admin = db.query(User)\
-            .join(UserRole)\
-            .join(Role)\
-            .filter(User.id == current_user.id, 
-                    Role.name == "admin").first()
-        
-        if not is_admin:
-            return JSONResponse(
-                content={"error": "You are not authorized to access this resource."},
-                status_code=status.HTTP_403_FORBIDDEN
-            )
-        
         # Count on-time returns
         on_time_returns = (
-            db.query(func.count())
-            .filter(
+            await db.scalar(select(func.count()).select_from(Borrow)
+            .where(
                 Borrow.return_date <= Borrow.due_date,
                 Borrow.return_date.isnot(None)
-            )
-            .scalar() or 0
+            )) or 0
         )
         
         # Count late returns
         late_returns = (
-            db.query(func.count())
-            .filter(
+            await db.scalar(select(func.count()).select_from(Borrow)
+            .where(
                 Borrow.return_date > Borrow.due_date
-            )
-            .scalar() or 0
+            )) or 0
         )
         
         # Count not returned yet
         not_returned = (
-            db.query(func.count())
-            .filter(
+            await db.scalar(select(func.count()).select_from(Borrow)
+            .where(
                 Borrow.return_date.is_(None),
                 Borrow.status.in_(["Đang mượn", "Quá hạn"])
-            )
-            .scalar() or 0
+            )) or 0
         )
         
         result = [
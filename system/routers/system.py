@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, status
+from authen.schemas.authen import Principal
+from configs.api_keys import api_key_cache
+from configs.authentication import password_executor, principal_cache, verified_tokens
+from configs.database import ENGINES
+from configs.exports import export_cache
+from configs.pagination import count_cache
+from configs.permissions import require_permission
+from configs.pool import pool_status
+from configs.snapshots import name_snapshot_cache
+from system.schemas.system import *
+
+
+router = APIRouter(
+    prefix="/system",
+    tags=["System"],
+)
+
+
+@router.get("/db-pool",
+            response_model=DbPoolResponse,
+            status_code=status.HTTP_200_OK)
+async def get_db_pool_status(
+        current_user: Principal = Depends(require_permission("system.read"))
+    ):
+
+    return DbPoolResponse(
+        pools={name: pool_status(engine.pool) for name, engine in ENGINES.items()}
+    )
+
+
+@router.get("/caches",
+            response_model=CacheStatsResponse,
+            status_code=status.HTTP_200_OK)
+async def get_cache_stats(
+        current_user: Principal = Depends(require_permission("system.read"))
+    ):
+
+    return CacheStatsResponse(
+        caches={
+            "principal": principal_cache.stats(),
+            "verified_token": verified_tokens.stats(),
+            "api_key": api_key_cache.stats(),
+            "count": count_cache.stats(),
+            "name_snapshot": name_snapshot_cache.stats(),
+            "export": export_cache.stats()
+        }
+    )
+
+
+@router.get("/workers",
+            response_model=WorkerPoolResponse,
+            status_code=status.HTTP_200_OK)
+async def get_worker_stats(
+        current_user: Principal = Depends(require_permission("system.read"))
+    ):
+
+    return WorkerPoolResponse(
+        pools={password_executor.name: password_executor.stats()}
+    )
@@ -0,0 +1,53 @@
+from pydantic import BaseModel
+from typing import Dict, Optional
+
+
+class PoolWaitStats(BaseModel):
+    count: int
+    timeouts: int
+    avg_ms: float
+    max_ms: float
+    histogram: Dict[str, int]
+
+
+class PoolStatus(BaseModel):
+    pool_size: int
+    max_overflow: int
+    checked_out: int
+    idle: int
+    overflow: int
+    available: Optional[int] = None
+    wait: Optional[PoolWaitStats] = None
+
+
+class DbPoolResponse(BaseModel):
+    pools: Dict[str, PoolStatus]
+
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+
+
+class CacheStatsResponse(BaseModel):
+    caches: Dict[str, CacheStats]
+
+
+class WorkerPoolStats(BaseModel):
+    workers: int
+    max_queue: int
+    in_flight: int
+    queued: int
+    max_in_flight: int
+    submitted: int
+    completed: int
+    rejected: int
+    avg_wait_ms: float
+    avg_run_ms: float
+
+
+class WorkerPoolResponse(BaseModel):
+    pools: Dict[str, WorkerPoolStats]
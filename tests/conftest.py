@@ -0,0 +1,96 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from configs.conf import settings
+
+
+# The suite runs against its own database on the configured server, recreated for every run, with
+# strict mode on: lazy loads raise and requests over their route's query budget fail with 500.
+# Both must be set before configs.database creates its engines.
+settings.database_name = f"{settings.database_name}_test"
+settings.sql_strict_mode = True
+
+from configs.database import SQLALCHEMY_DATABASE_URL, SessionLocal, async_engine, engine  # noqa: E402
+
+
+ADMIN = {"username": "admin", "password": "Password1", "full_name": "Nguyễn Văn Quản"}
+READER = {"username": "reader", "password": "Password1", "full_name": "Trần Thị Bích"}
+
+
+@pytest.fixture(scope="session")
+def database():
+    server = create_engine(make_url(SQLALCHEMY_DATABASE_URL).set(database="postgres"), isolation_level="AUTOCOMMIT")
+    with server.connect() as conn:
+        conn.execute(text(f'DROP DATABASE IF EXISTS "{settings.database_name}" WITH (FORCE)'))
+        conn.execute(text(f'CREATE DATABASE "{settings.database_name}"'))
+
+    yield
+
+    engine.dispose()
+    with server.connect() as conn:
+        conn.execute(text(f'DROP DATABASE IF EXISTS "{settings.database_name}" WITH (FORCE)'))
+    server.dispose()
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    # Importing the app creates the schema.
+    import main
+
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO roles(name, detail) VALUES ('admin', 'Quản trị viên'), ('user', 'Người dùng')"))
+
+    with TestClient(main.app) as client:
+        for user in (ADMIN, READER):
+            post(client, "/user/register", user)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO user_roles(user_id, role_id) SELECT users.id, roles.id FROM users, roles "
+                "WHERE users.username = :username AND roles.name = 'admin'"
+            ), {"username": ADMIN["username"]})
+
+        response = client.post("/login", data={"username": ADMIN["username"], "password": ADMIN["password"]})
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        seed_catalogue(client)
+
+        yield client
+
+    async_engine.sync_engine.dispose()
+
+
+def seed_catalogue(client: TestClient):
+    # Enough rows that every listing spans more than one small page, so a per-row query shows in the counts.
+    for index in range(3):
+        post(client, "/author/create", {
+            "name": f"Tác giả {index}", "birthdate": None, "address": "Hà Nội", "pen_name": f"Bút danh {index}", "biography": None
+        })
+        post(client, "/category/create", {"name": f"Thể loại {index}", "age_limit": None, "description": "Văn học"})
+        post(client, "/publisher/create", {
+            "name": f"Nhà xuất bản {index}", "phone_number": f"090000000{index}", "address": "Hà Nội", "email": f"nxb{index}@example.com"
+        })
+        post(client, "/bookshelf/create", {"name": f"Kệ {index}", "status": None})
+
+    for index in range(12):
+        related = index % 3 + 1
+        post(client, "/book/create", {
+            "name": f"Sách {index}", "summary": "Truyện ngắn",
+            "author_id": related, "category_id": related, "publisher_id": related
+        })
+        for _ in range(2):
+            post(client, "/book-copy/create", {"status": "Có sẵn", "book_id": index + 1, "bookshelf_id": related})
+
+    for book_id in range(1, 7):
+        post(client, "/borrow/create", {"book_id": book_id, "duration": 7})
+
+
+def post(client: TestClient, url: str, body: dict):
+    response = client.post(url, json=body)
+    assert response.status_code in (200, 201), f"{url}: {response.status_code} {response.text}"
+    return response
+
+
+@pytest.fixture
+def db(client):
+    with SessionLocal() as db:
+        yield db
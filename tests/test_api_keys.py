@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import text
+from configs.api_keys import API_KEY_HEADER
+from configs.database import engine
+from .conftest import READER, post
+
+
+def permission_id(client, name: str) -> int:
+    with engine.connect() as conn:
+        found = conn.execute(text("SELECT id FROM permissions WHERE name = :name"), {"name": name}).scalar()
+    if found is None:
+        post(client, "/permission/create", {"name": name, "detail": name})
+        return permission_id(client, name)
+    return found
+
+
+def api_key(client, *permissions: str, user_id=None) -> dict:
+    response = post(client, "/api-key/create", {
+        "name": f"kiosk {' '.join(permissions) or 'unscoped'}",
+        "user_id": user_id,
+        "permission_ids": [permission_id(client, name) for name in permissions]
+    })
+    # The key is the only credential sent: the client's admin token is blanked.
+    return {API_KEY_HEADER: response.json()["key"], "Authorization": ""}
+
+
+def scalar(sql: str, **params):
+    with engine.connect() as conn:
+        return conn.execute(text(sql), params).scalar()
+
+
+def available_book(client) -> int:
+    return scalar("SELECT max(book_id) FROM book_copies WHERE status = 'Có sẵn'")
+
+
+def test_scoped_key_can_borrow(client):
+    headers = api_key(client, "borrow.create", "borrow.read")
+    response = client.post("/borrow/create", json={"book_id": available_book(client), "duration": 7}, headers=headers)
+    assert response.status_code == 201, response.text
+    assert client.get("/borrow/1", headers=headers).status_code == 200
+
+
+@pytest.mark.parametrize("permissions", [(), ("stats.read",), ("borrow.read",)])
+def test_key_without_scope_cannot_borrow(client, permissions):
+    headers = api_key(client, *permissions)
+    response = client.post("/borrow/create", json={"book_id": available_book(client), "duration": 7}, headers=headers)
+    assert response.status_code == 403
+
+
+def test_scoped_key_is_rejected_on_user_only_routes(client):
+    headers = api_key(client, "borrow.create", "borrow.read")
+    assert client.get("/borrow/export", headers=headers).status_code == 403
+    assert client.get("/role/all", headers=headers).status_code == 403
+
+
+def test_key_cannot_exceed_its_owner(client):
+    reader = scalar("SELECT id FROM users WHERE username = :username", username=READER["username"])
+    body = {"name": "kiosk", "user_id": reader, "permission_ids": [permission_id(client, "borrow.approve")]}
+    assert client.post("/api-key/create", json=body).status_code == 400
+
+    key = post(client, "/api-key/create", {"name": "kiosk", "user_id": reader}).json()
+    response = client.put(f"/api-key/update/{key['id']}", json={"permission_ids": body["permission_ids"]})
+    assert response.status_code == 400
+
+
+def test_key_narrows_with_its_owner_roles(client):
+    reader = scalar("SELECT id FROM users WHERE username = :username", username=READER["username"])
+    post(client, "/role/create", {"name": "kiosk", "detail": "Máy mượn sách"})
+    role = scalar("SELECT id FROM roles WHERE name = 'kiosk'")
+    post(client, "/role-permission/create", {"role_id": role, "permission_id": permission_id(client, "borrow.create")})
+    post(client, "/user-role/create", {"user_id": reader, "role_id": role})
+
+    headers = api_key(client, "borrow.create", user_id=reader)
+    response = client.post("/borrow/create", json={"book_id": available_book(client), "duration": 7}, headers=headers)
+    assert response.status_code == 201, response.text
+
+    user_role = scalar("SELECT id FROM user_roles WHERE user_id = :user_id AND role_id = :role_id", user_id=reader, role_id=role)
+    assert client.delete(f"/user-role/delete/{user_role}").status_code == 200
+    response = client.post("/borrow/create", json={"book_id": available_book(client), "duration": 7}, headers=headers)
+    assert response.status_code == 403
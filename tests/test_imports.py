@@ -0,0 +1,37 @@
+from datetime import date
+from io import BytesIO
+import pandas as pd
+import pytest
+from configs.conf import settings
+from .test_api_keys import scalar
+
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def upload(client, url: str, rows: list):
+    content = BytesIO()
+    pd.DataFrame(rows).to_excel(content, index=False)
+    return client.post(url, files={"file": ("import.xlsx", content.getvalue(), XLSX)})
+
+
+@pytest.fixture
+def one_row_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "import_chunk_size", 1)
+
+
+def test_rejected_chunk_does_not_reserve_usernames(client, one_row_chunks):
+    row = {"Tên người dùng": "nhap_lai", "Họ và Tên": "Lê Văn Nhập", "Email": "nhap_lai@example.com",
+           "Số điện thoại": "0912345678", "Ngày sinh": date(2000, 1, 1), "Địa chỉ": "Hà Nội"}
+    response = upload(client, "/user/import", [{**row, "Số điện thoại": "không có"}, row])
+
+    assert response.status_code == 207, response.text
+    assert [error["row"] for error in response.json()["errors"]] == [2]
+    assert scalar("SELECT count(*) FROM users WHERE username = 'nhap_lai'") == 1
+
+
+def test_rejected_chunk_does_not_reserve_category_names(client, one_row_chunks):
+    row = {"Tên thể loại sách": "Nhập lại", "Giới hạn tuổi": 12, "Mô tả": "Thể loại nhập lại"}
+    response = upload(client, "/category/import", [{**row, "Giới hạn tuổi": "mười hai"}, row])
+
+    assert response.status_code == 207, response.text
+    assert scalar("SELECT count(*) FROM categories WHERE name = 'Nhập lại'") == 1
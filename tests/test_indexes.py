@@ -0,0 +1,58 @@
+import re
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+from author.models.author import Author
+from book.models.book import Book
+from book_copy.models.book_copy import BookCopy
+from bookshelf.models.bookshelf import Bookshelf
+from borrow.models.borrow import Borrow
+from category.models.category import Category
+from configs.search import pg_trgm_available
+from publisher.models.publisher import Publisher
+from role_permission.models.role_permission import RolePermission
+from user.models.user import User
+from user_role.models.user_role import UserRole
+
+
+# (query, index): the hot filters and joins of the borrow, stats and authentication routers.
+HOT_QUERIES = [
+    (select(BookCopy.id).where(BookCopy.book_id == 1, BookCopy.status == "Có sẵn"), "ix_book_copies_available_book_id"),
+    (select(Borrow.id).where(Borrow.user_id == 2, Borrow.status == "Đang mượn"), "ix_borrows_user_id_status"),
+    (select(Borrow.id).where(Borrow.status == "Đã trả", Borrow.created_at >= "2026-01-01"), "ix_borrows_status_created_at"),
+    (select(Borrow.id).where(Borrow.book_copy_id == 1), "ix_borrows_book_copy_id"),
+    (select(Book.id).where(Book.author_id == 1), "ix_books_author_id"),
+    (select(Book.id).where(Book.category_id == 1), "ix_books_category_id"),
+    (select(Book.id).where(Book.publisher_id == 1), "ix_books_publisher_id"),
+    (select(UserRole.role_id).where(UserRole.user_id == 1), "ix_user_roles_user_id_role_id"),
+    (select(RolePermission.permission_id).where(RolePermission.role_id == 1), "ix_role_permissions_role_id_permission_id"),
+]
+
+TRIGRAM_INDEXES = [
+    index
+    for model in (Author, Book, Bookshelf, Category, Publisher, User)
+    for index in model.__table__.indexes
+    if index.name.endswith("_trgm")
+]
+
+
+def plan(db, query) -> str:
+    # The seeded tables are small enough that Postgres would rather read them whole; with sequential
+    # scans off, the plan shows which index serves the query.
+    db.execute(text("SET LOCAL enable_seqscan = off"))
+    sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    return "\n".join(db.execute(text(f"EXPLAIN {sql}")).scalars())
+
+
+@pytest.mark.parametrize("query, index", HOT_QUERIES, ids=[index for _, index in HOT_QUERIES])
+def test_hot_query_uses_index(db, query, index):
+    assert re.search(rf"(using|on) {index} ", plan(db, query))
+
+
+@pytest.mark.parametrize("index", TRIGRAM_INDEXES, ids=[index.name for index in TRIGRAM_INDEXES])
+def test_substring_search_uses_trigram_index(db, index):
+    if not pg_trgm_available(db.connection()):
+        pytest.skip("pg_trgm is not available on this server")
+
+    column = index.expressions[0]
+    assert f"Bitmap Index Scan on {index.name}" in plan(db, select(column.table.c.id).where(column.ilike("%sách%")))
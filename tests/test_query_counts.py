@@ -0,0 +1,50 @@
+import pytest
+from configs.exports import export_cache
+from configs.pagination import count_cache
+from configs.query_budget import QUERY_COUNT_HEADER
+
+
+# (method, url, body, statements): each listing is pinned to a constant number of statements whatever the
+# page holds, so a query per row (an N+1) changes the count, and a lazy load fails outright in strict mode.
+ENDPOINTS = [
+    ("GET", "/book/all", None, 1),
+    ("GET", "/book/pageable?page_size=50", None, 2),
+    ("GET", "/book/pageable?page_size=50&include_total=false", None, 1),
+    ("POST", "/book/search?page_size=50", {"name": "Sách"}, 2),
+    ("GET", "/book/fulltext?q=Sách", None, 2),
+    ("GET", "/book/export", None, 1),
+    ("GET", "/book/1", None, 1),
+    ("GET", "/book-copy/pageable?page_size=50", None, 2),
+    ("POST", "/book-copy/search?page_size=50", {"status": "Có sẵn"}, 2),
+    ("GET", "/book-copy/1", None, 1),
+    ("GET", "/borrow/all", None, 1),
+    ("GET", "/borrow/pageable?page_size=50", None, 2),
+    ("POST", "/borrow/search?page_size=50", {}, 2),
+    ("GET", "/borrow/1", None, 1),
+    ("GET", "/user/all", None, 1),
+    ("GET", "/user/pageable?page_size=50", None, 2),
+    ("POST", "/user/search?page_size=50", {"full_name": "Trần"}, 2),
+    ("GET", "/user/1", None, 1),
+]
+
+
+def statements(client, method: str, url: str, body=None) -> int:
+    # The first request fills the principal and permission caches, so the second one counts only the
+    # statements of the route itself; cached totals and exports are dropped so they are counted too.
+    client.request(method, url, json=body)
+    count_cache.clear()
+    export_cache.clear()
+
+    response = client.request(method, url, json=body)
+    assert response.status_code == 200, response.text
+    return int(response.headers[QUERY_COUNT_HEADER])
+
+
+@pytest.mark.parametrize("method, url, body, expected", ENDPOINTS, ids=[f"{method} {url}" for method, url, _, _ in ENDPOINTS])
+def test_statement_count(client, method, url, body, expected):
+    assert statements(client, method, url, body) == expected
+
+
+@pytest.mark.parametrize("url", ["/book/pageable", "/book-copy/pageable", "/borrow/pageable", "/user/pageable"])
+def test_statement_count_does_not_grow_with_page_size(client, url):
+    assert statements(client, "GET", f"{url}?page_size=1") == statements(client, "GET", f"{url}?page_size=50")
@@ -0,0 +1,49 @@
+import logging
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import joinedload
+from book.models.book import Book
+from book_copy.models.book_copy import BookCopy
+from borrow.models.borrow import Borrow
+from configs.conf import settings
+from configs.query_budget import QUERY_COUNT_HEADER
+from user.models.user import User
+
+
+RELATIONSHIPS = [Book.author, Book.publisher, Book.category, BookCopy.book, Borrow.user, User.auth_credential]
+
+
+@pytest.mark.parametrize("relationship", RELATIONSHIPS, ids=str)
+def test_lazy_load_raises(db, relationship):
+    entity = db.scalars(select(relationship.class_).limit(1)).one()
+    with pytest.raises(InvalidRequestError):
+        getattr(entity, relationship.key)
+
+
+@pytest.mark.parametrize("relationship", RELATIONSHIPS, ids=str)
+def test_eager_load_does_not_raise(db, relationship):
+    entity = db.scalars(select(relationship.class_).options(joinedload(relationship)).limit(1)).unique().one()
+    getattr(entity, relationship.key)
+
+
+def test_lazy_load_outside_strict_mode(db, monkeypatch):
+    monkeypatch.setattr(settings, "sql_strict_mode", False)
+    book = db.scalars(select(Book).where(Book.author_id.is_not(None)).limit(1)).one()
+    assert book.author is not None
+
+
+def test_over_budget_request_fails(client, monkeypatch):
+    monkeypatch.setattr(settings, "sql_query_budget", 0)
+    response = client.get("/category/all")
+    assert response.status_code == 500
+    assert int(response.headers[QUERY_COUNT_HEADER]) > 0
+
+
+def test_over_budget_request_is_logged_outside_strict_mode(client, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "sql_query_budget", 0)
+    monkeypatch.setattr(settings, "sql_strict_mode", False)
+    with caplog.at_level(logging.WARNING, logger="configs.query_budget"):
+        response = client.get("/category/all")
+    assert response.status_code == 200
+    assert "GET /category/all ran" in caplog.text
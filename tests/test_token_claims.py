@@ -0,0 +1,64 @@
+import pytest
+from jose import jwt
+from sqlalchemy import text
+from configs.authentication import ALGORITHM, SECRET_KEY, role_versions
+from configs.conf import settings
+from configs.database import engine
+from .conftest import READER, post
+from .test_api_keys import permission_id, scalar
+
+
+@pytest.fixture(scope="module")
+def statistician(client):
+    # The reader, granted stats.read through a role of their own.
+    post(client, "/role/create", {"name": "thong_ke", "detail": "Thống kê"})
+    role = scalar("SELECT id FROM roles WHERE name = 'thong_ke'")
+    post(client, "/role-permission/create", {"role_id": role, "permission_id": permission_id(client, "stats.read")})
+    reader = scalar("SELECT id FROM users WHERE username = :username", username=READER["username"])
+    post(client, "/user-role/create", {"user_id": reader, "role_id": role})
+
+    yield reader, role
+
+    client.delete(f"/role/delete/{role}")
+
+
+def old_token(client) -> dict:
+    # The reader's access token, re-signed as if issued longer ago than a cached principal lives.
+    response = client.post("/login", data={"username": READER["username"], "password": READER["password"]})
+    claims = jwt.decode(response.json()["access_token"], SECRET_KEY, algorithms=ALGORITHM)
+    claims["iat"] -= 2 * settings.principal_cache_ttl_seconds
+    return {"Authorization": f"Bearer {jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)}"}
+
+
+def run_sql(sql: str, **params):
+    with engine.begin() as conn:
+        conn.execute(text(sql), params)
+
+
+def test_claims_are_trusted_until_roles_change(client, statistician):
+    reader, role = statistician
+    headers = old_token(client)
+    # Dropped behind the API's back: the role version is unchanged, so the token's claims still hold.
+    run_sql("DELETE FROM user_roles WHERE user_id = :user_id AND role_id = :role_id", user_id=reader, role_id=role)
+    assert client.get("/stats/", headers=headers).status_code == 200
+
+    run_sql("INSERT INTO user_roles(user_id, role_id) VALUES (:user_id, :role_id)", user_id=reader, role_id=role)
+    user_role = scalar("SELECT id FROM user_roles WHERE user_id = :user_id AND role_id = :role_id", user_id=reader, role_id=role)
+    assert client.delete(f"/user-role/delete/{user_role}").status_code == 200
+    assert client.get("/stats/", headers=headers).status_code == 403
+
+    post(client, "/user-role/create", {"user_id": reader, "role_id": role})
+
+
+def test_role_change_in_another_worker_is_seen_after_the_cache_ttl(client, statistician):
+    reader, role = statistician
+    headers = old_token(client)
+    assert client.get("/stats/", headers=headers).status_code == 200
+
+    # Another worker removes the role: this process only learns of it once its cached version expires.
+    run_sql("DELETE FROM user_roles WHERE user_id = :user_id AND role_id = :role_id", user_id=reader, role_id=role)
+    run_sql("UPDATE users SET role_version = role_version + 1 WHERE id = :user_id", user_id=reader)
+    role_versions.pop(reader)
+    assert client.get("/stats/", headers=headers).status_code == 403
+
+    post(client, "/user-role/create", {"user_id": reader, "role_id": role})
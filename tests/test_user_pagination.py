@@ -0,0 +1,93 @@
+import os
+import statistics
+import time
+import pytest
+from sqlalchemy import text
+from configs.database import engine
+from configs.pagination import NEXT, count_cache, encode_cursor
+
+
+# /user/pageable against a large users table (every user with a role): roles are aggregated for the page only,
+# so the endpoint must stay far cheaper than aggregating them over the whole table, and a keyset page deep into
+# the table must cost about the same as the first page, while the OFFSET page at the same depth reads every row
+# before it.
+# BENCHMARK_USERS sets the table size (seeding 500k users takes most of the suite's run time).
+USERS = int(os.environ.get("BENCHMARK_USERS", 500_000))
+PAGE_SIZE = 20
+RUNS = 5
+
+
+@pytest.fixture(scope="module")
+def users(client):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO users(username, full_name, is_active) "
+            "SELECT 'benchmark' || i, 'Nguyễn Văn ' || (ARRAY['An', 'Bình', 'Châu', 'Dũng', 'Hà', 'Lan', 'Minh', 'Nam'])[i % 8 + 1] || ' ' || i, true "
+            "FROM generate_series(1, :users) AS i"
+        ), {"users": USERS})
+        conn.execute(text(
+            "INSERT INTO user_roles(user_id, role_id) SELECT users.id, roles.id FROM users, roles "
+            "WHERE users.username LIKE 'benchmark%' AND roles.name = 'user'"
+        ))
+        conn.execute(text("ANALYZE users; ANALYZE user_roles"))
+    # Raw inserts do not invalidate cached totals.
+    count_cache.clear()
+
+    yield USERS
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM users WHERE username LIKE 'benchmark%'"))
+    count_cache.clear()
+
+
+def timed(call):
+    durations = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = call()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), result
+
+
+def get(client, url: str):
+    response = client.get(url)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_roles_are_aggregated_for_the_page_only(client, users):
+    def aggregate_all():
+        with engine.connect() as conn:
+            return conn.execute(text(
+                "SELECT users.id, array_agg(roles.name) FROM users "
+                "LEFT JOIN user_roles ON user_roles.user_id = users.id LEFT JOIN roles ON roles.id = user_roles.role_id "
+                "GROUP BY users.id"
+            )).all()
+
+    full, _ = timed(aggregate_all)
+    first, first_page = timed(lambda: get(client, f"/user/pageable?page=1&page_size={PAGE_SIZE}"))
+    deep, deep_page = timed(lambda: get(client, f"/user/pageable?page=100&page_size={PAGE_SIZE}"))
+
+    assert first_page["total_data"] >= users
+    assert len(first_page["users"]) == len(deep_page["users"]) == PAGE_SIZE
+    assert all(user["roles"] for user in deep_page["users"])
+    assert first < full / 3, f"first page {first:.4f}s, whole-table aggregate {full:.4f}s"
+    assert deep < full / 3, f"page 100 {deep:.4f}s, whole-table aggregate {full:.4f}s"
+
+
+def test_keyset_page_does_not_slow_down_with_depth(client, users):
+    url = f"/user/pageable?page_size={PAGE_SIZE}"
+    page = users // PAGE_SIZE
+    with engine.connect() as conn:
+        before = conn.execute(text(
+            "SELECT split_part(full_name, ' ', -1), id FROM users ORDER BY 1, 2 OFFSET :offset LIMIT 1"
+        ), {"offset": (page - 1) * PAGE_SIZE - 1}).one()
+
+    first, _ = timed(lambda: get(client, url))
+    offset, offset_page = timed(lambda: get(client, f"{url}&page={page}"))
+    keyset, keyset_page = timed(lambda: get(client, f"{url}&cursor={encode_cursor(NEXT, *before)}"))
+
+    assert [user["id"] for user in keyset_page["users"]] == [user["id"] for user in offset_page["users"]]
+    assert all(user["roles"] for user in keyset_page["users"])
+    assert keyset < offset / 5, f"keyset {keyset:.4f}s, offset {offset:.4f}s"
+    assert keyset < first * 3 + 0.01, f"keyset {keyset:.4f}s, first page {first:.4f}s"
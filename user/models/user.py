@@ -1,25 +1,45 @@
-from sqlalchemy import Boolean, Column, Integer, String, text, Date, ForeignKey
+from sqlalchemy import Boolean, Column, Index, Integer, String, text, Date, ForeignKey, update
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from configs.database import Base
+from configs.search import given_name, normalized_column, trigram_index
 from borrow.models.borrow import Borrow
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        trigram_index("ix_users_username_trgm", "username"),
+        trigram_index("ix_users_full_name_normalized_trgm", "full_name_normalized"),
+        trigram_index("ix_users_phone_number_trgm", "phone_number"),
+        trigram_index("ix_users_address_trgm", "address"),
+    )
 
     id = Column(Integer, primary_key=True, nullable=False, index=True)
     username = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=True)
     full_name = Column(String, nullable=False)
+    full_name_normalized = normalized_column("full_name")
     phone_number = Column(String, nullable=True)
     birthdate = Column(Date, nullable=True)
     address = Column(String, nullable=True)
     
     is_active = Column(Boolean, default=True)
+    # Raised by role_version_bump whenever the user's roles change; access tokens carry it as pv.
+    role_version = Column(Integer, nullable=False, server_default=text("0"))
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
 
     auth_credential = relationship("AuthCredential", back_populates="user", uselist=False, passive_deletes=True)
     user_roles = relationship("UserRole", back_populates="user", passive_deletes=True)
     borrows = relationship("Borrow", back_populates="user", foreign_keys="Borrow.user_id")
-    staff_borrows = relationship("Borrow", back_populates="staff", foreign_keys="Borrow.staff_id")
\ No newline at end of file
+    staff_borrows = relationship("Borrow", back_populates="staff", foreign_keys="Borrow.staff_id")
+
+
+Index("ix_users_given_name_id", given_name(User.full_name), User.id)
+
+
+def role_version_bump(*criteria):
+    # Marks the role claims in access tokens of the matching users (every user without criteria) as stale.
+    # Run it in the transaction that changes their roles, before rows it selects by (e.g. user_roles) are deleted.
+    return update(User).where(*criteria).values(role_version=User.role_version + 1)\
+        .execution_options(synchronize_session=False)
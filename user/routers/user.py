@@ -1,19 +1,22 @@
-from io import BytesIO
-from fastapi import File, UploadFile, status, APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse, StreamingResponse
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from fastapi import File, UploadFile, Request, status, APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
+from typing import Optional
+from sqlalchemy import delete, func, literal_column, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from configs.database import get_db
-from configs.authentication import get_current_user, hash_password, validate_pwd
+from configs.database import get_db, get_read_db
+from configs.exports import ExportFormat, export_file
+from configs.imports import collect_errors, duplicated, import_excel, model_rows, to_text
+from configs.pagination import CountMode, paginate
+from configs.query_budget import query_budget
+from configs.authentication import get_current_user, hash_password, invalidate_principals, revoke_user_tokens, validate_pwd
+from configs.search import given_name, normalize_text
 from role.models.role import Role
 from user.models.user import User
 from user.schemas.user import *
 from auth_credential.models.auth_credential import AuthCredential
 from user_role.models.user_role import UserRole
 from os import getenv
-import math
-import pandas as pd
 
 
 router = APIRouter(
@@ -26,22 +29,22 @@ router = APIRouter(
             response_model=ListUserResponse,
             status_code=status.HTTP_200_OK)
 async def get_all_users(
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
     
     try:
         query = (
-            db.query(
+            select(
                 User,
-                func.coalesce(func.array_agg(Role.name).filter(Role.name != None), '{}').label("roles")
+                func.coalesce(func.array_agg(Role.name).filter(Role.name != None), literal_column("'{}'")).label("roles")
             )
             .outerjoin(UserRole, User.id == UserRole.user_id)
             .outerjoin(Role, UserRole.role_id == Role.id)
             .group_by(User.id)
-            .order_by(func.split_part(User.full_name, ' ', -1))
+            .order_by(given_name(User.full_name), User.id)
         )
-        users = query.all()
+        users = (await db.execute(query)).all()
         
         users = [
             UserResponse(
@@ -73,30 +76,32 @@ async def get_all_users(
 
 @router.get("/pageable", 
             response_model=UserPageableResponse, 
-            status_code=status.HTTP_200_OK)
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(5))])
 async def get_user_pageable(
-        page: int, 
-        page_size: int, 
-        db: Session = Depends(get_db), 
+        page_size: int,
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
      
     try:
-        total_count = db.query(User).count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-        
-        query = (
-            db.query(
-                User,
-                func.coalesce(func.array_agg(Role.name).filter(Role.name != None), '{}').label("roles")
-            )
-            .outerjoin(UserRole, User.id == UserRole.user_id)
-            .outerjoin(Role, UserRole.role_id == Role.id)
-            .group_by(User.id)
-            .order_by(func.split_part(User.full_name, ' ', -1))
-        )
-        users = query.all()
+        # Users come off ix_users_given_name_id in page order and the LATERAL aggregate runs per row,
+        # so the LIMIT stops it after the page instead of grouping the whole table.
+        roles = select(func.coalesce(func.array_agg(Role.name), literal_column("'{}'")).label("roles"))\
+            .select_from(UserRole)\
+            .join(Role, UserRole.role_id == Role.id)\
+            .where(UserRole.user_id == User.id)\
+            .lateral()
+
+        users, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db,
+            select(User, roles.c.roles).outerjoin(roles, true()),
+            [given_name(User.full_name), User.id], page_size, page, cursor, include_total, count_mode,
+            count_query=select(User))
         
         users = [
             UserResponse(
@@ -117,7 +122,9 @@ async def get_user_pageable(
         user_pageable_res = UserPageableResponse(
             users=users,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
 
         return user_pageable_res
@@ -131,12 +138,12 @@ async def get_user_pageable(
 
 @router.get("/full-name")
 async def get_user_full_name(
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
     
     try:
-        users = db.query(User).all()
+        users = (await db.execute(select(User))).scalars().all()
         user_full_names = [UserFullNameResponse(id=u.id, full_name=u.full_name) for u in users]
 
         return ListUserFullNameResponse(
@@ -152,16 +159,17 @@ async def get_user_full_name(
 
 @router.get("/admin-name")
 async def get_user_admin_name(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        users = db.query(User)\
-            .join(UserRole)\
-            .join(Role)\
-            .filter(Role.name == "admin")\
-            .all()
+        users = (await db.execute(
+            select(User)
+            .join(UserRole)
+            .join(Role)
+            .where(Role.name == "admin")
+        )).scalars().all()
             
         user_admin_names = [UserFullNameResponse(id=u.id, full_name=u.full_name) for u in users]
 
@@ -179,50 +187,34 @@ async def get_user_admin_name(
 @router.get("/export",
             status_code=status.HTTP_200_OK)
 async def export_user(
-        db: Session = Depends(get_db), 
+        request: Request,
+        format: ExportFormat = "xlsx",
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
     
     try:
-        query = (
-            db.query(
-                User,
-                func.coalesce(func.array_agg(Role.name).filter(Role.name != None), '{}').label("roles")
-            )
-            .outerjoin(UserRole, User.id == UserRole.user_id)
-            .outerjoin(Role, UserRole.role_id == Role.id)
-            .group_by(User.id)
-        )
-        users = query.all()
-
-        df = pd.DataFrame([{
-            "Số thứ tự": index + 1,
-            "Họ và Tên": user[0].full_name,
-            "Tên người dùng": user[0].username,
-            "Email": user[0].email,
-            "Số điện thoại": user[0].phone_number,
-            "Ngày sinh": user[0].birthdate,
-            "Địa chỉ": user[0].address,
-            "Đang hoạt động": user[0].is_active,
-            "Vai trò": ', '.join(user[1])
-        } for index, user in enumerate(users)])
-        
-        output = BytesIO()
-        writer = pd.ExcelWriter(output, engine='xlsxwriter')
-        df.to_excel(writer, sheet_name='Users', index=False)
-        writer.close()
-        output.seek(0)
-
-        headers = {
-            'Content-Disposition': 'attachment; filename="users.xlsx"'
-        }
-        
-        return StreamingResponse(
-            output,
-            headers=headers,
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        roles = select(func.string_agg(Role.name, literal_column("', '")))\
+            .join(UserRole, UserRole.role_id == Role.id)\
+            .where(UserRole.user_id == User.id)\
+            .scalar_subquery()
+        query = select(
+            User.full_name,
+            User.username,
+            User.email,
+            User.phone_number,
+            User.birthdate,
+            User.address,
+            User.is_active,
+            func.coalesce(roles, literal_column("''"))
+        ).order_by(User.id)
+
+        return await export_file(
+            request, db, query,
+            ["Họ và Tên", "Tên người dùng", "Email", "Số điện thoại", "Ngày sinh", "Địa chỉ", "Đang hoạt động", "Vai trò"],
+            "Users", "users", format, numbered=True
         )
-    
+
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -235,22 +227,22 @@ async def export_user(
             response_model=UserResponse)
 async def get_user_by_id(
         user_id: int, 
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
         current_user = Depends(get_current_user)
     ):
     
     try:
         query = (
-            db.query(
+            select(
                 User,
-                func.coalesce(func.array_agg(Role.name).filter(Role.name != None), '{}').label("roles")
+                func.coalesce(func.array_agg(Role.name).filter(Role.name != None), literal_column("'{}'")).label("roles")
             )
             .outerjoin(UserRole, User.id == UserRole.user_id)
             .outerjoin(Role, UserRole.role_id == Role.id)
             .group_by(User.id)
-            .filter(User.id == user_id)
+            .where(User.id == user_id)
         )
-        user = query.first()
+        user = (await db.execute(query)).first()
 
         if not user:
             raise HTTPException(
@@ -282,20 +274,24 @@ async def get_user_by_id(
 
 @router.post("/search",
             status_code=status.HTTP_200_OK,  
-            response_model=UserPageableResponse)
+            response_model=UserPageableResponse,
+            dependencies=[Depends(query_budget(5))])
 async def search_user(
         search: UserSearch, 
-        page: int,
         page_size: int,
-        db: Session = Depends(get_db), 
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)
     ):
     
     try:
         users = (
-            db.query(
+            select(
                 User,
-                func.coalesce(func.array_agg(Role.name).filter(Role.name != None), '{}').label("roles")
+                func.coalesce(func.array_agg(Role.name).filter(Role.name != None), literal_column("'{}'")).label("roles")
             )
             .outerjoin(UserRole, User.id == UserRole.user_id)
             .outerjoin(Role, UserRole.role_id == Role.id)
@@ -303,21 +299,18 @@ async def search_user(
         )
 
         if search.username:
-            users = users.filter(User.username.ilike(f"%{search.username}%"))
+            users = users.where(User.username.ilike(f"%{search.username}%"))
         if search.full_name:
-            users = users.filter(User.full_name.ilike(f"%{search.full_name}%"))
+            users = users.where(User.full_name_normalized.like(f"%{normalize_text(search.full_name.strip())}%"))
         if search.phone_number:
-            users = users.filter(User.phone_number.ilike(f"%{search.phone_number}%"))
+            users = users.where(User.phone_number.ilike(f"%{search.phone_number}%"))
         if search.address:
-            users = users.filter(User.address.ilike(f"%{search.address}%"))
+            users = users.where(User.address.ilike(f"%{search.address}%"))
         if search.role:
-            users = users.join(UserRole).join(Role).filter(Role.name == search.role)
+            users = users.having(func.bool_or(Role.name == search.role))
 
-        total_count = users.count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-
-        users = users.offset(offset).limit(page_size).all()
+        users, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db, users, [given_name(User.full_name), User.id], page_size, page, cursor, include_total, count_mode)
         users = [
             UserResponse(
                 id=user[0].id,
@@ -337,7 +330,9 @@ async def search_user(
         return UserPageableResponse(
             users=users,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
     
     except SQLAlchemyError as e:
@@ -351,11 +346,11 @@ async def search_user(
              status_code=status.HTTP_201_CREATED)
 async def create_user(
         new_user: UserCreate,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
     ):
     
     try:
-        username = db.query(User).filter(User.username == new_user.username).first()
+        username = (await db.execute(select(User).where(User.username == new_user.username))).scalars().first()
         if username:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -376,15 +371,15 @@ async def create_user(
         db.add(new_info)
         
         # Flush to get the user ID but don't commit yet
-        db.flush()
+        await db.flush()
 
         new_auth = AuthCredential(
             user_id=new_info.id,
-            hashed_password=hash_password(new_user.password),
+            hashed_password=await hash_password(new_user.password),
         )        
         db.add(new_auth)
 
-        register_role = db.query(Role).filter(Role.name == "user").first()
+        register_role = (await db.execute(select(Role).where(Role.name == "user"))).scalars().first()
         new_user_role = UserRole(
             user_id=new_info.id,
             role_id=register_role.id
@@ -392,7 +387,7 @@ async def create_user(
         db.add(new_user_role)
 
         # Commit everything at once
-        db.commit()
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_201_CREATED, 
@@ -402,14 +397,14 @@ async def create_user(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -419,13 +414,13 @@ async def create_user(
 @router.post("/create-account")
 async def create_account(
         account: UserCreateAccount,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
     
     try:
         # Check existing username
-        username = db.query(User).filter(User.username == account.username).first()
+        username = (await db.execute(select(User).where(User.username == account.username))).scalars().first()
         if username:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -434,7 +429,7 @@ async def create_account(
         
         # Check existing email - only if email is provided and not empty
         if account.email and account.email.strip() != '':
-            email = db.query(User).filter(User.email == account.email).first()
+            email = (await db.execute(select(User).where(User.email == account.email))).scalars().first()
             if email:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
@@ -459,17 +454,17 @@ async def create_account(
             address=account.address if account.address and account.address.strip() != '' else None
         )
         db.add(new_info)
-        db.flush()
+        await db.flush()
 
         # Create auth credential with default password
         new_auth = AuthCredential(
             user_id=new_info.id,
-            hashed_password=hash_password(default_password)
+            hashed_password=await hash_password(default_password)
         )
         db.add(new_auth)
 
         # Assign default user role
-        default_role = db.query(Role).filter(Role.name == "user").first()
+        default_role = (await db.execute(select(Role).where(Role.name == "user"))).scalars().first()
         if not default_role:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -482,7 +477,7 @@ async def create_account(
         )
         db.add(new_user_role)
 
-        db.commit()
+        await db.commit()
 
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -492,7 +487,7 @@ async def create_account(
         )
 
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         print(e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -500,7 +495,7 @@ async def create_account(
         )
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -511,7 +506,7 @@ async def create_account(
              status_code=status.HTTP_201_CREATED)
 async def import_user(
         file: UploadFile = File(...), 
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
     
@@ -524,139 +519,76 @@ async def import_user(
         "Địa chỉ": "address"
     }
 
-    if file.content_type not in ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel"]:
+    existing_usernames = set((await db.execute(select(User.username))).scalars().all())
+    # A plain id: a rejected chunk's rollback expires ORM instances loaded before it
+    default_role_id = await db.scalar(select(Role.id).where(Role.name == "user"))
+    if default_role_id is None:
         raise HTTPException(
-            status_code=400, 
-            detail="File không hợp lệ. Vui lòng upload file Excel."
-        )
-    
-    content = await file.read()
-    
-    try:
-        df = pd.read_excel(BytesIO(content))
-
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Lỗi đọc file: {str(e)}"
-        )
-    
-    try:
-        df.rename(columns=COLUMN_MAPPING, inplace=True)
-
-    except KeyError as e:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Tiêu đề cột không hợp lệ: {str(e)}"
-        )
-    
-    existing_usernames = db.query(User.username).all()
-    existing_usernames = [username[0] for username in existing_usernames]
-    default_role = db.query(Role).filter(Role.name == "user").first()
-    
-    errors = []
-    users_to_create = []
-    default_password = getenv("DEFAULT_PASSWORD")
-
-    for index, row in df.iterrows():
-        username = row.get("username")
-
-        if not username or username == "":
-            errors.append({"row": index + 2, "message": "Tên đăng nhập không được để trống."})
-            continue
-        if username in existing_usernames:
-            errors.append({"row": index + 2, "message": f"Tài khoản '{username}' đã tồn tại."})
-            continue
-
-        full_name = row.get("full_name")
-        if not full_name:
-            errors.append({"row": index + 2, "message": "Họ và tên không được để trống."})
-
-        phone_number = row.get("phone_number")
-        if not phone_number or not str(phone_number).isdigit():
-            errors.append({"row": index + 2, "message": f"Số điện thoại '{phone_number}' không hợp lệ."})
-
-        # Create new user
-        new_user = User(
-            username=username,
-            full_name=full_name,
-            email=None if pd.isna(row.get("email")) else row.get("email"),
-            phone_number=phone_number, 
-            birthdate=None if pd.isna(row.get("birthdate")) else row.get("birthdate"),
-            address=None if pd.isna(row.get("address")) else row.get("address")
-        )
-        users_to_create.append(new_user)
-        
-    if errors:
-        return JSONResponse(
-            status_code=409,
-            content={"errors": errors}
-        )
-
-    try:
-        # Save users first
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Không tìm thấy role mặc định"
+        )
+    # Every row gets the same default password, so hash it once
+    default_hashed_password = await hash_password(getenv("DEFAULT_PASSWORD"))
+
+    async def import_chunk(df):
+        phone_number = to_text(df["phone_number"])
+        errors = collect_errors([
+            (df["username"].isna(), "Tên đăng nhập không được để trống."),
+            (duplicated(df["username"], existing_usernames), "Tài khoản '{}' đã tồn tại.", df["username"]),
+            (df["full_name"].isna(), "Họ và tên không được để trống."),
+            (~phone_number.str.fullmatch(r"\d+", na=False), "Số điện thoại '{}' không hợp lệ.", df["phone_number"])
+        ], "row", "message")
+        if errors:
+            return errors
+
+        # Save users first, flush to get IDs, then their auth credentials and role assignments
+        users_to_create = [User(**row) for row in model_rows(df.assign(phone_number=phone_number))]
         db.add_all(users_to_create)
-        # Flush to get IDs but don't commit yet
-        db.flush()
+        await db.flush()
 
-        # Create auth credentials and role assignments
-        auth_credentials = [
+        db.add_all([
             AuthCredential(
                 user_id=user.id,
-                hashed_password=hash_password(default_password)
+                hashed_password=default_hashed_password
             )
             for user in users_to_create
-        ]
-        
-        user_roles = [
+        ])
+        db.add_all([
             UserRole(
                 user_id=user.id,
-                role_id=default_role.id
+                role_id=default_role_id
             )
             for user in users_to_create
-        ]
+        ])
+        return errors
 
-        # Save all related objects
-        db.bulk_save_objects(auth_credentials)
-        db.bulk_save_objects(user_roles)
-        
-        # Commit everything at once
-        db.commit()
+    def chunk_committed(df):
+        existing_usernames.update(df["username"].dropna())
 
-        return JSONResponse(
-            status_code=201,
-            content={"message": "Import người dùng thành công"}
-        )
-
-    except SQLAlchemyError as e:
-        db.rollback()
-        print(e)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
-        )
+    return await import_excel(
+        db, file, COLUMN_MAPPING, import_chunk, "Import người dùng thành công",
+        error_status_code=status.HTTP_409_CONFLICT, line_key="row", error_key="message", chunk_committed=chunk_committed
+    )
 
 
 @router.post("/activate/{user_id}")
 async def activate_user(
         user_id: int,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
 
     try:
-        user = db.query(User).filter(User.id == user_id)
-        if not user.first():
+        user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
+        if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail="Tài khoản không tồn tại"
             )
 
-        user.update(
-            {"is_active": True}, 
-            synchronize_session=False
-        )
-        db.commit()
+        await db.execute(update(User).where(User.id == user_id).values({"is_active": True}))
+        await db.commit()
+        invalidate_principals([user_id])
 
         return JSONResponse(
             status_code=status.HTTP_200_OK, 
@@ -682,23 +614,21 @@ async def activate_user(
 @router.post("/deactivate/{user_id}")
 async def deactivate_user(
         user_id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
 
     try:
-        user = db.query(User).filter(User.id == user_id)
-        if not user.first():
+        user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
+        if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Tài khoản không tồn tại"
             )
         
-        user.update(
-            {"is_active": False}, 
-            synchronize_session=False
-        )
-        db.commit()
+        await db.execute(update(User).where(User.id == user_id).values({"is_active": False}))
+        await db.commit()
+        invalidate_principals([user_id])
 
         return JSONResponse(
             status_code=status.HTTP_200_OK, 
@@ -726,23 +656,21 @@ async def deactivate_user(
 async def update_user(
         user_id: int, 
         newUser: UserUpdate, 
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
  
     try:
-        user = db.query(User).filter(User.id == user_id)
-        if not user.first():
+        user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
+        if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail=f"Người dùng không tồn tại"
             )
 
-        user.update(
-            newUser.dict(), 
-            synchronize_session=False
-        )
-        db.commit()
+        await db.execute(update(User).where(User.id == user_id).values(newUser.dict()))
+        await db.commit()
+        invalidate_principals([user_id])
 
         return JSONResponse(
             status_code=status.HTTP_200_OK, 
@@ -752,14 +680,14 @@ async def update_user(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -770,20 +698,21 @@ async def update_user(
                 status_code=status.HTTP_200_OK)
 async def delete_user(
         user_id: int, 
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
     
     try:
-        user = db.query(User).filter(User.id == user_id)
-        if not user.first():
+        user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
+        if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail=f"Người dùng không tồn tại"
             )
 
-        user.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(User).where(User.id == user_id))
+        await db.commit()
+        revoke_user_tokens([user_id])
 
         return JSONResponse(
             status_code=status.HTTP_200_OK, 
@@ -793,14 +722,14 @@ async def delete_user(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -811,20 +740,21 @@ async def delete_user(
                 status_code=status.HTTP_200_OK)
 async def delete_many_user(
         ids: UserDelete, 
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
     
     try:
-        users = db.query(User).filter(User.id.in_(ids.list_id))
-        if not users.first():
+        users = (await db.execute(select(User).where(User.id.in_(ids.list_id)))).scalars().first()
+        if not users:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail=f"Người dùng không tồn tại"
             )
 
-        users.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(delete(User).where(User.id.in_(ids.list_id)))
+        await db.commit()
+        revoke_user_tokens(ids.list_id)
 
         return JSONResponse(
             status_code=status.HTTP_200_OK, 
@@ -834,14 +764,14 @@ async def delete_many_user(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -851,13 +781,14 @@ async def delete_many_user(
 @router.delete("/delete-all",
                 status_code=status.HTTP_200_OK)
 async def delete_all_user(
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
     
     try:
-        db.query(User).delete()
-        db.commit()
+        await db.execute(delete(User))
+        await db.commit()
+        revoke_user_tokens()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK, 
@@ -867,14 +798,14 @@ async def delete_all_user(
         )
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -59,8 +59,10 @@ class UserLoginResponse(BaseModel):
 class UserPageableResponse(BaseModel):
     users: list[UserResponse]
 
-    total_pages: int
-    total_data: int
+    total_pages: Optional[int] = None
+    total_data: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
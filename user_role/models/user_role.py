@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, text
+from sqlalchemy import Column, ForeignKey, Index, Integer, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from configs.database import Base
@@ -6,10 +6,13 @@ from configs.database import Base
 
 class UserRole(Base):
     __tablename__ = "user_roles"
+    __table_args__ = (
+        Index("ix_user_roles_user_id_role_id", "user_id", "role_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    role_id = Column(Integer, ForeignKey("roles.id", ondelete="CASCADE"), nullable=False)
+    role_id = Column(Integer, ForeignKey("roles.id", ondelete="CASCADE"), nullable=False, index=True)
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
 
     user = relationship("User", back_populates="user_roles", passive_deletes=True)
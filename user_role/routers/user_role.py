@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from configs.database import get_db
-from configs.authentication import get_current_user
+from configs.database import get_db, get_read_db
+from configs.pagination import CountMode, paginate
+from configs.authentication import get_current_user, invalidate_principals
 from role.models.role import Role
-from user.models.user import User
+from user.models.user import User, role_version_bump
 from user_role.models.user_role import UserRole
 from user_role.schemas.user_role import *
-import math
 
 
 router = APIRouter(
@@ -20,12 +23,12 @@ router = APIRouter(
             response_model=ListUserRoleResponse, 
             status_code=status.HTTP_200_OK)
 async def get_user_roles(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
         current_user = Depends(get_current_user)
     ):
     
     try:
-        user_roles = db.query(UserRole).all()
+        user_roles = (await db.execute(select(UserRole).options(selectinload(UserRole.user), selectinload(UserRole.role)))).scalars().all()
 
         return ListUserRoleResponse(
             user_roles=user_roles,
@@ -42,22 +45,27 @@ async def get_user_roles(
 @router.get("/pageable", 
             response_model=UserRolePageableResponse)
 async def get_user_roles_pageable(
-        page: int, 
-        page_size: int, 
-        db: Session = Depends(get_db), 
+        page_size: int,
+        page: int = 1,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        count_mode: CountMode = "exact",
+        db: AsyncSession = Depends(get_read_db), 
         current_user = Depends(get_current_user)      
     ):
      
     try:
-        total_count = db.query(UserRole).count()
-        total_pages = math.ceil(total_count / page_size)
-        offset = (page - 1) * page_size
-        user_roles = db.query(UserRole).offset(offset).limit(page_size).all()
+        user_roles, next_cursor, prev_cursor, total_count, total_pages = await paginate(
+            db,
+            select(UserRole).options(selectinload(UserRole.user), selectinload(UserRole.role)),
+            [UserRole.id], page_size, page, cursor, include_total, count_mode)
 
         user_roles_pageable_res = UserRolePageableResponse(
             user_roles=user_roles,
             total_pages=total_pages,
-            total_data=total_count
+            total_data=total_count,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
 
         return user_roles_pageable_res
@@ -73,12 +81,12 @@ async def get_user_roles_pageable(
             response_model=list[UserRoleResponse])
 async def get_user_role_by_user_id(
         user_id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
         current_user = Depends(get_current_user)
     ):
     
     try:
-        user_roles = db.query(UserRole).filter(UserRole.user_id == user_id).all()
+        user_roles = (await db.execute(select(UserRole).options(selectinload(UserRole.user), selectinload(UserRole.role)).where(UserRole.user_id == user_id))).scalars().all()
 
         if not user_roles:
             raise HTTPException(
@@ -100,13 +108,13 @@ async def get_user_role_by_user_id(
              status_code=status.HTTP_201_CREATED)
 async def create_user_role(
         new_user_role: UserRoleCreate,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_db), 
         current_user = Depends(get_current_user)
     ):
     
     try:
-        user_role = db.query(UserRole).filter(UserRole.user_id == new_user_role.user_id, 
-                                            UserRole.role_id == new_user_role.role_id).first()
+        user_role = (await db.execute(select(UserRole).where(UserRole.user_id == new_user_role.user_id, 
+                                            UserRole.role_id == new_user_role.role_id))).scalars().first()
         if user_role:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, 
@@ -115,19 +123,22 @@ async def create_user_role(
 
         user_role = UserRole(**new_user_role.dict())
         db.add(user_role)
-        db.commit()    
+        await db.execute(role_version_bump(User.id == user_role.user_id))
+        await db.commit()    
+        invalidate_principals([user_role.user_id])
+        await db.refresh(user_role, ["user", "role"])
 
         return user_role
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -139,27 +150,30 @@ async def create_user_role(
                 status_code=status.HTTP_201_CREATED)
 async def import_user_roles(
         user_roles: list[UserRoleCreate],
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
     
     try:
-        for user_role in user_roles.user_roles:
-            user_role = UserRole(**user_role.dict())
-            db.add(user_role)
-            db.commit()
+        user_roles = [UserRole(**user_role.dict()) for user_role in user_roles]
+        db.add_all(user_roles)
+        await db.execute(role_version_bump(User.id.in_({user_role.user_id for user_role in user_roles})))
+        await db.commit()
+        invalidate_principals([user_role.user_id for user_role in user_roles])
+        for user_role in user_roles:
+            await db.refresh(user_role, ["user", "role"])
 
         return user_roles
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -171,33 +185,37 @@ async def import_user_roles(
             status_code=status.HTTP_200_OK)
 async def update_user_role(
         id: int,
-        user_role: UserRoleUpdate,
-        db: Session = Depends(get_db),
+        new_user_role: UserRoleUpdate,
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
     
     try:
-        user_role = db.query(UserRole).filter(UserRole.id == id)
-        if not user_role.first():
+        user_role = (await db.execute(select(UserRole).where(UserRole.id == id))).scalars().first()
+        if not user_role:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail="Quyền người dùng không tồn tại"
             )
 
-        user_role.update(user_role.dict(), synchronize_session=False)
-        db.commit()
+        old_user_id = user_role.user_id
+        await db.execute(update(UserRole).where(UserRole.id == id).values(new_user_role.dict()))
+        await db.execute(role_version_bump(User.id.in_({old_user_id, new_user_role.user_id})))
+        await db.commit()
+        await db.refresh(user_role, ["user_id", "role_id", "user", "role"])
+        invalidate_principals([old_user_id, user_role.user_id])
 
-        return user_role.first()
+        return user_role
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -208,32 +226,34 @@ async def update_user_role(
                 status_code=status.HTTP_200_OK)
 async def delete_user_role(
         id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
     
     try:
-        user_role = db.query(UserRole).filter(UserRole.id == id)
-        if not user_role.first():
+        user_role = (await db.execute(select(UserRole).where(UserRole.id == id))).scalars().first()
+        if not user_role:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail="Quyền người dùng không tồn tại"
             )
 
-        user_role.delete(synchronize_session=False)
-        db.commit()
+        await db.execute(role_version_bump(User.id == user_role.user_id))
+        await db.execute(delete(UserRole).where(UserRole.id == id))
+        await db.commit()
+        invalidate_principals([user_role.user_id])
 
         return {"message": "Xóa quyền người dùng thành công"}
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -244,32 +264,35 @@ async def delete_user_role(
                 status_code=status.HTTP_200_OK)
 async def delete_user_roles(
         user_ids: list[int],
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
     
     try:
-        user_roles = db.query(UserRole).filter(UserRole.id.in_(user_ids))
-        if not user_roles.first():
+        user_roles = (await db.execute(select(UserRole).where(UserRole.id.in_(user_ids)))).scalars().first()
+        if not user_roles:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail="Quyền người dùng không tồn tại"
             )
 
-        user_roles.delete(synchronize_session=False)
-        db.commit()
+        affected_user_ids = (await db.execute(select(UserRole.user_id).where(UserRole.id.in_(user_ids)))).scalars().all()
+        await db.execute(role_version_bump(User.id.in_(affected_user_ids)))
+        await db.execute(delete(UserRole).where(UserRole.id.in_(user_ids)))
+        await db.commit()
+        invalidate_principals(affected_user_ids)
 
         return {"message": "Xóa quyền người dùng thành công"}
     
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Dữ liệu không hợp lệ hoặc vi phạm ràng buộc cơ sở dữ liệu"
         )
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -279,18 +302,20 @@ async def delete_user_roles(
 @router.delete("/delete-all",
                 status_code=status.HTTP_200_OK)
 async def delete_all_user_roles(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)
     ):
     
     try:
-        db.query(UserRole).delete()
-        db.commit()
+        await db.execute(role_version_bump(User.id.in_(select(UserRole.user_id))))
+        await db.execute(delete(UserRole))
+        await db.commit()
+        invalidate_principals()
 
         return {"message": "Xóa tất cả quyền người dùng thành công"}
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi cơ sở dữ liệu: {str(e)}"
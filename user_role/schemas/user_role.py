@@ -54,8 +54,10 @@ class ListUserRoleResponse(BaseModel):
 
 class UserRolePageableResponse(BaseModel):
     user_roles: list[UserRoleResponse]
-    total_pages: int
-    total_data: int
+    total_pages: Optional[int] = None
+    total_data: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True